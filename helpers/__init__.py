@@ -0,0 +1 @@
+"""Shared helpers for the IST 488 lab pages (imported by the scripts in labs/)."""
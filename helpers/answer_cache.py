@@ -0,0 +1,251 @@
+"""Answers to standalone questions, shared by every Lab 3 session.
+
+Kids ask the same things ("why is the sky blue?") over and over. A question
+that does not depend on the conversation is answered from the system prompt
+alone, so its answer can be reused: the next session asking it (or, with
+embeddings, something close to it) gets the stored answer without an LLM call.
+
+Entries are partitioned by model and by a hash of the system prompt, so
+changing either one never serves an old answer. Entries expire after
+TTL_SECONDS and the least recently used ones are dropped past MAX_ENTRIES.
+The cache is a JSON file under .cache/; LAB_ANSWER_CACHE=0 turns it off.
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from helpers.paths import cache_path
+
+TTL_SECONDS = 7 * 24 * 60 * 60
+MAX_ENTRIES = 1000
+SIMILARITY_THRESHOLD = 0.92  # cosine similarity for an embedding match
+SAVE_DELAY_SECONDS = 2.0  # writes are batched instead of rewriting the file on every answer
+
+_CACHE_FILE = cache_path("lab3_answers.json")
+
+# A question with these words leans on earlier turns or on the user themselves.
+_CONTEXT_WORDS = frozenset(
+    "it its it's that this these those they them their he him his she her "
+    "i i'm me my mine we us our you your yours above earlier before again "
+    "else another more also too other".split()
+)
+_FILLER_RE = re.compile(r"^(?:(?:hey|hi|hello|ok|okay|so|um|please|can you tell me|tell me|do you know)\b[\s,]*)+")
+
+
+def enabled():
+    return os.environ.get("LAB_ANSWER_CACHE") != "0"
+
+
+def semantic_enabled():
+    """Near-duplicate matching costs one embedding call per new question; LAB_SEMANTIC_CACHE=0 skips it."""
+    return os.environ.get("LAB_SEMANTIC_CACHE") != "0"
+
+
+def normalize_question(text):
+    """"Hey, WHY is the sky blue??" -> "why is the sky blue"."""
+    text = re.sub(r"[^a-z0-9' ]+", " ", (text or "").lower())
+    text = " ".join(text.split())
+    return _FILLER_RE.sub("", text).strip()
+
+
+def is_standalone(question):
+    """True if the question can be answered without the conversation before it."""
+    words = normalize_question(question).split()
+    if len(words) < 3:
+        return False  # "why?", "and then?" ...
+    return not any(w in _CONTEXT_WORDS for w in words)
+
+
+def prompt_version(system_prompt):
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:12]
+
+
+def _unit(vector):
+    import numpy as np
+
+    v = np.asarray(vector, dtype=np.float32)
+    return v / max(float(np.linalg.norm(v)), 1e-12)
+
+
+def _encode_vector(v):
+    import numpy as np
+
+    return base64.b64encode(np.asarray(v, dtype=np.float16).tobytes()).decode("ascii")
+
+
+def _decode_vector(data):
+    import numpy as np
+
+    return np.frombuffer(base64.b64decode(data), dtype=np.float16).astype(np.float32)
+
+
+class AnswerCache:
+    """Process-wide answer cache; safe to share between sessions and threads.
+
+    embed (texts -> vectors) enables near-duplicate matching; without it only
+    identical normalised questions hit.
+    """
+
+    def __init__(self, path=_CACHE_FILE, embed=None, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES,
+                 threshold=SIMILARITY_THRESHOLD):
+        self.path = path
+        self.embed = embed
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = None  # OrderedDict "partition|question" -> entry, least recently used first
+        self._vectors = OrderedDict()  # recent question -> unit vector, so store() reuses lookup()'s
+        self._save_timer = None
+        self._decoded = {}  # key -> unit vector decoded from the entry
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = OrderedDict()
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, encoding="utf-8") as f:
+                        data = json.load(f)
+                    for entry in sorted(data.get("entries", []), key=lambda e: e.get("used_at", 0)):
+                        self._entries[entry["key"]] = entry
+                except (OSError, ValueError, KeyError):
+                    pass
+        return self._entries
+
+    def _schedule_save(self):
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(SAVE_DELAY_SECONDS, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Write the file now (normally done by a timer shortly after a change)."""
+        with self._lock:
+            self._save_timer = None
+            if self._entries is None:
+                return
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": list(self._entries.values())}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def _question_vector(self, normalized):
+        with self._lock:
+            vector = self._vectors.get(normalized)
+        if vector is None:
+            vector = _unit(self.embed([normalized])[0])
+            with self._lock:
+                self._vectors[normalized] = vector
+                if len(self._vectors) > 128:
+                    self._vectors.popitem(last=False)
+        return vector
+
+    def _expired(self, entry, now):
+        return now - entry["created_at"] > self.ttl
+
+    def lookup(self, question, model, system_prompt):
+        """(answer, match) with match "exact" or "similar", or None on a miss."""
+        partition = f"{model}|{prompt_version(system_prompt)}"
+        normalized = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(f"{partition}|{normalized}")
+            if entry is not None and self._expired(entry, now):
+                del entries[entry["key"]]
+                entry = None
+            if entry is not None:
+                return self._hit(entry, "exact", now)
+            candidates = [
+                e for e in entries.values()
+                if e["partition"] == partition and e.get("vector") and not self._expired(e, now)
+            ] if self.embed is not None else []
+            if not candidates:
+                self.misses += 1
+                return None
+            # Decoded while holding the lock: store() prunes _decoded.
+            for e in candidates:
+                if e["key"] not in self._decoded:
+                    self._decoded[e["key"]] = _decode_vector(e["vector"])
+            vectors = [self._decoded[e["key"]] for e in candidates]
+
+        import numpy as np
+
+        try:
+            query = self._question_vector(normalized)
+        except Exception:
+            query = None  # embeddings unavailable: behave like a miss
+        sims = np.stack(vectors) @ query if query is not None else None
+        best = int(np.argmax(sims)) if sims is not None else None
+        with self._lock:
+            if best is None or sims[best] < self.threshold or candidates[best]["key"] not in self._load():
+                self.misses += 1  # no close question, or it was evicted meanwhile
+                return None
+            return self._hit(candidates[best], "similar", now)
+
+    def _hit(self, entry, match, now):
+        entry["used_at"] = now
+        entry["hits"] = entry.get("hits", 0) + 1
+        self._entries.move_to_end(entry["key"])
+        self.hits += 1
+        return entry["answer"], match
+
+    def store(self, question, answer, model, system_prompt):
+        """Remember the answer to a standalone question (the file is written shortly after)."""
+        normalized = normalize_question(question)
+        if not normalized or not (answer or "").strip():
+            return
+        vector = None
+        if self.embed is not None:
+            try:
+                vector = _encode_vector(self._question_vector(normalized))
+            except Exception:
+                pass  # still usable for exact matches
+        partition = f"{model}|{prompt_version(system_prompt)}"
+        key = f"{partition}|{normalized}"
+        now = time.time()
+        with self._lock:
+            entries = self._load()
+            entries[key] = {
+                "key": key,
+                "partition": partition,
+                "question": normalized,
+                "answer": answer,
+                "vector": vector,
+                "created_at": now,
+                "used_at": now,
+                "hits": 0,
+            }
+            entries.move_to_end(key)
+            for old_key in [k for k, e in entries.items() if self._expired(e, now)]:
+                del entries[old_key]
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)  # least recently used
+            self._decoded.pop(key, None)
+            for stale in [k for k in self._decoded if k not in entries]:
+                del self._decoded[stale]
+            self._schedule_save()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._load()), "hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache(embed=None):
+    """The process-wide AnswerCache (embed is only used when it is first created)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnswerCache(embed=embed)
+        return _cache
@@ -0,0 +1,74 @@
+"""Windowed rendering of chat transcripts.
+
+Rendering every message on every rerun makes a long conversation slower to
+redraw with each turn (and sends all of it over the websocket again). Only the
+last WINDOW messages are drawn as chat bubbles; older ones appear on demand,
+PAGE_SIZE at a time, behind a "Load earlier messages" button. Loaded pages are
+drawn as one markdown block each, and the text of every full page is built
+once and kept, so a rerun costs the same however long the session has been.
+"""
+import streamlit as st
+
+WINDOW = 20
+PAGE_SIZE = 20
+
+_ROLE_LABELS = {"user": "You", "assistant": "Assistant"}
+
+
+def _render_block(messages):
+    return "\n\n".join(
+        f"**{_ROLE_LABELS.get(m['role'], m['role'].title())}:** {m['content']}" for m in messages
+    )
+
+
+def _load_earlier(from_key, current, page_size):
+    # Page boundaries are fixed multiples of page_size, so cached blocks stay valid.
+    st.session_state[from_key] = max(0, (current - page_size) // page_size * page_size)
+
+
+def _show_recent(from_key):
+    st.session_state[from_key] = None
+
+
+def render_history(messages, key, window=WINDOW, page_size=PAGE_SIZE):
+    """Draw the transcript: the last `window` messages, plus any earlier pages the user loaded.
+
+    key namespaces the widget and cache entries in st.session_state (one per chat).
+    """
+    from_key = f"{key}_history_from"
+    blocks_key = f"{key}_history_blocks"
+    total = len(messages)
+    live_start = max(0, total - window)
+    loaded_from = st.session_state.get(from_key)
+    if loaded_from is not None and loaded_from >= live_start:
+        loaded_from = None  # transcript was trimmed or reset
+    first = live_start if loaded_from is None else loaded_from
+
+    if first > 0:
+        st.button(
+            f"Load earlier messages ({first} more)",
+            key=f"{key}_load_earlier",
+            on_click=_load_earlier,
+            args=(from_key, first, page_size),
+        )
+    if loaded_from is not None:
+        st.button("Show only recent messages", key=f"{key}_show_recent", on_click=_show_recent, args=(from_key,))
+
+    cached = st.session_state.get(blocks_key, {})
+    blocks = {}
+    for start in range(first, live_start, page_size):
+        page = messages[start:min(start + page_size, live_start)]
+        # Identity of the first/last message and the length: a trimmed or edited
+        # transcript gets new blocks, an unchanged page reuses its text.
+        block_id = (start, id(page[0]), id(page[-1]), len(page))
+        text = cached.get(block_id)
+        if text is None:
+            text = _render_block(page)
+        blocks[block_id] = text
+        with st.container(border=True):
+            st.markdown(text)
+    st.session_state[blocks_key] = blocks  # only what is on screen is kept
+
+    for msg in messages[live_start:]:
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
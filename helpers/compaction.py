@@ -0,0 +1,172 @@
+"""Rolling-summary compaction for the chat pages.
+
+When old turns have to leave the prompt (token budget), they are folded into a
+short running summary instead of being lost. Summaries are written by a cheap
+model on a background thread, so a turn never waits for one: the prompt uses
+whatever summary is finished, and newer evictions are folded in on a later turn.
+
+Keep one ConversationCompactor per chat in st.session_state.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers.llm import chat
+from helpers.scheduler import BACKGROUND
+from helpers.tokens import count_tokens, message_tokens
+
+SUMMARY_MODEL = "gpt-4.1-nano"
+
+# Upper bound for the summary itself, so it cannot crowd out recent turns.
+MAX_SUMMARY_TOKENS = 200
+
+SUMMARY_PROMPT = """You keep a running summary of a chat between a user and an assistant.
+
+Current summary (may be empty):
+{summary}
+
+Older messages that are being removed from the chat:
+{transcript}
+
+Write an updated summary that merges the new messages into the current summary.
+Keep names, facts about the user, questions asked, and answers given. Drop small talk.
+Use at most 120 words. Return only the summary text."""
+
+# Shared by every session; summaries are small, so a few workers are plenty.
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="compactor")
+
+
+def trim_history(messages, max_tokens):
+    """Token-based buffer used at the end of a turn by Lab 3 / Lab 4.
+
+    Drops the oldest exchange until the history fits (keeping a leading
+    assistant greeting). Returns (kept, evicted).
+    """
+    # Each message is tokenised once and nothing is copied until the end:
+    # re-counting or re-slicing per drop is quadratic in the history length.
+    costs = [message_tokens(m) for m in messages]
+    total = 3 + sum(costs)
+    pinned = None  # index of the greeting kept in front, if any
+    start = 0  # kept = [messages[pinned]] + messages[start:]
+    while total > max_tokens and (pinned is not None) + len(messages) - start > 2:
+        first = pinned if pinned is not None else start
+        if messages[first]["role"] == "assistant" and (pinned is not None) + len(messages) - start > 3:
+            if pinned is None:
+                pinned, start = start, start + 1
+            total -= costs[start] + costs[start + 1]
+            start += 2
+        elif pinned is not None:
+            total -= costs[pinned] + costs[start]
+            pinned, start = None, start + 1
+        else:
+            total -= costs[start] + costs[start + 1]
+            start += 2
+    if pinned is None and start == 0:
+        kept = messages
+    else:
+        kept = ([messages[pinned]] if pinned is not None else []) + messages[start:]
+    kept_ids = {id(m) for m in kept}
+    evicted = [m for m in messages if id(m) not in kept_ids]
+    return kept, evicted
+
+
+def fit_to_budget(head, history, max_tokens):
+    """Drop the oldest history messages until head + history fits in max_tokens.
+
+    head is the system prompt (plus summary); it is never trimmed.
+    """
+    costs = [message_tokens(m) for m in history]
+    total = count_tokens(head) + sum(costs)
+    start = 0
+    while total > max_tokens and len(history) - start > 2:
+        # Keep the last exchanges
+        step = 2 if history[start]["role"] == "assistant" else 1
+        total -= sum(costs[start:start + step])
+        start += step
+    return history[start:] if start else history
+
+
+class ConversationCompactor:
+    """Running summary of the turns that no longer fit in the prompt."""
+
+    def __init__(self, client, model=SUMMARY_MODEL, page=None):
+        self.client = client
+        self.model = model
+        self.page = page
+        self.summary = ""
+        self.folded_count = 0  # used by window() for append-only transcripts
+        self._queue = []
+        self._future = None
+        self._batch = []
+
+    def fold(self, evicted):
+        """Queue messages that left the prompt; they are summarised in the background."""
+        evicted = [m for m in evicted if (m.get("content") or "").strip()]
+        if not evicted:
+            return
+        self._queue.extend({"role": m["role"], "content": m["content"]} for m in evicted)
+        self._collect()
+
+    def summary_messages(self):
+        """[] or a single system message carrying the summary, to put after the system prompt."""
+        self._collect()
+        if not self.summary:
+            return []
+        return [
+            {
+                "role": "system",
+                "content": "Summary of the earlier conversation (older messages were removed "
+                "to save space):\n" + self.summary,
+            }
+        ]
+
+    def window(self, head, messages, max_tokens):
+        """Return the tail of an append-only transcript that fits after head.
+
+        Messages that fall out of the window are folded into the summary, so the
+        transcript shown to the user can stay complete (Lab 9).
+        """
+        if self.folded_count > len(messages):
+            self.folded_count = 0  # transcript was reset
+        tail = messages[self.folded_count:]
+        total = count_tokens(head + tail)
+        dropped = 0
+        while total > max_tokens and len(tail) - dropped > 1:
+            total -= message_tokens(tail[dropped])
+            dropped += 1
+        tail = tail[dropped:]
+        if dropped:
+            self.fold(messages[self.folded_count:self.folded_count + dropped])
+            self.folded_count += dropped
+        return tail
+
+    def _collect(self):
+        """Pick up a finished summary and start the next one if turns are waiting."""
+        if self._future is not None:
+            if not self._future.done():
+                return
+            try:
+                self.summary = self._future.result()
+            except Exception:
+                # Keep the old summary and retry these turns with the next batch.
+                self._queue = self._batch + self._queue
+            self._future = None
+            self._batch = []
+        if self._queue:
+            self._batch, self._queue = self._queue, []
+            self._future = _executor.submit(self._summarize, self.summary, self._batch)
+
+    def _summarize(self, summary, batch):
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in batch)
+        resp = chat(
+            self.client,
+            page=self.page,
+            priority=BACKGROUND,
+            model=self.model,
+            max_tokens=MAX_SUMMARY_TOKENS,
+            messages=[
+                {
+                    "role": "user",
+                    "content": SUMMARY_PROMPT.format(summary=summary or "(empty)", transcript=transcript),
+                }
+            ],
+        )
+        return (resp.choices[0].message.content or "").strip() or summary
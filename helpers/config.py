@@ -0,0 +1,25 @@
+import os
+import tomllib
+
+from helpers.paths import PROJECT_ROOT
+
+_SECRETS_FILE = os.path.join(PROJECT_ROOT, ".streamlit", "secrets.toml")
+
+
+def get_secret(name):
+    """Read a secret outside of Streamlit (command-line jobs, load tests).
+
+    Checks the environment first (upper-cased name, e.g. OPENAI_API_KEY), then
+    .streamlit/secrets.toml — the same file the pages read through st.secrets.
+    """
+    value = os.environ.get(name.upper())
+    if value:
+        return value
+    if os.path.isfile(_SECRETS_FILE):
+        with open(_SECRETS_FILE, "rb") as f:
+            data = tomllib.load(f)
+        if data.get(name):
+            return data[name]
+    raise KeyError(
+        f"Secret {name!r} not found. Set {name.upper()} or add it to .streamlit/secrets.toml."
+    )
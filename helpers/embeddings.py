@@ -0,0 +1,83 @@
+import os
+
+from helpers.scheduler import INTERACTIVE, get_scheduler
+from helpers.telemetry import span
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+def _estimate_tokens(texts):
+    return sum(len(t) // 4 + 1 for t in texts)
+
+
+def _scheduled(model, texts, priority, call):
+    """call() -> (result, headers), admitted by the rate-limit scheduler."""
+    result, ticket = get_scheduler().run(model, _estimate_tokens(texts), call, priority)
+    ticket.release()
+    return result
+
+
+_traced_class = None
+
+
+def openai_embedding_function(api_key, page="lab4"):
+    """Chroma embedding function for OpenAI embeddings, traced as "embedding" spans.
+
+    chromadb is imported here, on first use, rather than when the page loads.
+    Set .priority to helpers.scheduler.BATCH while indexing.
+    """
+    global _traced_class
+    if _traced_class is None:
+        from chromadb.utils import embedding_functions
+
+        class TracedOpenAIEmbeddingFunction(embedding_functions.OpenAIEmbeddingFunction):
+            page = None
+            priority = INTERACTIVE
+
+            def __call__(self, input):
+                parent = super()
+                with span("embedding", page=self.page, model=EMBEDDING_MODEL, inputs=len(input)):
+                    return _scheduled(EMBEDDING_MODEL, input, self.priority, lambda: (parent.__call__(input), None))
+
+        _traced_class = TracedOpenAIEmbeddingFunction
+
+    ef = _traced_class(
+        api_key=api_key,
+        model_name=EMBEDDING_MODEL,
+        api_base=os.environ.get("OPENAI_BASE_URL"),  # same override the OpenAI client honours
+    )
+    ef.page = page
+    # Swap in a client without SDK retries (the scheduler retries 429s). Chroma
+    # keeps the OpenAI client as .client, or (before 0.5) client.embeddings as ._client.
+    if hasattr(getattr(ef, "client", None), "with_options"):
+        ef.client = ef.client.with_options(max_retries=0)
+    sdk_client = getattr(getattr(ef, "_client", None), "_client", None)
+    if hasattr(sdk_client, "with_options"):
+        ef._client = sdk_client.with_options(max_retries=0).embeddings
+    return ef
+
+
+class OpenAIEmbedder:
+    """Plain callable texts -> vectors using the OpenAI SDK, for stores that do not need chromadb."""
+
+    def __init__(self, api_key, model=EMBEDDING_MODEL, page="lab4", priority=INTERACTIVE):
+        self.api_key = api_key
+        self.model = model
+        self.page = page
+        self.priority = priority  # helpers.scheduler.BATCH while indexing
+        self._client = None
+
+    def _create(self, texts):
+        raw = self._client.embeddings.with_raw_response.create(model=self.model, input=texts)
+        return raw.parse(), raw.headers
+
+    def __call__(self, input):
+        if self._client is None:
+            from openai import OpenAI
+
+            # Honours OPENAI_BASE_URL itself; 429s are retried by the scheduler, not the SDK.
+            self._client = OpenAI(api_key=self.api_key, max_retries=0)
+        with span("embedding", page=self.page, model=self.model, inputs=len(input)):
+            texts = list(input)
+            resp = _scheduled(self.model, texts, self.priority, lambda: self._create(texts))
+        return [item.embedding for item in sorted(resp.data, key=lambda d: d.index)]
@@ -0,0 +1,214 @@
+"""Prebuilt Lab 4 index: built once in the deploy step (it needs the OpenAI key), before the app starts.
+
+    python -m helpers.index_artifact build     # Lab-04-Data.zip -> data/lab4_index/
+    python -m helpers.index_artifact verify    # check sizes and checksums
+
+The artifact is a directory holding
+
+    manifest.json   format and schema versions, embedding model, counts,
+                    checksums of the sources and of every file below
+    meta.json, records.jsonl, embeddings.bin, scales.bin
+                    a NumpyVectorStore (chunks and int8 embeddings, memory-mapped)
+    lexical.json    corpus term statistics for the lexical part of reranking
+
+get_syllabus_index() opens it when it is present and matches the app (a few
+file opens, no extraction or embedding calls) and only builds in the page
+when it is missing or out of date. LAB4_INDEX_ARTIFACT points elsewhere.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from helpers.ingest import IngestProgress, ingest
+from helpers.paths import PROJECT_ROOT
+from helpers.retrieval import build_lexical_index
+from helpers.vectorstore import NumpyVectorStore
+
+FORMAT_VERSION = 1
+DEFAULT_PATH = os.path.join(PROJECT_ROOT, "data", "lab4_index")
+MANIFEST_FILE = "manifest.json"
+LEXICAL_FILE = "lexical.json"
+STORE_FILES = ("meta.json", "records.jsonl", "embeddings.bin", "scales.bin")
+
+
+class ArtifactError(RuntimeError):
+    """The artifact exists but is damaged or was built for another schema / model."""
+
+
+def artifact_path():
+    return os.environ.get("LAB4_INDEX_ARTIFACT") or DEFAULT_PATH
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        raise ArtifactError(f"unreadable manifest: {e}") from e
+
+
+def _shipped_documents(entries, sources, field):
+    """IngestProgress entries as {"<source name>/<path>": {"bytes", field}}: no absolute paths or mtimes."""
+    prefixes = [(os.path.abspath(s) + "!", os.path.basename(os.path.normpath(s))) for s in sources]
+    shipped = {}
+    for key, value in entries.items():
+        ident, size, _stamp = key.rsplit(":", 2)
+        for prefix, name in prefixes:
+            if ident.startswith(prefix):
+                ident = f"{name}/{ident[len(prefix):]}"
+                break
+        shipped[ident] = {"bytes": int(size), field: value}
+    return shipped
+
+
+def build_artifact(out, sources, chunker, embedding_function, schema_version, embedding_model, on_progress=None):
+    """Ingest sources into a fresh artifact at out; returns (IngestStats, manifest).
+
+    The build happens in out + ".partial" and resumes there if interrupted;
+    the finished directory replaces out in one rename.
+    """
+    work = out + ".partial"
+    store = NumpyVectorStore(work, embedding_function, metadata={"schema_version": schema_version})
+    if store.metadata.get("schema_version") != schema_version:
+        shutil.rmtree(work)
+        store = NumpyVectorStore(work, embedding_function, metadata={"schema_version": schema_version})
+    progress = IngestProgress(os.path.join(work, "ingest.json"))
+    stats = ingest(sources, store, chunker, progress=progress, on_progress=on_progress)
+    if not progress.complete:
+        raise ArtifactError(f"{'; '.join(stats.warnings)}. Build again to retry the documents that were not added.")
+    if store.count() == 0:
+        raise ArtifactError("no passages were extracted from the sources")
+
+    with open(os.path.join(work, LEXICAL_FILE), "w", encoding="utf-8") as f:
+        json.dump(build_lexical_index(store.get(include=["documents"])["documents"]), f)
+    files = {
+        name: {"bytes": os.path.getsize(os.path.join(work, name)), "sha256": file_sha256(os.path.join(work, name))}
+        for name in STORE_FILES + (LEXICAL_FILE,)
+        if os.path.exists(os.path.join(work, name))
+    }
+    manifest = {
+        "format": FORMAT_VERSION,
+        # Content version: changes whenever any file does.
+        "version": hashlib.sha256(json.dumps(files, sort_keys=True).encode()).hexdigest()[:16],
+        "schema_version": schema_version,
+        "embedding_model": embedding_model,
+        "count": store.count(),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "sources": [
+            {"name": os.path.basename(s), "bytes": os.path.getsize(s), "sha256": file_sha256(s)}
+            if os.path.isfile(s) else {"name": os.path.basename(os.path.normpath(s))}
+            for s in sources
+        ],
+        "documents": _shipped_documents(progress.done, sources, "chunks"),
+        "failed": _shipped_documents(progress.failed, sources, "error"),
+        "files": files,
+    }
+    os.remove(progress.path)
+    with open(os.path.join(work, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    if os.path.exists(out):
+        shutil.rmtree(out)
+    os.replace(work, out)
+    return stats, manifest
+
+
+def open_artifact(path, embedding_function, schema_version, embedding_model):
+    """(NumpyVectorStore, lexical index, manifest) for the artifact at path, or None if there is none.
+
+    Only sizes are checked here, so opening stays cheap; `verify` reads every
+    byte. Raises ArtifactError if the artifact does not fit this app.
+    """
+    manifest = _read_manifest(path)
+    if manifest is None:
+        return None
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ArtifactError(f"format {manifest.get('format')}, expected {FORMAT_VERSION}")
+    if manifest.get("schema_version") != schema_version:
+        raise ArtifactError(f"built with schema version {manifest.get('schema_version')}, the app uses {schema_version}")
+    if manifest.get("embedding_model") != embedding_model:
+        raise ArtifactError(f"built with {manifest.get('embedding_model')}, the app queries with {embedding_model}")
+    for name, info in manifest["files"].items():
+        file = os.path.join(path, name)
+        if not os.path.exists(file) or os.path.getsize(file) != info["bytes"]:
+            raise ArtifactError(f"{name} is missing or has the wrong size")
+    store = NumpyVectorStore(path, embedding_function)
+    if store.count() != manifest["count"]:
+        raise ArtifactError(f"holds {store.count()} passages, the manifest says {manifest['count']}")
+    with open(os.path.join(path, LEXICAL_FILE), encoding="utf-8") as f:
+        lexical = json.load(f)
+    return store, lexical, manifest
+
+
+def verify_artifact(path):
+    """Problems found (empty if the artifact is intact): missing files and checksum mismatches."""
+    try:
+        manifest = _read_manifest(path)
+    except ArtifactError as e:
+        return [str(e)]
+    if manifest is None:
+        return [f"no {MANIFEST_FILE} in {path}"]
+    problems = []
+    for name, info in manifest["files"].items():
+        file = os.path.join(path, name)
+        if not os.path.exists(file):
+            problems.append(f"{name}: missing")
+        elif file_sha256(file) != info["sha256"]:
+            problems.append(f"{name}: checksum mismatch")
+    return problems
+
+
+def main(argv=None):
+    import argparse
+
+    from helpers.config import get_secret
+    from helpers.syllabus_index import build_prebuilt_index
+
+    parser = argparse.ArgumentParser(description="Build or check the prebuilt Lab 4 index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="ingest and embed the syllabi into an artifact directory")
+    build.add_argument("sources", nargs="*", help="zips, directories or files (default: Lab-04-Data.zip)")
+    build.add_argument("--out", default=None, help="artifact directory (default: LAB4_INDEX_ARTIFACT or data/lab4_index)")
+    verify = sub.add_parser("verify", help="check every file against the manifest checksums")
+    verify.add_argument("--path", default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "verify":
+        path = args.path or artifact_path()
+        problems = verify_artifact(path)
+        for problem in problems:
+            print("error:", problem)
+        if not problems:
+            print(f"{path}: ok")
+        return 1 if problems else 0
+
+    def show(stats):
+        print(f"\r{stats.seen} seen, {stats.indexed} indexed, {stats.resumed} already done, "
+              f"{stats.failed} failed, {stats.chunks} chunks", end="", flush=True)
+
+    try:
+        stats, manifest = build_prebuilt_index(get_secret("openai_api_key"), args.sources or None, args.out, show)
+    except ArtifactError as e:
+        print()
+        print("error:", e)
+        return 1
+    print()
+    for warning in stats.warnings:
+        print("warning:", warning)
+    print(f"wrote {args.out or artifact_path()}: {manifest['count']} passages, version {manifest['version']}")
+    return 1 if stats.failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,315 @@
+"""Streaming ingestion of document collections (zip archives and directories).
+
+    discover(source) -> DocumentRef ... -> read_pages() -> chunker -> collection.add (batched)
+
+discover() walks a zip or a directory and yields the supported documents
+(.txt, .md, .pdf), skipping junk such as __MACOSX/, ._ resource forks and
+.DS_Store. Documents are read one at a time: PDF bytes are spooled to a
+temporary file (in memory up to SPOOL_BYTES, on disk beyond), and text files
+are decoded in TEXT_PAGE_CHARS pieces. So at most one document's text and one
+batch of chunks are held in memory, whatever the size of the corpus.
+
+Progress is kept in a small JSON file: every document whose chunks reached the
+collection is recorded by key (path + size + CRC/mtime), so an interrupted run
+picks up where it stopped and a changed file is indexed again.
+
+    python -m helpers.ingest Lab-04-Data.zip more_syllabi/   # (re)build the Lab 4 index
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+SUPPORTED_EXTENSIONS = (".txt", ".md", ".pdf")
+JUNK_NAMES = {".ds_store", "thumbs.db", "desktop.ini"}
+
+SPOOL_BYTES = 8 * 2**20  # PDFs larger than this are spooled to disk
+COPY_BYTES = 256 * 2**10
+TEXT_PAGE_CHARS = 20_000
+MAX_DOCUMENT_BYTES = 100 * 2**20  # larger members are skipped with a warning
+BATCH_SIZE = 64  # chunks per collection.add()
+
+
+def is_junk(path):
+    """True for macOS/Windows metadata, hidden files and hidden folders."""
+    parts = [p for p in path.replace("\\", "/").split("/") if p]
+    if not parts:
+        return True
+    name = parts[-1]
+    return (
+        "__MACOSX" in parts
+        or any(p.startswith(".") for p in parts)
+        or name.lower() in JUNK_NAMES
+        or name.startswith("~$")
+    )
+
+
+class DocumentRef:
+    """One document inside a source: path is relative to the zip or directory."""
+
+    def __init__(self, source, path, size, stamp, opener):
+        self.source = source
+        self.path = path
+        self.size = size
+        self.kind = os.path.splitext(path)[1].lower().lstrip(".")
+        self.ident = f"{os.path.abspath(source)}!{path}"  # the same for every version of the file
+        self.key = f"{self.ident}:{size}:{stamp}"
+        # Prefix of the document's chunk ids: path alone is not unique when two
+        # sources hold a file of the same name, so it is qualified by the source.
+        self.doc_id = hashlib.sha1(os.path.abspath(source).encode("utf-8")).hexdigest()[:8] + "/" + path
+        self._opener = opener
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
+    @property
+    def folder(self):
+        return os.path.dirname(self.path) or os.path.splitext(os.path.basename(self.source))[0]
+
+    def open(self):
+        """Binary file object for the document's bytes (use as a context manager)."""
+        return self._opener()
+
+    def __repr__(self):
+        return f"DocumentRef({self.path!r}, {self.size} bytes)"
+
+
+def _supported(path):
+    return os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS and not is_junk(path)
+
+
+def discover(source):
+    """Yield DocumentRef for each supported document in a zip, a directory, or a single file."""
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs[:] = sorted(d for d in dirs if not is_junk(d))
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                rel = os.path.relpath(full, source).replace(os.sep, "/")
+                if _supported(rel):
+                    st = os.stat(full)
+                    yield DocumentRef(source, rel, st.st_size, st.st_mtime_ns, lambda p=full: open(p, "rb"))
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zf:
+            members = [i for i in zf.infolist() if not i.is_dir() and _supported(i.filename)]
+        for info in members:
+            yield DocumentRef(source, info.filename, info.file_size, info.CRC, lambda i=info: _open_member(source, i))
+    elif os.path.isfile(source) and _supported(os.path.basename(source)):
+        st = os.stat(source)
+        yield DocumentRef(source, os.path.basename(source), st.st_size, st.st_mtime_ns, lambda: open(source, "rb"))
+    else:
+        raise FileNotFoundError(f"Not a zip, directory or supported document: {source}")
+
+
+class _MemberFile(io.BufferedReader):
+    """A zip member stream that also closes its archive."""
+
+    def __init__(self, zf, info):
+        self._zf = zf
+        super().__init__(zf.open(info))
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._zf.close()
+
+
+def _open_member(source, info):
+    return _MemberFile(zipfile.ZipFile(source), info)
+
+
+def read_pages(doc):
+    """Yield the text of a document page by page (PDF pages, or TEXT_PAGE_CHARS pieces)."""
+    if doc.size > MAX_DOCUMENT_BYTES:
+        raise ValueError(f"{doc.path} is larger than {MAX_DOCUMENT_BYTES // 2**20} MB")
+    if doc.kind == "pdf":
+        from pypdf import PdfReader
+
+        # pypdf needs to seek; a zip member can only be read forwards cheaply.
+        with doc.open() as src, tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as spool:
+            shutil.copyfileobj(src, spool, COPY_BYTES)
+            spool.seek(0)
+            for page in PdfReader(spool).pages:
+                yield page.extract_text() or ""
+        return
+
+    with doc.open() as src:
+        text = io.TextIOWrapper(src, encoding="utf-8", errors="replace", newline=None)
+        carry = ""
+        while True:
+            block = text.read(TEXT_PAGE_CHARS)
+            if not block:
+                break
+            block = carry + block
+            cut = block.rfind("\n")  # end pages on a line break so lines are not split
+            if cut <= 0:
+                cut = len(block)
+            page, carry = block[:cut], block[cut:].lstrip("\n")
+            yield _markdown_headings(page) if doc.kind == "md" else page
+        if carry:
+            yield _markdown_headings(carry) if doc.kind == "md" else carry
+
+
+def _markdown_headings(text):
+    """"## Grading" -> "Grading", so headings are picked up like PDF headings."""
+    return "\n".join(line.lstrip("#").strip() if line.startswith("#") else line for line in text.splitlines())
+
+
+class IngestProgress:
+    """Which documents are already in the collection; saved after every batch."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.done = {}  # key -> chunks added
+        self.failed = {}  # key -> error message
+        self.complete = False
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.done = data.get("done", {})
+            self.failed = data.get("failed", {})
+            self.complete = data.get("complete", False)
+
+    def reset(self):
+        self.done, self.failed, self.complete = {}, {}, False
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"done": self.done, "failed": self.failed, "complete": self.complete, "saved": time.time()}, f)
+        os.replace(tmp, self.path)
+
+
+class IngestStats:
+    """Counters for one ingest() run; passed to on_progress after every document."""
+
+    def __init__(self):
+        self.seen = 0
+        self.indexed = 0  # documents added by this run
+        self.resumed = 0  # documents skipped because an earlier run added them
+        self.failed = 0
+        self.chunks = 0
+        self.current = None
+        self.warnings = []
+
+
+def ingest(sources, collection, chunker, progress=None, batch_size=BATCH_SIZE, on_progress=None):
+    """Add every document under sources to collection; returns IngestStats.
+
+    chunker(doc, pages) -> (documents, metadatas, ids) turns one document into
+    chunks whose ids start with "<doc.doc_id>#". Errors in a single document,
+    or in adding a batch to the collection, are recorded as warnings and do
+    not stop the run; a run with failed batches is not marked complete, so
+    the next one retries them. A progress object (IngestProgress) makes the
+    run resumable. When a document has changed since it was indexed, its old
+    chunks are deleted before the new ones are added.
+    """
+    progress = progress or IngestProgress()
+    stats = IngestStats()
+    batch = {"documents": [], "metadatas": [], "ids": [], "keys": {}}
+    add = getattr(collection, "upsert", None) or collection.add  # re-adding after a crash is harmless
+    indexed = {}  # document ident -> keys of the versions already in the collection
+    for key in progress.done:
+        indexed.setdefault(key.rsplit(":", 2)[0], []).append(key)
+
+    batch_failed = []
+
+    def flush():
+        try:
+            if batch["ids"]:
+                add(documents=batch["documents"], metadatas=batch["metadatas"], ids=batch["ids"])
+        except Exception as e:
+            # e.g. the embeddings call failed: these documents are retried by the next run.
+            batch_failed.append(e)
+            stats.failed += len(batch["keys"])
+            stats.indexed -= len(batch["keys"])
+            stats.chunks -= len(batch["ids"])
+            stats.warnings.append(f"Could not add {len(batch['keys'])} documents to the index: {e}")
+            progress.failed.update((key, str(e)) for key in batch["keys"])
+        else:
+            progress.done.update(batch["keys"])
+        if batch["keys"]:
+            progress.save()
+        batch.update(documents=[], metadatas=[], ids=[], keys={})
+
+    for source in sources:
+        for doc in discover(source):
+            stats.seen += 1
+            stats.current = doc.path
+            if doc.key in progress.done:
+                stats.resumed += 1
+            else:
+                try:
+                    documents, metadatas, ids = chunker(doc, list(read_pages(doc)))
+                except Exception as e:
+                    stats.failed += 1
+                    stats.warnings.append(f"Error processing {doc.path}: {e}")
+                    progress.failed[doc.key] = str(e)
+                else:
+                    if indexed.get(doc.ident):
+                        flush()
+                        _delete_document(collection, doc)
+                        for key in indexed.pop(doc.ident):
+                            progress.done.pop(key, None)
+                        progress.save()
+                    if not documents:
+                        stats.warnings.append(f"No text extracted from {doc.path}")
+                    progress.failed.pop(doc.key, None)
+                    batch["documents"].extend(documents)
+                    batch["metadatas"].extend(metadatas)
+                    batch["ids"].extend(ids)
+                    batch["keys"][doc.key] = len(documents)
+                    stats.indexed += 1
+                    stats.chunks += len(documents)
+                    if len(batch["ids"]) >= batch_size:
+                        flush()
+            if on_progress:
+                on_progress(stats)
+    flush()
+    progress.complete = not batch_failed
+    progress.save()
+    return stats
+
+
+def _delete_document(collection, doc):
+    """Delete the chunks of an earlier version of doc (ids "<doc.doc_id>#<n>")."""
+    prefix = doc.doc_id + "#"
+    stale = [id_ for id_ in collection.get(include=[])["ids"] if id_.startswith(prefix)]
+    if stale:
+        collection.delete(ids=stale)
+
+
+def main(argv=None):
+    import argparse
+
+    from helpers.config import get_secret
+    from helpers.syllabus_index import build_index
+
+    parser = argparse.ArgumentParser(description="Build or extend the Lab 4 index from zips and directories.")
+    parser.add_argument("sources", nargs="+", help="zip archives, directories or single .pdf/.md/.txt files")
+    args = parser.parse_args(argv)
+
+    def show(stats):
+        print(f"\r{stats.seen} seen, {stats.indexed} indexed, {stats.resumed} already done, "
+              f"{stats.failed} failed, {stats.chunks} chunks", end="", flush=True)
+
+    stats, count = build_index(get_secret("openai_api_key"), args.sources, on_progress=show)
+    print()
+    for warning in stats.warnings:
+        print("warning:", warning)
+    print(f"index now holds {count} chunks")
+    return 1 if stats.failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
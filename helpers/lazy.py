@@ -0,0 +1,144 @@
+"""Lazy loading of the heavy libraries, background pre-warm, and an import-time report.
+
+The pages import chromadb, pypdf, LangChain and tiktoken only inside the
+functions that use them, so opening a page does not pay for libraries it never
+touches. Once the app has been idle for a few seconds, prewarm() imports them
+on a background thread so the first real use is fast too.
+
+Track startup regressions with:
+
+    python -m helpers.lazy --report                     # print import times
+    python -m helpers.lazy --report --save baseline.json
+    python -m helpers.lazy --report --baseline baseline.json --max-regression 0.25
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from helpers.paths import PROJECT_ROOT
+
+# Heaviest first: these are what the pages used to import at module top.
+HEAVY_MODULES = (
+    "chromadb",
+    "langchain_openai",
+    "langchain.chat_models",
+    "langchain_core.prompts",
+    "pypdf",
+    "tiktoken",
+)
+
+# What a page costs to open: the app shell plus each page's own imports.
+STARTUP_MODULES = (
+    "streamlit",
+    "openai",
+    "helpers.telemetry",
+    "helpers.llm",
+    "helpers.compaction",
+    "helpers.movie_recs",
+)
+
+PREWARM_DELAY_SECONDS = 5.0
+
+_prewarm_started = False
+_prewarm_lock = threading.Lock()
+
+
+def prewarm(modules=HEAVY_MODULES, delay=PREWARM_DELAY_SECONDS):
+    """Import modules on a daemon thread after delay seconds (once per process).
+
+    Set LAB_PREWARM=0 to disable, e.g. for import-time measurements.
+    """
+    global _prewarm_started
+    if os.environ.get("LAB_PREWARM") == "0":
+        return
+    with _prewarm_lock:
+        if _prewarm_started:
+            return
+        _prewarm_started = True
+
+    def _run():
+        time.sleep(delay)
+        for name in modules:
+            try:
+                __import__(name)
+            except Exception:
+                pass  # optional dependency missing; the page will report it when used
+            time.sleep(0.1)  # let request threads in between imports
+
+    threading.Thread(target=_run, name="prewarm", daemon=True).start()
+
+
+def measure_import(module):
+    """Seconds to import module in a fresh interpreter (None if it fails)."""
+    code = (
+        "import time; t = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - t)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "LAB_PREWARM": "0"},
+    )
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def import_report(modules=STARTUP_MODULES + HEAVY_MODULES, repeat=3):
+    """{module: best-of-repeat import time in seconds}."""
+    report = {}
+    for module in modules:
+        times = [t for t in (measure_import(module) for _ in range(repeat)) if t is not None]
+        report[module] = min(times) if times else None
+    return report
+
+
+def compare(report, baseline, max_regression):
+    """Modules whose import got slower than baseline by more than max_regression (fraction)."""
+    regressions = []
+    for module, seconds in report.items():
+        before = baseline.get(module)
+        if seconds is None or not before:
+            continue
+        if seconds > before * (1 + max_regression) and seconds - before > 0.02:
+            regressions.append((module, before, seconds))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time report for the app's dependencies.")
+    parser.add_argument("--report", action="store_true", help="measure and print import times")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", help="write the report to this JSON file")
+    parser.add_argument("--baseline", help="compare against a saved report")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args(argv)
+    if not args.report:
+        parser.print_help()
+        return 0
+
+    report = import_report(repeat=args.repeat)
+    for module, seconds in report.items():
+        shown = "not installed" if seconds is None else f"{seconds * 1000:8.1f} ms"
+        print(f"{module:<24} {shown}")
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.max_regression)
+        for module, before, after in regressions:
+            print(f"REGRESSION {module}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
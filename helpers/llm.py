@@ -0,0 +1,150 @@
+"""Thin wrappers around OpenAI chat calls used by the pages.
+
+Every call goes through span() so latency and token usage are recorded
+(see helpers/telemetry.py), and through the rate-limit scheduler
+(helpers/scheduler.py): priority= says who is waiting for the answer.
+shared_chat / shared_stream_chat also merge identical concurrent calls.
+"""
+import time
+
+from helpers.scheduler import INTERACTIVE, get_scheduler
+from helpers.singleflight import flight_key, get_flights
+from helpers.telemetry import span
+
+IMAGE_TOKEN_ESTIMATE = 800  # an image part at detail "auto"; "low" is ~85
+DEFAULT_COMPLETION_ESTIMATE = 512  # when the call sets no max_tokens
+
+
+def usage_to_dict(usage):
+    """prompt / cached / completion token counts from an OpenAI usage object."""
+    if usage is None:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "cached_tokens": cached,
+        "uncached_tokens": usage.prompt_tokens - cached,
+        "completion_tokens": usage.completion_tokens,
+    }
+
+
+def estimate_tokens(kwargs):
+    """Rough prompt + completion tokens of a chat call, for the scheduler's token bucket.
+
+    Characters / 4 is close enough here: the bucket is corrected with the real
+    usage when the call finishes.
+    """
+    total = 3
+    for m in kwargs.get("messages", []):
+        # An SDK message object is passed back as is after a tool call (Lab 5).
+        content = (m.get("content") if isinstance(m, dict) else getattr(m, "content", None)) or ""
+        if isinstance(content, list):
+            total += sum(IMAGE_TOKEN_ESTIMATE for part in content if part.get("type") == "image_url")
+            content = " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+        total += 4 + len(content) // 4
+    return total + (kwargs.get("max_tokens") or kwargs.get("max_completion_tokens") or DEFAULT_COMPLETION_ESTIMATE)
+
+
+def _create(client, kwargs):
+    """(response, headers); the raw-response API exposes the x-ratelimit-* headers.
+
+    The SDK's own retries are turned off: the scheduler retries 429s itself,
+    inside the rate-limit buckets.
+    """
+    if hasattr(client, "with_options"):
+        client = client.with_options(max_retries=0)
+    completions = client.chat.completions
+    raw_api = getattr(completions, "with_raw_response", None)
+    if raw_api is None:
+        return completions.create(**kwargs), None
+    raw = raw_api.create(**kwargs)
+    return raw.parse(), raw.headers
+
+
+def _used_tokens(usage):
+    if not usage:
+        return None
+    return usage["prompt_tokens"] + usage["completion_tokens"]
+
+
+def chat(client, page=None, priority=INTERACTIVE, deadline=None, **kwargs):
+    """client.chat.completions.create(...) (non-streaming), with telemetry and rate limiting."""
+    with span("llm.chat", page=page, model=kwargs.get("model")) as s:
+        response, ticket = get_scheduler().run(
+            kwargs.get("model"), estimate_tokens(kwargs), lambda: _create(client, kwargs), priority, deadline
+        )
+        usage = usage_to_dict(getattr(response, "usage", None))
+        ticket.release(_used_tokens(usage))
+        s["queued"] = ticket.waited
+        s.update({k: v for k, v in usage.items() if k != "uncached_tokens"})
+    return response
+
+
+def stream_chat(client, usage=None, page=None, priority=INTERACTIVE, deadline=None, **kwargs):
+    """Stream a chat completion as plain text chunks (for st.write_stream).
+
+    If a dict is passed as usage, it is filled with the token counts from the
+    final chunk once the stream is finished. Time to first token and tokens
+    per second are recorded with the span (ttft includes any time spent queued
+    for a rate-limit slot, which is also recorded on its own as "queued").
+    """
+    usage = {} if usage is None else usage
+    with span("llm.chat", page=page, model=kwargs.get("model"), stream=True) as s:
+        start = time.perf_counter()
+        first_token = None
+        params = dict(kwargs, stream=True, stream_options={"include_usage": True})
+        stream, ticket = get_scheduler().run(
+            kwargs.get("model"), estimate_tokens(kwargs), lambda: _create(client, params), priority, deadline
+        )
+        s["queued"] = ticket.waited
+        try:
+            for chunk in stream:
+                if chunk.choices:
+                    text = chunk.choices[0].delta.content
+                    if text:
+                        if first_token is None:
+                            first_token = time.perf_counter()
+                            s["ttft"] = first_token - start
+                        yield text
+                if getattr(chunk, "usage", None) is not None:
+                    usage.update(usage_to_dict(chunk.usage))
+        finally:
+            # Closing the SDK stream drops the HTTP response, so an abandoned
+            # stream (cancelled, or closed by its last reader) stops generating.
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+            ticket.release(_used_tokens(usage))
+        s.update({k: v for k, v in usage.items() if k != "uncached_tokens"})
+        if first_token is not None and usage.get("completion_tokens"):
+            generation = time.perf_counter() - first_token
+            if generation > 0:
+                s["tokens_per_second"] = usage["completion_tokens"] / generation
+
+
+def request_key(client, kwargs):
+    """Canonical key of a chat call: the same credentials, endpoint and parameters."""
+    return flight_key(getattr(client, "api_key", None), str(getattr(client, "base_url", "")), kwargs)
+
+
+def shared_chat(client, page=None, **kwargs):
+    """chat(), but identical calls in flight at the same time make one request (helpers/singleflight.py)."""
+    return get_flights().do(request_key(client, kwargs), lambda: chat(client, page=page, **kwargs), page=page)
+
+
+def shared_stream_chat(client, page=None, **kwargs):
+    """stream_chat() whose chunks are fanned out to every identical call in flight."""
+    return get_flights().stream(
+        request_key(client, kwargs), lambda: stream_chat(client, page=page, **kwargs), page=page
+    )
+
+
+def format_usage(usage):
+    if not usage:
+        return ""
+    return (
+        f"Prompt tokens: {usage['prompt_tokens']} "
+        f"({usage['cached_tokens']} cached, {usage['uncached_tokens']} uncached) · "
+        f"completion tokens: {usage['completion_tokens']}"
+    )
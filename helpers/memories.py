@@ -0,0 +1,66 @@
+"""Lab 9's long-term memory file and the system prompt built from it."""
+import json
+import os
+import re
+
+from helpers.paths import PROJECT_ROOT
+
+DEFAULT_MEMORIES_FILE = os.path.join(PROJECT_ROOT, "labs", "memories.json")
+
+BASE_SYSTEM = (
+    "You are a helpful, friendly assistant. Be concise unless the user asks for detail. "
+    "When long-term memories about the user are listed below, use them naturally in your "
+    "replies so the conversation feels continuous."
+)
+
+
+def memories_file():
+    # Read on every call so LAB9_MEMORIES_FILE can be set after import (the load test does).
+    return os.environ.get("LAB9_MEMORIES_FILE", DEFAULT_MEMORIES_FILE)
+
+
+def load_memories(path=None):
+    """Load memories from memories.json; return [] if the file does not exist."""
+    path = path or memories_file()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            return [str(m) for m in data if m]
+        return []
+    return []
+
+
+def save_memories(memories, path=None):
+    """Write a list of memories to memories.json."""
+    with open(path or memories_file(), "w", encoding="utf-8") as f:
+        json.dump(memories, f, ensure_ascii=False, indent=2)
+
+
+def build_system_prompt(memories):
+    if not memories:
+        return BASE_SYSTEM
+    lines = "\n".join(f"- {m}" for m in memories)
+    return (
+        f"{BASE_SYSTEM}\n\n"
+        "Here are things you remember about this user from past conversations:\n"
+        f"{lines}"
+    )
+
+
+def parse_json_fact_list(raw_text):
+    """Parse a JSON array of strings from the model; return [] on failure."""
+    text = (raw_text or "").strip()
+    if not text:
+        return []
+    # Strip ```json ... ``` fences if present
+    fence = re.match(r"^```(?:json)?\s*\n?(.*)\n?```\s*$", text, re.DOTALL | re.IGNORECASE)
+    if fence:
+        text = fence.group(1).strip()
+    try:
+        data = json.loads(text)
+        if isinstance(data, list):
+            return [str(x).strip() for x in data if str(x).strip()]
+        return []
+    except (json.JSONDecodeError, TypeError, ValueError):
+        return []
@@ -0,0 +1,281 @@
+"""Lab 6 movie recommendations: chains, the (small, finite) input space, and a
+local store of precomputed answers.
+
+The sidebar only offers genre x mood x persona, so every possible request can be
+answered ahead of time. Warm the store once from the command line:
+
+    python -m helpers.movie_recs --concurrency 4
+
+and the page becomes a lookup. Entries older than STALE_AFTER_SECONDS are still
+served, but a background refresh is started for them.
+"""
+import argparse
+import itertools
+import json
+import os
+import threading
+import time
+
+from helpers.paths import cache_path
+from helpers.singleflight import flight_key, get_flights
+from helpers.telemetry import langchain_callbacks
+
+MODEL = "gpt-4o-mini"
+
+GENRES = ("Action", "Comedy", "Horror", "Drama", "Sci-Fi", "Thriller", "Romance")
+MOODS = (
+    "Excited",
+    "Happy",
+    "Sad",
+    "Bored",
+    "Scared",
+    "Romantic",
+    "Curious",
+    "Tense",
+    "Melancholy",
+)
+PERSONAS = ("Film Critic", "Casual Friend", "Movie Journalist")
+
+RECOMMEND_TEMPLATE = """You are helping someone pick what to watch.
+
+Persona (adopt this voice, vocabulary, and attitude in your entire reply): {persona}
+Genre they want: {genre}
+Mood they are in: {mood}
+
+Recommend exactly 3 movies that fit the genre and mood.
+Write in the style of the persona above—match its tone (formal vs. casual, analytical vs. chatty, etc.).
+For each movie, give a short reason it fits their mood and genre choice.
+Use clear formatting (e.g. numbered list)."""
+
+FOLLOWUP_TEMPLATE = """You previously recommended these movies to the user:
+
+---
+{recommendations}
+---
+
+Answer their follow-up question clearly and helpfully. Stay grounded in the movies above;
+you may add brief general film context if it helps.
+
+User question:
+{question}"""
+
+# Precomputed answers older than this are refreshed in the background.
+STALE_AFTER_SECONDS = 7 * 24 * 60 * 60
+
+_STORE_FILE = cache_path("lab6_recommendations.json")
+
+
+def build_chains(api_key):
+    """Return (chain, followup_chain) for the recommendation and follow-up prompts."""
+    from langchain.chat_models import init_chat_model
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import PromptTemplate
+
+    llm = init_chat_model(MODEL, model_provider="openai", api_key=api_key)
+    chain = PromptTemplate.from_template(RECOMMEND_TEMPLATE) | llm | StrOutputParser()
+    followup_chain = PromptTemplate.from_template(FOLLOWUP_TEMPLATE) | llm | StrOutputParser()
+    return chain, followup_chain
+
+
+def combo_key(genre, mood, persona):
+    return f"{genre}|{mood}|{persona}"
+
+
+def all_combos():
+    """Every (genre, mood, persona) the sidebar can produce."""
+    return list(itertools.product(GENRES, MOODS, PERSONAS))
+
+
+class RecommendationStore:
+    """JSON file of precomputed recommendations, keyed by genre|mood|persona.
+
+    Safe to share between Streamlit sessions and background threads.
+    """
+
+    def __init__(self, path=_STORE_FILE, stale_after=STALE_AFTER_SECONDS):
+        self.path = path
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, encoding="utf-8") as f:
+                        data = json.load(f)
+                    if isinstance(data, dict):
+                        self._entries = data
+                except (OSError, json.JSONDecodeError):
+                    pass
+        return self._entries
+
+    def get(self, genre, mood, persona):
+        """Return the stored entry ({"text", "created_at", "model"}) or None."""
+        with self._lock:
+            entry = self._load().get(combo_key(genre, mood, persona))
+        if entry and entry.get("model") == MODEL and entry.get("text"):
+            return entry
+        return None
+
+    def is_stale(self, entry):
+        return time.time() - entry.get("created_at", 0) > self.stale_after
+
+    def missing(self, combos):
+        """Combos with no usable entry yet, or whose entry has gone stale."""
+        return [c for c in combos if not (e := self.get(*c)) or self.is_stale(e)]
+
+    def put_many(self, results):
+        """Store {(genre, mood, persona): text} and write the file."""
+        now = time.time()
+        with self._lock:
+            entries = self._load()
+            for combo, text in results.items():
+                entries[combo_key(*combo)] = {"text": text, "created_at": now, "model": MODEL}
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def put(self, genre, mood, persona, text):
+        self.put_many({(genre, mood, persona): text})
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide store shared by every session."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RecommendationStore()
+        return _store
+
+
+def recommend(chain, store, genre, mood, persona):
+    """Generate one combo now and store it; concurrent requests for the same combo share one call."""
+
+    def _run():
+        text = chain.invoke(
+            {"genre": genre, "mood": mood, "persona": persona},
+            config={"callbacks": langchain_callbacks("lab6", MODEL)},
+        )
+        store.put(genre, mood, persona, text)
+        return text
+
+    return get_flights().do(flight_key("lab6", MODEL, genre, mood, persona), _run, page="lab6")
+
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def refresh_in_background(chain, store, genre, mood, persona):
+    """Regenerate one stale entry on a daemon thread (at most one refresh per combo)."""
+    key = combo_key(genre, mood, persona)
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def _run():
+        try:
+            recommend(chain, store, genre, mood, persona)
+        except Exception:
+            pass  # keep serving the stale answer; the next lookup will retry
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=_run, daemon=True).start()
+
+
+def _is_rate_limit(exc):
+    # openai.RateLimitError (and LangChain's re-raise of it) carries status_code 429.
+    return getattr(exc, "status_code", None) == 429
+
+
+def warm_up(
+    chain,
+    store,
+    combos=None,
+    max_concurrency=4,
+    batch_size=21,
+    max_retries=5,
+    force=False,
+    log=print,
+):
+    """Run chain.batch over every combo and save the answers to the store.
+
+    At most max_concurrency requests are in flight at once. Calls that hit a
+    rate limit are retried with exponential backoff; other failures are
+    reported and skipped so one bad combo does not stop the job.
+    """
+    combos = list(combos or all_combos())
+    todo = combos if force else store.missing(combos)
+    log(f"{len(todo)} of {len(combos)} combinations to generate.")
+    done = 0
+    failed = []
+    for start in range(0, len(todo), batch_size):
+        pending = todo[start:start + batch_size]
+        delay = 2.0
+        for attempt in range(max_retries + 1):
+            inputs = [{"genre": g, "mood": m, "persona": p} for g, m, p in pending]
+            outputs = chain.batch(
+                inputs,
+                config={"max_concurrency": max_concurrency},
+                return_exceptions=True,
+            )
+            results = {}
+            rate_limited = []
+            for combo, out in zip(pending, outputs):
+                if not isinstance(out, Exception):
+                    results[combo] = out
+                elif _is_rate_limit(out):
+                    rate_limited.append(combo)
+                else:
+                    failed.append((combo, out))
+            if results:
+                store.put_many(results)
+                done += len(results)
+            pending = rate_limited
+            if not pending:
+                break
+            if attempt < max_retries:
+                log(f"Rate limited on {len(pending)} requests; retrying in {delay:.0f}s.")
+                time.sleep(delay)
+                delay = min(delay * 2, 60.0)
+        else:
+            failed.extend((combo, "rate limited") for combo in pending)
+        log(f"Progress: {done}/{len(todo)}")
+    for combo, err in failed:
+        log(f"Failed {combo_key(*combo)}: {err}")
+    return done, failed
+
+
+def main(argv=None):
+    from helpers.config import get_secret
+
+    parser = argparse.ArgumentParser(description="Precompute every Lab 6 recommendation.")
+    parser.add_argument("--concurrency", type=int, default=4, help="max requests in flight")
+    parser.add_argument("--batch-size", type=int, default=21)
+    parser.add_argument("--force", action="store_true", help="regenerate existing entries too")
+    args = parser.parse_args(argv)
+
+    chain, _ = build_chains(get_secret("openai_api_key"))
+    done, failed = warm_up(
+        chain,
+        get_store(),
+        max_concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        force=args.force,
+    )
+    print(f"Done: {done} generated, {len(failed)} failed. Store: {get_store().path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,16 @@
+import os
+
+# Repo root (one level above this package). Streamlit runs from here, so the
+# pages and the command-line jobs resolve the same files.
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Local, git-ignored folder for anything the app generates at runtime.
+# LAB_CACHE_DIR moves it elsewhere (the load test uses a scratch folder).
+CACHE_DIR = os.path.join(PROJECT_ROOT, ".cache")
+
+
+def cache_path(*parts):
+    """Return a path inside the cache folder, creating the parent folder if needed."""
+    path = os.path.join(os.environ.get("LAB_CACHE_DIR") or CACHE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
@@ -0,0 +1,33 @@
+"""Prompt layout that keeps the start of every request identical between turns.
+
+OpenAI caches prompt prefixes (requests of 1024+ tokens, matched from the first
+token), so anything that changes per request must come as late as possible:
+
+    system instructions -> running summary -> older history
+    -> volatile context (e.g. RAG excerpts) -> latest user message
+
+Tool schemas are sent in a canonical order for the same reason.
+"""
+import json
+
+from helpers.compaction import fit_to_budget
+
+
+def layout_messages(stable_messages, history, volatile_messages=(), max_tokens=None):
+    """Return stable + history, with volatile_messages placed just before the latest user turn.
+
+    With max_tokens, the oldest history is dropped first so everything fits.
+    """
+    stable_messages = list(stable_messages)
+    volatile_messages = list(volatile_messages)
+    if max_tokens is not None:
+        history = fit_to_budget(stable_messages + volatile_messages, history, max_tokens)
+    if history and history[-1]["role"] == "user":
+        return stable_messages + history[:-1] + volatile_messages + history[-1:]
+    return stable_messages + history + volatile_messages
+
+
+def canonical_tools(tools):
+    """Tool schemas with sorted keys and a fixed order, so they serialise identically."""
+    tools = [json.loads(json.dumps(t, sort_keys=True)) for t in tools]
+    return sorted(tools, key=lambda t: t.get("function", {}).get("name", ""))
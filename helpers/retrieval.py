@@ -0,0 +1,195 @@
+"""Post-processing for vector search results before they go into a prompt.
+
+    over-fetch -> local rerank -> MMR (drop near-duplicates) -> pack into a token budget
+
+The vector search returns more candidates than we need (fetch_k). Each one is
+rescored with a mix of vector similarity and query-term overlap, then maximal
+marginal relevance picks passages that are relevant but not redundant with the
+ones already picked, and the best of those are packed greedily until the
+context token budget is used up. The prompt size is therefore fixed by the
+budget, not by how long the retrieved passages happen to be.
+"""
+import math
+import re
+from collections import Counter
+
+from helpers.tokens import count_text_tokens
+
+FETCH_K = 12
+MMR_LAMBDA = 0.7  # 1.0 = relevance only, 0.0 = diversity only
+VECTOR_WEIGHT = 0.6  # rest is lexical overlap
+DUPLICATE_SIMILARITY = 0.95  # passages this close to a picked one are dropped outright
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or "
+    "the this to was what when where which who why will with you your about course class".split()
+)
+
+
+def _terms(text):
+    return [t for t in re.findall(r"[a-z0-9]+", (text or "").lower()) if t not in _STOPWORDS]
+
+
+def build_lexical_index(texts):
+    """Corpus statistics for lexical_scores: {"n", "avg_len", "df": {term: documents containing it}}."""
+    df = Counter()
+    total = 0
+    for text in texts:
+        terms = _terms(text)
+        total += len(terms)
+        df.update(set(terms))
+    return {"n": len(texts), "avg_len": total / len(texts) if texts else 0.0, "df": dict(df)}
+
+
+def lexical_scores(query, texts, corpus=None):
+    """BM25-style overlap of the query terms with each text, scaled to 0..1.
+
+    Term rarity comes from corpus (build_lexical_index over the whole
+    collection) when given, otherwise from texts themselves.
+    """
+    q_terms = set(_terms(query))
+    if not q_terms or not texts:
+        return [0.0] * len(texts)
+    docs = [Counter(_terms(t)) for t in texts]
+    if corpus:
+        n, avg_len = corpus["n"], corpus["avg_len"] or 1.0
+        doc_freq = {term: corpus["df"].get(term, 0) for term in q_terms}
+    else:
+        n, avg_len = len(docs), sum(sum(d.values()) for d in docs) / len(docs) or 1.0
+        doc_freq = {term: sum(1 for d in docs if term in d) for term in q_terms}
+    scores = []
+    for d in docs:
+        length = sum(d.values()) or 1
+        score = 0.0
+        for term in q_terms:
+            tf = d.get(term, 0)
+            if not tf:
+                continue
+            df = doc_freq[term]
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            score += idf * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * length / avg_len))
+        scores.append(score)
+    top = max(scores) or 1.0
+    return [s / top for s in scores]
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a)) or 1.0
+    nb = math.sqrt(sum(y * y for y in b)) or 1.0
+    return dot / (na * nb)
+
+
+def candidates_from_chroma(results):
+    """Flatten a Chroma query result (single query) into a list of candidate dicts."""
+    if not results or not results.get("ids") or not results["ids"][0]:
+        return []
+    n = len(results["ids"][0])
+
+    def column(key):
+        values = results.get(key)
+        return values[0] if values is not None and len(values) and values[0] is not None else [None] * n
+
+    return [
+        {
+            "id": id_,
+            "text": doc or "",
+            "meta": meta or {},
+            "distance": dist,
+            "embedding": list(emb) if emb is not None else None,
+        }
+        for id_, doc, meta, dist, emb in zip(
+            results["ids"][0],
+            column("documents"),
+            column("metadatas"),
+            column("distances"),
+            column("embeddings"),
+        )
+    ]
+
+
+def rerank(query, candidates, corpus=None):
+    """Set candidate["score"] (0..1) from vector distance and term overlap; best first."""
+    if not candidates:
+        return []
+    lexical = lexical_scores(query, [c["text"] for c in candidates], corpus)
+    distances = [c["distance"] for c in candidates if c["distance"] is not None]
+    lo, hi = (min(distances), max(distances)) if distances else (0.0, 0.0)
+    for c, lex in zip(candidates, lexical):
+        if c["distance"] is None or hi == lo:
+            vec = 1.0
+        else:
+            vec = 1.0 - (c["distance"] - lo) / (hi - lo)
+        c["score"] = VECTOR_WEIGHT * vec + (1 - VECTOR_WEIGHT) * lex
+    return sorted(candidates, key=lambda c: c["score"], reverse=True)
+
+
+def mmr(candidates, lambda_=MMR_LAMBDA):
+    """Order candidates by maximal marginal relevance (needs "score"; uses embeddings if present).
+
+    Near-duplicates of an already selected passage are left out.
+    """
+    remaining = list(candidates)
+    selected = []
+    similarity = {}  # (i, j) -> sim, each pair is computed at most once
+
+    def sim_between(c, s):
+        key = (id(c), id(s))
+        if key not in similarity:
+            if c["embedding"] is not None and s["embedding"] is not None:
+                similarity[key] = _cosine(c["embedding"], s["embedding"])
+            else:  # no embeddings: fall back to word overlap
+                a, b = set(_terms(c["text"])), set(_terms(s["text"]))
+                similarity[key] = len(a & b) / (len(a | b) or 1)
+        return similarity[key]
+
+    while remaining:
+        best, best_value = None, None
+        duplicates = []
+        for c in remaining:
+            redundancy = max((sim_between(c, s) for s in selected), default=0.0)
+            if redundancy >= DUPLICATE_SIMILARITY:
+                duplicates.append(c)
+                continue
+            value = lambda_ * c["score"] - (1 - lambda_) * redundancy
+            if best_value is None or value > best_value:
+                best, best_value = c, value
+        for c in duplicates:
+            remaining.remove(c)
+        if best is None:
+            break
+        selected.append(best)
+        remaining.remove(best)
+    return selected
+
+
+def pack(candidates, token_budget, max_passages=None, format_passage=None, separator=""):
+    """Greedily take candidates (in order) whose tokens still fit in token_budget.
+
+    format_passage(candidate) is the passage as it appears in the prompt (with
+    its source label), and separator is what joins passages; both are charged
+    to the budget. A passage that does not fit is skipped, so a smaller one
+    further down can still use the room. Sets candidate["tokens"].
+    """
+    packed = []
+    used = 0
+    separator_tokens = count_text_tokens(separator) if separator else 0
+    for c in candidates:
+        if max_passages is not None and len(packed) >= max_passages:
+            break
+        c["tokens"] = count_text_tokens(format_passage(c) if format_passage else c["text"])
+        cost = c["tokens"] + (separator_tokens if packed else 0)
+        if used + cost <= token_budget:
+            packed.append(c)
+            used += cost
+    return packed
+
+
+def select_context(query, results, token_budget, max_passages=None, corpus=None, format_passage=None, separator=""):
+    """rerank + MMR + pack for one Chroma query result; returns the chosen candidates.
+
+    corpus is the collection's lexical index (build_lexical_index), if it has one.
+    format_passage and separator are passed to pack().
+    """
+    candidates = mmr(rerank(query, candidates_from_chroma(results), corpus))
+    return pack(candidates, token_budget, max_passages, format_passage, separator)
@@ -0,0 +1,315 @@
+"""Process-wide admission control for OpenAI calls.
+
+Every chat and embedding call asks the scheduler for a slot before it goes
+out (helpers.llm and helpers.embeddings do this). Per model there are two
+token buckets, requests per minute and tokens per minute, and a queue ordered
+by priority class, then arrival:
+
+    INTERACTIVE  a user is watching (chat answers, retrieval, vision)
+    BACKGROUND   nice to have soon (summaries, speculative answers)
+    BATCH        nobody is waiting (memory extraction, index builds, warm-up)
+
+A waiter gives up with SchedulerTimeout when its deadline passes, instead of
+queueing forever behind a spike. The buckets follow the x-ratelimit-* response
+headers (limit, remaining, reset), and a 429 pauses the whole model for
+retry-after (or an exponential backoff) and is retried, so a burst turns into
+a short queue rather than a 429 for every user.
+
+Limits default to DEFAULT_LIMITS and can be set per model with
+LAB_RATE_LIMITS='{"gpt-4o": [500, 30000]}' (requests/min, tokens/min).
+"""
+import heapq
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from helpers.telemetry import inc, set_gauge
+
+INTERACTIVE = 0
+BACKGROUND = 1
+BATCH = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background", BATCH: "batch"}
+
+# How long a call may wait for a slot, by priority (None: no limit).
+DEFAULT_WAIT_SECONDS = {INTERACTIVE: 30.0, BACKGROUND: 120.0, BATCH: None}
+
+DEFAULT_LIMITS = (500, 200_000)  # requests/min, tokens/min
+MODEL_LIMITS = {
+    "text-embedding-3-small": (3000, 1_000_000),
+}
+
+MAX_RETRIES = 4
+MIN_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+
+
+class SchedulerTimeout(RuntimeError):
+    """No slot became free before the call's deadline."""
+
+
+def is_rate_limit(exc):
+    return getattr(exc, "status_code", None) == 429
+
+
+def _limits_for(model):
+    configured = {}
+    raw = os.environ.get("LAB_RATE_LIMITS")
+    if raw:
+        try:
+            configured = {k: tuple(v) for k, v in json.loads(raw).items()}
+        except (ValueError, TypeError):
+            configured = {}
+    return configured.get(model) or MODEL_LIMITS.get(model) or DEFAULT_LIMITS
+
+
+def parse_duration(text):
+    """Seconds from an OpenAI reset header: "1s", "6m0s", "20ms", "0.5s"."""
+    if text is None:
+        return None
+    total = 0.0
+    found = False
+    for value, unit in re.findall(r"([\d.]+)\s*(ms|h|m|s)", str(text)):
+        found = True
+        total += float(value) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    if found:
+        return total
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount is available (amounts above capacity wait for a full bucket)."""
+        self._refill(now)
+        need = min(amount, self.capacity)
+        if self.level >= need:
+            return 0.0
+        return (need - self.level) * 60.0 / self.capacity
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+    def sync(self, limit=None, remaining=None):
+        """Align with the server's view from rate-limit headers (never more optimistic than ours)."""
+        self._refill(time.monotonic())
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.level = min(self.level, float(remaining))
+
+
+class _ModelQueue:
+    def __init__(self, model):
+        rpm, tpm = _limits_for(model)
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.blocked_until = 0.0  # set by a 429
+        self.backoff = 0.0
+        self.waiters = []  # heap of [priority, seq]
+        self.cond = threading.Condition()
+
+    def wait_time(self, tokens, now):
+        return max(
+            self.blocked_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(tokens, now),
+        )
+
+
+class Ticket:
+    """An admitted call; release() with the real token count when it is done."""
+
+    def __init__(self, queue, tokens, waited):
+        self.queue = queue
+        self.tokens = tokens
+        self.waited = waited
+        self.released = False
+
+    def release(self, used_tokens=None):
+        if self.released:
+            return
+        self.released = True
+        with self.queue.cond:
+            if used_tokens is not None and used_tokens != self.tokens:
+                if used_tokens < self.tokens:
+                    self.queue.tokens.give_back(self.tokens - used_tokens)
+                else:
+                    self.queue.tokens.take(used_tokens - self.tokens)
+            self.queue.cond.notify_all()
+
+
+class Scheduler:
+    def __init__(self):
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+
+    def _queue(self, model):
+        with self._lock:
+            queue = self._queues.get(model)
+            if queue is None:
+                queue = self._queues[model] = _ModelQueue(model)
+            return queue
+
+    def acquire(self, model, tokens, priority=INTERACTIVE, deadline=None):
+        """Block until the call may go out; returns a Ticket.
+
+        deadline is a time.monotonic() value; SchedulerTimeout is raised when
+        it passes first.
+        """
+        queue = self._queue(model)
+        waiter = [priority, next(self._seq)]
+        start = time.monotonic()
+        with queue.cond:
+            heapq.heappush(queue.waiters, waiter)
+            set_gauge("scheduler_waiting", len(queue.waiters), model=model)
+            try:
+                while True:
+                    now = time.monotonic()
+                    timeout = None
+                    if queue.waiters[0] is waiter:
+                        timeout = queue.wait_time(tokens, now)
+                        if timeout <= 0:
+                            heapq.heappop(queue.waiters)
+                            set_gauge("scheduler_waiting", len(queue.waiters), model=model)
+                            queue.requests.take(1)
+                            queue.tokens.take(tokens)
+                            queue.cond.notify_all()  # the next waiter becomes the head
+                            waited = now - start
+                            if waited > 0.01:
+                                inc(f"scheduler_queued_{PRIORITY_NAMES.get(priority, 'other')}_total", model=model)
+                            return Ticket(queue, tokens, waited)
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            inc(f"scheduler_timeouts_{PRIORITY_NAMES.get(priority, 'other')}_total", model=model)
+                            raise SchedulerTimeout(
+                                f"{model} is busy (rate limit); the request waited {now - start:.0f}s. "
+                                "Please try again in a moment."
+                            )
+                        timeout = remaining if timeout is None else min(timeout, remaining)
+                    queue.cond.wait(timeout)
+            except BaseException:
+                if waiter in queue.waiters:
+                    queue.waiters.remove(waiter)
+                    heapq.heapify(queue.waiters)
+                    set_gauge("scheduler_waiting", len(queue.waiters), model=model)
+                    queue.cond.notify_all()
+                raise
+
+    def observe_headers(self, model, headers):
+        """Feed x-ratelimit-* response headers back into the buckets; a success resets backoff."""
+        queue = self._queue(model)
+        get = (headers or {}).get
+        with queue.cond:
+            queue.backoff = 0.0
+            queue.requests.sync(
+                limit=_int(get("x-ratelimit-limit-requests")),
+                remaining=_int(get("x-ratelimit-remaining-requests")),
+            )
+            queue.tokens.sync(
+                limit=_int(get("x-ratelimit-limit-tokens")),
+                remaining=_int(get("x-ratelimit-remaining-tokens")),
+            )
+            queue.cond.notify_all()
+
+    def rate_limited(self, model, headers=None):
+        """Pause the model after a 429: retry-after if given, else exponential backoff."""
+        queue = self._queue(model)
+        get = (headers or {}).get
+        retry_after = None
+        if get("retry-after-ms") is not None:
+            retry_after = (_int(get("retry-after-ms")) or 0) / 1000.0
+        elif get("retry-after") is not None:
+            retry_after = parse_duration(get("retry-after"))
+        if retry_after is None:
+            retry_after = parse_duration(get("x-ratelimit-reset-requests") or get("x-ratelimit-reset-tokens"))
+        with queue.cond:
+            queue.backoff = min(MAX_BACKOFF_SECONDS, max(MIN_BACKOFF_SECONDS, queue.backoff * 2))
+            pause = retry_after if retry_after is not None else queue.backoff
+            queue.blocked_until = max(queue.blocked_until, time.monotonic() + pause)
+            queue.requests.level = min(queue.requests.level, 0.0)
+            queue.cond.notify_all()
+        inc("scheduler_rate_limited_total", model=model)
+
+    def run(self, model, tokens, call, priority=INTERACTIVE, deadline=None):
+        """Admit, call() -> (result, headers), retry 429s; returns (result, Ticket).
+
+        The caller releases the ticket with the actual token count.
+        """
+        if deadline is None and DEFAULT_WAIT_SECONDS.get(priority) is not None:
+            deadline = time.monotonic() + DEFAULT_WAIT_SECONDS[priority]
+        for attempt in range(MAX_RETRIES + 1):
+            ticket = self.acquire(model, tokens, priority, deadline)
+            try:
+                result, headers = call()
+            except Exception as e:
+                ticket.release(0)
+                if is_rate_limit(e) and attempt < MAX_RETRIES:
+                    response = getattr(e, "response", None)
+                    self.rate_limited(model, getattr(response, "headers", None))
+                    continue
+                raise
+            if headers:
+                self.observe_headers(model, headers)
+            return result, ticket
+
+    def snapshot(self):
+        """{model: {"requests", "tokens", "queued", "blocked_for"}} for diagnostics."""
+        now = time.monotonic()
+        with self._lock:
+            queues = dict(self._queues)
+        out = {}
+        for model, queue in queues.items():
+            with queue.cond:
+                out[model] = {
+                    "requests": round(queue.requests.level, 1),
+                    "tokens": round(queue.tokens.level),
+                    "queued": len(queue.waiters),
+                    "blocked_for": round(max(0.0, queue.blocked_until - now), 2),
+                }
+        return out
+
+
+def _int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+_scheduler = Scheduler()
+
+
+def get_scheduler():
+    return _scheduler
+
+
+@contextmanager
+def warn_when_busy():
+    """In a page: show a SchedulerTimeout from the block as a warning and end this run."""
+    try:
+        yield
+    except SchedulerTimeout as e:
+        import streamlit as st
+
+        st.warning(str(e))
+        st.stop()
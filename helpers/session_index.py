@@ -0,0 +1,148 @@
+"""Small in-memory index over the files uploaded in one session (Lab 1).
+
+Files are keyed by the SHA-256 of their bytes: a file is chunked and embedded
+once, the first time it is seen, and a rerun with the same uploads costs only
+a dictionary lookup. A question embeds just the question and scores it
+against one matrix, so its cost depends on the answer size (the context
+budget), not on how many files were uploaded.
+
+Keep one SessionIndex per session in st.session_state; nothing touches disk.
+"""
+import hashlib
+import io
+
+from helpers.ingest import DocumentRef, read_pages
+from helpers.retrieval import FETCH_K, select_context
+from helpers.syllabus_index import chunk_sections, split_sections
+from helpers.telemetry import span
+
+EMBED_BATCH = 256  # chunks per embeddings request
+
+
+def file_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class SessionIndex:
+    """Chunks + unit-length embeddings for every file currently uploaded."""
+
+    def __init__(self, embed, page=None):
+        self.embed = embed  # texts -> vectors, e.g. helpers.embeddings.OpenAIEmbedder
+        self.page = page
+        self.files = {}  # sha256 -> {"name", "chunks": [(section, text)], "error"}
+        self._hash_by_upload = {}  # upload id -> sha256, so reruns do not re-hash
+        self._active = []  # sha256 of the current uploads, in upload order
+        self._matrix = None
+        self._rows = []  # (sha256, chunk number) for each matrix row
+
+    def sync(self, uploads):
+        """Make the index match uploads ([(upload_id, name, read_bytes)]); returns new file names.
+
+        read_bytes() is only called for uploads not seen before. New files are
+        only recorded once they are embedded, so if embedding raises they are
+        read and embedded again on the next call.
+        """
+        active, new, hashed = [], {}, {}
+        for upload_id, name, read_bytes in uploads:
+            digest = self._hash_by_upload.get(upload_id)
+            if digest is None:
+                data = read_bytes()
+                digest = hashed[upload_id] = file_hash(data)
+                if digest not in self.files and digest not in new:
+                    new[digest] = self._chunk(name, data)
+            if digest not in active:
+                active.append(digest)
+        if new:
+            self._embed_new(new)
+            self.files.update(new)
+        self._hash_by_upload.update(hashed)
+        if new or active != self._active:
+            self._active = active
+            self._rebuild()
+        return [entry["name"] for entry in new.values()]
+
+    def errors(self):
+        return [(self.files[d]["name"], self.files[d]["error"]) for d in self._active if self.files[d]["error"]]
+
+    def memory_bytes(self):
+        """Approximate bytes held: chunk text plus the embedding matrix and vectors."""
+        text = sum(len(t) for f in self.files.values() for _, t in f["chunks"])
+        vectors = sum(v.nbytes for f in self.files.values() for v in f["vectors"])
+        return text + vectors + (self._matrix.nbytes if self._matrix is not None else 0)
+
+    def names(self):
+        return [self.files[d]["name"] for d in self._active]
+
+    def _chunk(self, name, data):
+        doc = DocumentRef("upload", name, len(data), file_hash(data), lambda: io.BytesIO(data))
+        try:
+            chunks = chunk_sections(split_sections(list(read_pages(doc))))
+        except Exception as e:
+            return {"name": name, "chunks": [], "vectors": [], "error": str(e)}
+        return {"name": name, "chunks": chunks, "vectors": [], "error": None}
+
+    def _embed_new(self, entries):
+        """Fill in the vectors of entries ({sha256: file entry}); raises if a batch fails."""
+        import numpy as np
+
+        texts, owners = [], []
+        for entry in entries.values():
+            for section, text in entry["chunks"]:
+                texts.append(f"{entry['name']} — {text}")
+                owners.append(entry)
+        with span("index.embed", page=self.page, files=len(entries), chunks=len(texts)):
+            for start in range(0, len(texts), EMBED_BATCH):
+                vectors = self.embed(texts[start:start + EMBED_BATCH])
+                for entry, vector in zip(owners[start:start + EMBED_BATCH], vectors):
+                    # float32 arrays: a list of Python floats is ~7x the size
+                    entry["vectors"].append(np.asarray(vector, dtype=np.float32))
+
+    def _rebuild(self):
+        import numpy as np
+
+        rows, vectors = [], []
+        for digest in self._active:
+            entry = self.files[digest]
+            for i, vector in enumerate(entry["vectors"]):
+                rows.append((digest, i))
+                vectors.append(vector)
+        self._rows = rows
+        if not vectors:
+            self._matrix = None
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        self._matrix = matrix
+
+    def search(self, question, token_budget, fetch_k=FETCH_K, format_passage=None, separator=""):
+        """Passages for question (rerank + MMR + pack, see helpers.retrieval), best first.
+
+        Each passage's meta has "filename" and "section" for citing.
+        format_passage and separator are charged to token_budget as in pack().
+        """
+        import numpy as np
+
+        if self._matrix is None:
+            return []
+        q = np.asarray(self.embed([question])[0], dtype=np.float32)
+        q /= max(float(np.linalg.norm(q)), 1e-12)
+        sims = self._matrix @ q
+        k = min(fetch_k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        ids, documents, metadatas = [], [], []
+        for row in top:
+            digest, i = self._rows[row]
+            name = self.files[digest]["name"]
+            section, text = self.files[digest]["chunks"][i]
+            ids.append(f"{digest[:12]}#{i}")
+            documents.append(text)
+            metadatas.append({"filename": name, "section": section})
+        results = {
+            "ids": [ids],
+            "documents": [documents],
+            "metadatas": [metadatas],
+            "distances": [[float(1.0 - sims[row]) for row in top]],
+            "embeddings": [self._matrix[top]],
+        }
+        return select_context(question, results, token_budget, format_passage=format_passage, separator=separator)
@@ -0,0 +1,274 @@
+"""Memory budget for large per-session values, with spill to disk.
+
+Streamlit keeps st.session_state for as long as a browser tab is open, so a
+few MB per user (an uploaded image, a document index) adds up quickly with
+hundreds of sessions. Large values go through a SessionMemory instead:
+
+    blobs = session_blobs()            # bound to the current browser session
+    blobs.put("lab8_upload", data)     # bytes, kept in memory while there is room
+    data = blobs.get("lab8_upload")    # read back from disk if it was spilled
+    blobs.track("lab4_messages", msgs) # count a value that stays in session_state
+
+Each session has SESSION_BUDGET_BYTES and the process GLOBAL_BUDGET_BYTES;
+when either is exceeded the least recently used blobs are written to
+.cache/session_spill/ and dropped from memory. Sessions idle for
+IDLE_SECONDS have all their blobs spilled, and their files are deleted after
+SPILL_TTL_SECONDS. Totals are published as telemetry gauges (Diagnostics
+panel and metrics.prom).
+"""
+import os
+import shutil
+import sys
+import threading
+import time
+
+from helpers.paths import cache_path
+from helpers.telemetry import set_gauge
+
+MB = 2**20
+SESSION_BUDGET_BYTES = int(float(os.environ.get("LAB_SESSION_BUDGET_MB", 16)) * MB)
+GLOBAL_BUDGET_BYTES = int(float(os.environ.get("LAB_GLOBAL_BUDGET_MB", 256)) * MB)
+IDLE_SECONDS = 30 * 60
+SPILL_TTL_SECONDS = 24 * 60 * 60
+SWEEP_INTERVAL_SECONDS = 30
+
+
+def approx_size(value, _depth=0):
+    """Rough deep size in bytes of str/bytes/list/dict values (objects count shallowly)."""
+    size = sys.getsizeof(value)
+    if _depth > 4:
+        return size
+    if isinstance(value, dict):
+        size += sum(approx_size(k, _depth + 1) + approx_size(v, _depth + 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(approx_size(v, _depth + 1) for v in value)
+    return size
+
+
+class _Blob:
+    def __init__(self, data):
+        self.data = data
+        self.size = len(data)
+        self.path = None  # set once written to disk
+        self.last_used = time.monotonic()
+
+
+class _Session:
+    def __init__(self):
+        self.blobs = {}
+        self.tracked = {}  # name -> bytes of values that stay in session_state
+        self.last_active = time.monotonic()
+
+    def memory_bytes(self):
+        return sum(b.size for b in self.blobs.values() if b.data is not None) + sum(self.tracked.values())
+
+    def disk_bytes(self):
+        return sum(b.size for b in self.blobs.values() if b.data is None)
+
+
+class SessionMemory:
+    """Blobs for every session in the process; thread-safe."""
+
+    def __init__(self, spill_dir=None, session_budget=SESSION_BUDGET_BYTES, global_budget=GLOBAL_BUDGET_BYTES,
+                 idle_seconds=IDLE_SECONDS, spill_ttl=SPILL_TTL_SECONDS):
+        self.spill_dir = spill_dir or os.path.dirname(cache_path("session_spill", "x"))
+        self.session_budget = session_budget
+        self.global_budget = global_budget
+        self.idle_seconds = idle_seconds
+        self.spill_ttl = spill_ttl
+        self.spills = 0
+        self.reloads = 0
+        self.evicted_sessions = 0
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def _session(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session()
+        session.last_active = time.monotonic()
+        return session
+
+    def put(self, session_id, name, data):
+        """Store bytes under name for the session (replacing any previous value)."""
+        data = bytes(data)
+        with self._lock:
+            session = self._session(session_id)
+            self._discard(session.blobs.pop(name, None))
+            session.blobs[name] = _Blob(data)
+            self._enforce(session_id)
+        self._maybe_sweep()
+
+    def get(self, session_id, name):
+        """The bytes stored under name (reloaded from disk if spilled), or None."""
+        with self._lock:
+            session = self._session(session_id)
+            blob = session.blobs.get(name)
+            if blob is None:
+                return None
+            blob.last_used = time.monotonic()
+            if blob.data is None:
+                with open(blob.path, "rb") as f:
+                    blob.data = f.read()
+                self.reloads += 1
+                self._enforce(session_id, keep=blob)
+            data = blob.data
+        self._maybe_sweep()
+        return data
+
+    def delete(self, session_id, name):
+        with self._lock:
+            session = self._session(session_id)
+            self._discard(session.blobs.pop(name, None))
+
+    def track(self, session_id, name, value=None, size=None):
+        """Count a value that lives in session_state (it cannot be spilled, only reported)."""
+        size = approx_size(value) if size is None else size
+        with self._lock:
+            session = self._session(session_id)
+            session.tracked[name] = size
+            self._enforce(session_id)
+        self._maybe_sweep()
+
+    # --- budget -------------------------------------------------------------
+
+    def _spill(self, session_id, name, blob):
+        if blob.path is None:
+            directory = os.path.join(self.spill_dir, session_id)
+            os.makedirs(directory, exist_ok=True)
+            blob.path = os.path.join(directory, f"{name}.bin")
+            with open(blob.path, "wb") as f:
+                f.write(blob.data)
+        blob.data = None  # the file still holds the same bytes; writing once is enough
+        self.spills += 1
+
+    def _discard(self, blob):
+        if blob is not None and blob.path:
+            try:
+                os.remove(blob.path)
+            except OSError:
+                pass
+
+    def _resident(self, session_ids=None):
+        """[(last_used, session_id, name, blob)] for blobs held in memory, oldest first."""
+        return sorted(
+            (
+                (blob.last_used, sid, name, blob)
+                for sid, session in self._sessions.items()
+                if session_ids is None or sid in session_ids
+                for name, blob in session.blobs.items()
+                if blob.data is not None
+            ),
+            key=lambda item: item[0],
+        )
+
+    def _enforce(self, session_id, keep=None):
+        session = self._sessions[session_id]
+        for _, sid, name, blob in self._resident({session_id}):
+            if session.memory_bytes() <= self.session_budget:
+                break
+            if blob is not keep:
+                self._spill(sid, name, blob)
+        total = sum(s.memory_bytes() for s in self._sessions.values())
+        for _, sid, name, blob in self._resident():
+            if total <= self.global_budget:
+                break
+            if blob is not keep:
+                self._spill(sid, name, blob)
+                total -= blob.size
+
+    # --- idle sessions ------------------------------------------------------
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep >= SWEEP_INTERVAL_SECONDS:
+            self.sweep(now)
+
+    def sweep(self, now=None):
+        """Spill idle sessions, forget expired ones, and publish the gauges."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._last_sweep = now
+            for sid, session in list(self._sessions.items()):
+                idle = now - session.last_active
+                if idle > self.spill_ttl:
+                    shutil.rmtree(os.path.join(self.spill_dir, sid), ignore_errors=True)
+                    del self._sessions[sid]
+                elif idle > self.idle_seconds and session.memory_bytes():
+                    for name, blob in session.blobs.items():
+                        if blob.data is not None:
+                            self._spill(sid, name, blob)
+                    session.tracked.clear()  # the page re-reports these if the user comes back
+                    self.evicted_sessions += 1
+        self._publish()
+
+    def stats(self):
+        with self._lock:
+            sessions = {
+                sid: {"memory_bytes": s.memory_bytes(), "disk_bytes": s.disk_bytes(), "blobs": len(s.blobs)}
+                for sid, s in self._sessions.items()
+            }
+        return {
+            "sessions": len(sessions),
+            "memory_bytes": sum(s["memory_bytes"] for s in sessions.values()),
+            "disk_bytes": sum(s["disk_bytes"] for s in sessions.values()),
+            "max_session_bytes": max((s["memory_bytes"] for s in sessions.values()), default=0),
+            "spills": self.spills,
+            "reloads": self.reloads,
+            "evicted_sessions": self.evicted_sessions,
+            "per_session": sessions,
+        }
+
+    def _publish(self):
+        stats = self.stats()
+        for key in ("sessions", "memory_bytes", "disk_bytes", "max_session_bytes", "spills", "reloads",
+                    "evicted_sessions"):
+            set_gauge(f"session_memory_{key}", stats[key])
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_session_memory():
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = SessionMemory()
+        return _memory
+
+
+def current_session_id():
+    """Streamlit's id for the browser session running this script ("local" outside Streamlit)."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        ctx = get_script_run_ctx()
+    except Exception:
+        ctx = None
+    return ctx.session_id if ctx is not None else "local"
+
+
+class SessionBlobs:
+    """SessionMemory methods bound to one session id."""
+
+    def __init__(self, memory, session_id):
+        self.memory = memory
+        self.session_id = session_id
+
+    def put(self, name, data):
+        self.memory.put(self.session_id, name, data)
+
+    def get(self, name):
+        return self.memory.get(self.session_id, name)
+
+    def delete(self, name):
+        self.memory.delete(self.session_id, name)
+
+    def track(self, name, value=None, size=None):
+        self.memory.track(self.session_id, name, value, size)
+
+
+def session_blobs():
+    return SessionBlobs(get_session_memory(), current_session_id())
@@ -0,0 +1,155 @@
+"""Identical calls that are in flight at the same time share one upstream call.
+
+    flights = get_flights()
+    result = flights.do(key, fn)            # the first caller runs fn(); the others wait for its result
+    for chunk in flights.stream(key, fn):   # fn() returns an iterator; every caller gets every chunk
+        ...
+
+Only overlapping calls are merged; nothing is kept once a call finishes (an
+error is raised in every waiter and the next call tries again). A stream runs
+on its own thread, started when the first caller begins reading, and is
+replayed from the start to callers that join late; it stops early once every
+caller has stopped reading. Keys come from
+flight_key(), a hash of the canonical JSON of its arguments.
+"""
+import hashlib
+import json
+import threading
+
+from helpers.telemetry import inc
+
+
+def _plain(value):
+    dump = getattr(value, "model_dump", None)  # OpenAI SDK objects (e.g. a tool-call message)
+    return dump() if dump is not None else str(value)
+
+
+def flight_key(*parts):
+    data = json.dumps(parts, sort_keys=True, default=_plain, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.finished = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Stream:
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.stopping = False  # every reader left; the producer stops at the next chunk
+        self.error = None
+        self.readers = 0  # callers that have started iterating and not stopped
+        self.started = False
+        self.cond = threading.Condition()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, page=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            inc("singleflight_shared_total", page=page)
+            call.finished.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.finished.set()
+
+    def stream(self, key, fn, page=None):
+        with self._lock:
+            flight = self._streams.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._streams[key] = _Stream()
+        if not leader:
+            inc("singleflight_shared_total", page=page)
+        return self._follow(key, flight, fn)
+
+    def _produce(self, key, flight, fn):
+        iterator = None
+        try:
+            iterator = iter(fn())
+            for chunk in iterator:
+                if flight.stopping:
+                    break
+                with flight.cond:
+                    flight.chunks.append(chunk)
+                    flight.cond.notify_all()
+        except Exception as e:
+            flight.error = e
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()  # an abandoned stream stops consuming tokens here
+            with self._lock:
+                if self._streams.get(key) is flight:
+                    del self._streams[key]
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+
+    def _follow(self, key, flight, fn):
+        # Counted as a reader only once iteration starts: a generator that is never
+        # iterated never runs its finally, and must not keep the producer alive.
+        with self._lock:
+            if flight.stopping:
+                flight = None  # every earlier reader left and the call is being stopped
+            else:
+                flight.readers += 1
+                start = not flight.started
+                flight.started = True
+        if flight is None:
+            yield from self.stream(key, fn)
+            return
+        if start:
+            threading.Thread(target=self._produce, args=(key, flight, fn), daemon=True).start()
+        sent = 0
+        try:
+            while True:
+                with flight.cond:
+                    while sent >= len(flight.chunks) and not flight.done:
+                        flight.cond.wait()
+                    chunks = flight.chunks[sent:]
+                    done = flight.done
+                sent += len(chunks)
+                yield from chunks
+                if done:
+                    break
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            with self._lock:
+                flight.readers -= 1
+                if flight.readers == 0 and not flight.done:
+                    flight.stopping = True
+                    if self._streams.get(key) is flight:
+                        del self._streams[key]  # a new caller starts a fresh call
+
+
+_flights = SingleFlight()
+
+
+def get_flights():
+    """Process-wide SingleFlight shared by every session."""
+    return _flights
@@ -0,0 +1,118 @@
+"""Speculative "more info" answers for the kid-friendly chat pages (Lab 3, Lab 4).
+
+After every answer the bot asks "Do you want more info?". Instead of waiting
+for the "yes", the page starts the more-info completion right away on a
+background thread and keeps it in a Speculation. If the user says yes, the
+buffered text is streamed at once (and the rest live, if it is still coming);
+a "no" or a new question cancels it, which closes the API stream.
+
+Cost is bounded: a speculation is capped at MAX_SPECULATIVE_TOKENS, at most
+MAX_CONCURRENT run at once across all sessions (the rest queue, and are
+dropped if cancelled before they start), and LAB_SPECULATE=0 turns it off.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers.llm import stream_chat
+from helpers.scheduler import BACKGROUND
+from helpers.tokens import count_tokens
+
+MORE_INFO_INSTRUCTION = (
+    "The user said they want more information. Give more details about what we were just "
+    "talking about, in the same simple way. Then end by asking: Do you want more info?"
+)
+
+MAX_SPECULATIVE_TOKENS = 600
+MAX_CONCURRENT = 4
+
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT, thread_name_prefix="speculative")
+
+
+def enabled():
+    return os.environ.get("LAB_SPECULATE") != "0"
+
+
+def more_info_messages(head, history, max_tokens):
+    """Prompt for the "yes, more info" turn: head + the last exchanges + the instruction."""
+    recent = history[-6:] + [{"role": "user", "content": MORE_INFO_INSTRUCTION}]
+    messages = head + recent
+    if count_tokens(messages) > max_tokens:
+        messages = head + recent[-4:]
+    return messages
+
+
+def conversation_key(history, *extra):
+    """Identifies the conversation state a speculation was made for (plus e.g. the model)."""
+    last = history[-1]["content"] if history else ""
+    return (len(history), last) + extra
+
+
+class Speculation:
+    """One background more-info completion; stream() replays it and follows it live."""
+
+    def __init__(self, client, messages, key, page=None, max_tokens=MAX_SPECULATIVE_TOKENS, **kwargs):
+        self.messages = messages
+        self.key = key
+        self.usage = {}
+        self.max_tokens = max_tokens
+        self.truncated = False
+        self.error = None
+        self._chunks = []
+        self._done = False
+        self._cancelled = False
+        self._cond = threading.Condition()
+        self._future = _executor.submit(self._run, client, page, kwargs)
+
+    def _run(self, client, page, kwargs):
+        if self._cancelled:
+            return self._finish()
+        stream = stream_chat(
+            client, self.usage, page=page, priority=BACKGROUND, max_tokens=self.max_tokens,
+            messages=self.messages, **kwargs
+        )
+        try:
+            for text in stream:
+                with self._cond:
+                    if self._cancelled:
+                        break
+                    self._chunks.append(text)
+                    self._cond.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            stream.close()  # a cancelled speculation stops consuming tokens here
+            self.truncated = self.usage.get("completion_tokens", 0) >= self.max_tokens
+            self._finish()
+
+    def _finish(self):
+        with self._cond:
+            self._done = True
+            self._cond.notify_all()
+
+    def cancel(self):
+        with self._cond:
+            self._cancelled = True
+            self._cond.notify_all()
+        self._future.cancel()  # not started yet: never runs
+
+    def usable(self, key):
+        """True if this speculation answers the conversation identified by key."""
+        if self._cancelled or self.error is not None or key != self.key:
+            return False
+        return not (self._done and (self.truncated or not self._chunks))
+
+    def stream(self):
+        """Yield the buffered text, then new chunks as they arrive (for st.write_stream)."""
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self._chunks) and not self._done and not self._cancelled:
+                    self._cond.wait()
+                if i >= len(self._chunks):
+                    break
+                text = self._chunks[i]
+            i += 1
+            yield text
+        if self.error is not None:
+            raise self.error
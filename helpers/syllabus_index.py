@@ -0,0 +1,351 @@
+"""The Lab 4 syllabus index, shared by every session in the process.
+
+The vector store (Chroma, or the NumPy store in helpers.vectorstore when
+LAB4_VECTOR_BACKEND=numpy), its collection and one-time ingestion live here rather
+than in st.session_state, so a new browser session does not re-open the
+database or race other sessions into building it. The first caller builds the
+index while holding a lock; everyone else waits for that build and then gets
+the same read handle.
+
+Documents come from helpers.ingest: every .pdf/.md/.txt in Lab-04-Data.zip, or
+in the zips and directories listed in LAB4_SOURCES (os.pathsep-separated).
+An interrupted build resumes from the last saved batch.
+
+Each syllabus is split into sections ("Course Description", "Grading", ...)
+and every chunk carries course_code / course_title / section metadata.
+analyze_query() turns course mentions in a question ("IST 418", "ist418",
+"Big Data Analytics") into a Chroma `where` filter, so the similarity search
+only looks at the syllabi the question is about.
+"""
+import os
+import re
+import threading
+from collections import Counter
+
+from helpers.embeddings import EMBEDDING_MODEL, OpenAIEmbedder, openai_embedding_function
+from helpers.index_artifact import ArtifactError, artifact_path, build_artifact, open_artifact
+from helpers.ingest import IngestProgress, ingest
+from helpers.paths import PROJECT_ROOT, cache_path
+from helpers.scheduler import BATCH, INTERACTIVE
+from helpers.vectorstore import backend_from_env, open_store
+
+COLLECTION_NAME = "Lab4Collection"
+ZIP_NAME = "Lab-04-Data.zip"
+
+# Bump when the chunking or metadata changes; older collections are rebuilt.
+SCHEMA_VERSION = 5
+
+# Target chunk size (~200 tokens, so a few fit Lab 4's context budget);
+# short sections are merged into the next one.
+CHUNK_CHARS = 800
+MIN_SECTION_CHARS = 200
+
+COURSE_CODE_RE = re.compile(r"\b(IST)\s*[-_]?\s*(\d{3})\b", re.IGNORECASE)
+# "Course Description: Learn to ..." -> heading "Course Description"
+_INLINE_HEADING_RE = re.compile(
+    r"^([A-Z][\w/&'-]*(?:\s+(?:[A-Z][\w/&'-]*|and|or|of|the|for|to|in|on|&)){0,5})\s*:\s*(.*)$"
+)
+# A line on its own such as "Grading Policy" or "COURSE SCHEDULE"
+_LINE_HEADING_RE = re.compile(r"^[A-Z][\w/&'-]*(?:\s+(?:[A-Z][\w/&'-]*|and|or|of|the|for|&)){0,4}$")
+
+class IndexUnavailable(RuntimeError):
+    """The index could not be opened or built (message is shown to the user)."""
+
+
+class SyllabusIndex:
+    """Read handle on the shared collection; count() is cached, so reruns are free.
+
+    courses maps course code -> title for every syllabus in the index.
+    lexical is the corpus term index shipped with a prebuilt index (else None).
+    """
+
+    def __init__(self, collection, lexical=None):
+        self.collection = collection
+        self.lexical = lexical
+        self._count = collection.count()
+        self.courses = {}
+        for meta in collection.get(include=["metadatas"])["metadatas"] or []:
+            if meta and meta.get("course_code"):
+                self.courses[meta["course_code"]] = meta.get("course_title", "")
+
+    def count(self):
+        return self._count
+
+    def query(self, **kwargs):
+        return self.collection.query(**kwargs)
+
+
+class BuildReport:
+    """What happened while opening the index, for the page to display."""
+
+    def __init__(self):
+        self.built = 0  # documents ingested by this call (0 if it already existed)
+        self.prebuilt = None  # manifest of the build-time artifact, when that was opened
+        self.warnings = []
+
+
+def find_zip():
+    """Path to Lab-04-Data.zip: project root, data/, then ~/Downloads (or None)."""
+    possible_paths = [
+        ZIP_NAME,
+        os.path.join("data", ZIP_NAME),
+        os.path.join(PROJECT_ROOT, ZIP_NAME),
+        os.path.join(PROJECT_ROOT, "data", ZIP_NAME),
+        os.path.expanduser(os.path.join("~", "Downloads", ZIP_NAME)),
+    ]
+    for p in possible_paths:
+        if os.path.isfile(p):
+            return p
+    return None
+
+
+def normalize_course_code(prefix, number):
+    return f"{prefix.upper()} {number}"
+
+
+def parse_course(filename, first_page=""):
+    """(course_code, course_title) from "IST 418 Syllabus - Big Data Analytics.pdf"."""
+    name = os.path.splitext(os.path.basename(filename))[0]
+    match = COURSE_CODE_RE.search(name) or COURSE_CODE_RE.search(first_page)
+    code = normalize_course_code(*match.groups()) if match else ""
+    title = name.split(" - ", 1)[1].strip() if " - " in name else name
+    return code, title
+
+
+def split_sections(pages):
+    """[(heading, text)] for a document given as a list of page texts.
+
+    Lines repeated on most pages (running headers/footers) are dropped first.
+    """
+    page_lines = [[line.strip() for line in (p or "").splitlines() if line.strip()] for p in pages]
+    repeated = set()
+    if len(page_lines) > 1:
+        counts = Counter(line for lines in page_lines for line in set(lines))
+        repeated = {line for line, n in counts.items() if n >= max(2, len(page_lines) / 2)}
+
+    sections = []
+    heading = "Overview"
+    buf = []
+    for lines in page_lines:
+        for line in lines:
+            if line in repeated:
+                continue
+            inline = _INLINE_HEADING_RE.match(line)
+            if inline and len(inline.group(1)) <= 40:
+                new_heading, rest = inline.group(1), inline.group(2)
+            elif _LINE_HEADING_RE.match(line) and len(line) <= 40:
+                new_heading, rest = line, ""
+            else:
+                buf.append(line)
+                continue
+            if buf:
+                sections.append((heading, " ".join(" ".join(buf).split())))
+            heading = new_heading.strip()
+            if heading.isupper():
+                heading = heading.title()  # "COURSE SCHEDULE" -> "Course Schedule"
+            buf = []
+            if rest:
+                buf.append(rest)
+    if buf:
+        sections.append((heading, " ".join(" ".join(buf).split())))
+    return sections
+
+
+def chunk_sections(sections, chunk_chars=CHUNK_CHARS, min_chars=MIN_SECTION_CHARS):
+    """[(section_label, chunk_text)]: short sections merged forward, long ones split on words."""
+    merged = []
+    pending_heads, pending_text = [], ""
+    for heading, text in sections:
+        pending_heads.append(heading)
+        pending_text = f"{pending_text} {heading}: {text}".strip()
+        if len(pending_text) >= min_chars:
+            merged.append((" / ".join(dict.fromkeys(pending_heads)), pending_text))
+            pending_heads, pending_text = [], ""
+    if pending_text:
+        if merged:
+            label, text = merged[-1]
+            merged[-1] = (" / ".join(dict.fromkeys([label] + pending_heads)), f"{text} {pending_text}")
+        else:
+            merged.append((" / ".join(dict.fromkeys(pending_heads)), pending_text))
+
+    chunks = []
+    for label, text in merged:
+        words = text.split()
+        piece = []
+        size = 0
+        for word in words:
+            if size + len(word) + 1 > chunk_chars and piece:
+                chunks.append((label, " ".join(piece)))
+                piece, size = [], 0
+            piece.append(word)
+            size += len(word) + 1
+        if piece:
+            chunks.append((label, " ".join(piece)))
+    return chunks
+
+
+def document_chunks(filename, pages, source, doc_id=None):
+    """(documents, metadatas, ids) for one syllabus, one entry per chunk.
+
+    ids are "<doc_id>#<n>" (doc_id defaults to filename).
+    """
+    code, title = parse_course(filename, pages[0] if pages else "")
+    documents, metadatas, ids = [], [], []
+    for i, (section, text) in enumerate(chunk_sections(split_sections(pages))):
+        # Name the course in the chunk itself, so it is clear in the prompt and the embedding.
+        documents.append(f"{code} {title} — {text}".strip())
+        metadatas.append({
+            "filename": filename,
+            "source": source,
+            "course_code": code,
+            "course_title": title,
+            "section": section[:200],
+            "chunk": i,
+        })
+        ids.append(f"{doc_id or filename}#{i}")
+    return documents, metadatas, ids
+
+
+def analyze_query(question, courses):
+    """Chroma `where` filter for the courses a question mentions (None if it names none).
+
+    Matches course codes ("IST 418", "ist418", "IST-418"), bare numbers of known
+    courses ("418"), and course titles ("big data analytics"). Only courses that
+    are in the index are used, so an unknown course never filters everything out.
+    """
+    text = question or ""
+    found = []
+    for match in COURSE_CODE_RE.finditer(text):
+        found.append(normalize_course_code(*match.groups()))
+    numbers = {code.split()[-1]: code for code in courses}
+    for number in re.findall(r"\b(\d{3})\b", text):
+        if number in numbers:
+            found.append(numbers[number])
+    lowered = text.lower()
+    for code, title in courses.items():
+        if title and title.lower() in lowered:
+            found.append(code)
+    codes = [c for c in dict.fromkeys(found) if c in courses]
+    if not codes:
+        return None
+    if len(codes) == 1:
+        return {"course_code": codes[0]}
+    return {"course_code": {"$in": codes}}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _sources():
+    """Zips / directories to index: LAB4_SOURCES (os.pathsep-separated), else the Lab 4 zip."""
+    configured = os.environ.get("LAB4_SOURCES")
+    if configured:
+        return [p for p in configured.split(os.pathsep) if p]
+    zip_path = find_zip()
+    return [zip_path] if zip_path else []
+
+
+def _chunker(doc, pages):
+    return document_chunks(doc.name, pages, doc.folder, doc_id=doc.doc_id)
+
+
+def _open_store(api_key):
+    """(collection, embedding function, IngestProgress) for the configured backend."""
+    try:
+        backend = backend_from_env()
+    except ValueError as e:
+        raise IndexUnavailable(str(e)) from e
+    if backend == "numpy":
+        embed = OpenAIEmbedder(api_key)  # no chromadb import at all on this path
+    else:
+        embed = openai_embedding_function(api_key)
+    collection = open_store(backend, COLLECTION_NAME, embed, SCHEMA_VERSION)
+    progress = IngestProgress(cache_path(f"{COLLECTION_NAME}.{backend}.ingest.json"))
+    if collection.count() == 0 and (progress.done or progress.complete):
+        progress.reset()  # the store was wiped or rebuilt; start over
+    return collection, embed, progress
+
+
+def _ingest(sources, collection, embed, progress, on_progress):
+    """ingest() with embeddings at batch priority, so indexing queues behind user questions."""
+    embed.priority = BATCH
+    try:
+        return ingest(sources, collection, _chunker, progress=progress, on_progress=on_progress)
+    finally:
+        embed.priority = INTERACTIVE
+
+
+def build_index(api_key, sources, on_progress=None):
+    """Add the documents under sources to the index (resuming); returns (IngestStats, count)."""
+    global _index
+    with _index_lock:
+        collection, embed, progress = _open_store(api_key)
+        stats = _ingest(sources, collection, embed, progress, on_progress)
+        _index = None  # reopen with the new documents on next use
+    return stats, collection.count()
+
+
+def build_prebuilt_index(api_key, sources=None, out=None, on_progress=None):
+    """Build the shipped index artifact (see helpers/index_artifact.py); returns (IngestStats, manifest)."""
+    sources = sources or _sources()
+    if not sources:
+        raise IndexUnavailable(f"{ZIP_NAME} not found; pass the documents to index.")
+    embed = OpenAIEmbedder(api_key, page="build", priority=BATCH)
+    return build_artifact(out or artifact_path(), sources, _chunker, embed, SCHEMA_VERSION, EMBEDDING_MODEL, on_progress)
+
+
+def _open_prebuilt(api_key, report):
+    """SyllabusIndex over the build-time artifact, or None to build in the page instead."""
+    try:
+        opened = open_artifact(artifact_path(), OpenAIEmbedder(api_key), SCHEMA_VERSION, EMBEDDING_MODEL)
+    except (ArtifactError, OSError, ValueError) as e:
+        report.warnings.append(f"Prebuilt index not used ({e}); building it here instead.")
+        return None
+    if opened is None:
+        return None
+    store, lexical, report.prebuilt = opened
+    return SyllabusIndex(store, lexical)
+
+
+def _open_or_build(api_key, report, on_progress=None):
+    collection, embed, progress = _open_store(api_key)
+    if collection.count() > 0 and (progress.complete or not os.path.exists(progress.path)):
+        return collection
+
+    sources = _sources()
+    if not sources:
+        raise IndexUnavailable(
+            "**Lab-04-Data.zip** not found. "
+            "For **Streamlit Cloud**: add the zip to the repo (project root or `data/` folder). "
+            "For **local**: put it in your project root, in a `data/` folder, or in **Downloads**."
+        )
+    try:
+        stats = _ingest(sources, collection, embed, progress, on_progress)
+    except OSError as e:
+        raise IndexUnavailable(f"Cannot read documents: {e}") from e
+    report.warnings.extend(stats.warnings)
+    if collection.count() == 0:
+        raise IndexUnavailable("No documents were successfully processed from the PDF files.")
+    report.built = stats.indexed
+    return collection
+
+
+def get_syllabus_index(api_key, on_progress=None):
+    """Return (SyllabusIndex, BuildReport); opens or builds the collection once per process.
+
+    A prebuilt artifact (python -m helpers.index_artifact build) is used when
+    present; otherwise the collection is built here. Concurrent first callers
+    block on the lock instead of building twice. A failed build is not cached,
+    so the next call tries again, resuming from the documents that were
+    already added. on_progress(IngestStats) is called after each document
+    while building.
+    """
+    global _index
+    report = BuildReport()
+    if _index is not None:
+        return _index, report
+    with _index_lock:
+        if _index is None:
+            _index = _open_prebuilt(api_key, report) or SyllabusIndex(_open_or_build(api_key, report, on_progress))
+    return _index, report
@@ -0,0 +1,334 @@
+"""Per-request latency and token telemetry for every page.
+
+Wrap each outbound call (OpenAI, LangChain, Chroma, weather) in span():
+
+    with span("retrieval", page="lab4") as s:
+        results = vectordb.query(...)
+        s["n_results"] = len(results["ids"][0])
+
+Every finished span is appended to .cache/telemetry.jsonl (by a background
+writer, about once a second, and at exit; flush() writes now), and aggregated
+metrics (latency histograms, token counters) are written to
+.cache/metrics.prom in the Prometheus text format, so they can be scraped or
+just read. Set LAB_TELEMETRY=0 to turn the files off. Past
+LAB_TELEMETRY_MAX_MB (default 10) telemetry.jsonl is rolled over to
+telemetry.jsonl.1, replacing the previous one.
+
+The diagnostics panel (render_diagnostics_panel) shows the same numbers in the
+sidebar; it is enabled with LAB_DIAGNOSTICS=1 or `show_diagnostics = true` in
+secrets.toml.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from helpers.paths import cache_path
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Span attributes that are also summed into <name>_total counters.
+COUNTED_ATTRS = ("prompt_tokens", "cached_tokens", "completion_tokens")
+
+# How often metrics.prom is rewritten (it is a full snapshot).
+EXPORT_INTERVAL_SECONDS = 5.0
+
+DEFAULT_JSONL_MAX_MB = 10
+
+# How long finished spans wait in memory before they are appended to the file.
+JSONL_FLUSH_SECONDS = 1.0
+
+_lock = threading.Lock()
+_recent = deque(maxlen=2000)
+_counters = defaultdict(float)  # (metric, labels) -> value
+_histograms = {}  # (metric, labels) -> [bucket counts..., count, sum]
+_gauges = {}  # (metric, labels) -> current value
+_last_export = 0.0
+_pending = []  # telemetry.jsonl lines not written yet
+_writer = None
+_flush_lock = threading.Lock()  # one flush at a time; the file is written without holding _lock
+
+
+def enabled():
+    return os.environ.get("LAB_TELEMETRY", "1") != "0"
+
+
+def _labels(page, model):
+    return tuple(sorted({"page": page or "", "model": model or ""}.items()))
+
+
+@contextmanager
+def span(name, page=None, model=None, **attrs):
+    """Time a block; the yielded dict can be filled with extra attributes."""
+    record = dict(attrs)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield record
+    except GeneratorExit:
+        record["cancelled"] = True  # a stream that the caller stopped reading
+        raise
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record["duration"] = time.perf_counter() - start
+        _record(name, page, model, record, error)
+
+
+def inc(metric, value=1, page=None, model=None):
+    with _lock:
+        _counters[(metric, _labels(page, model))] += value
+
+
+def set_gauge(metric, value, **labels):
+    """Record the current value of something that goes up and down (e.g. bytes in memory)."""
+    with _lock:
+        _gauges[(metric, tuple(sorted(labels.items())))] = value
+
+
+def gauges():
+    """[{"metric", labels..., "value"}] for the diagnostics panel."""
+    with _lock:
+        items = sorted(_gauges.items())
+    return [{"metric": metric, **dict(labels), "value": value} for (metric, labels), value in items]
+
+
+def _observe(metric, labels, value):
+    hist = _histograms.get((metric, labels))
+    if hist is None:
+        hist = _histograms[(metric, labels)] = [0] * len(LATENCY_BUCKETS) + [0, 0.0]
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if value <= bound:
+            hist[i] += 1
+    hist[-2] += 1
+    hist[-1] += value
+
+
+def _record(name, page, model, attrs, error):
+    entry = {"ts": time.time(), "name": name, "page": page, "model": model, **attrs}
+    if error:
+        entry["error"] = error
+    labels = _labels(page, model)
+    metric = name.replace(".", "_")
+    with _lock:
+        _recent.append(entry)
+        _observe(f"{metric}_seconds", labels, attrs["duration"])
+        if "ttft" in attrs:
+            _observe(f"{metric}_ttft_seconds", labels, attrs["ttft"])
+        _counters[(f"{metric}_requests_total", labels)] += 1
+        if error:
+            _counters[(f"{metric}_errors_total", labels)] += 1
+        for key in COUNTED_ATTRS:
+            if attrs.get(key):
+                _counters[(f"{key}_total", labels)] += attrs[key]
+    if enabled():
+        _write_jsonl(entry)
+        _maybe_export()
+
+
+def _jsonl_max_bytes():
+    try:
+        return float(os.environ.get("LAB_TELEMETRY_MAX_MB", DEFAULT_JSONL_MAX_MB)) * 2**20
+    except ValueError:
+        return DEFAULT_JSONL_MAX_MB * 2**20
+
+
+def _write_jsonl(entry):
+    """Queue a span for telemetry.jsonl; the writer thread appends it."""
+    global _writer
+    line = json.dumps(entry, default=str)
+    with _lock:
+        _pending.append(line)
+        start = _writer is None
+        if start:
+            _writer = threading.Thread(target=_write_loop, name="telemetry-writer", daemon=True)
+    if start:
+        _writer.start()
+
+
+def _write_loop():
+    while True:
+        time.sleep(JSONL_FLUSH_SECONDS)
+        _flush_quietly()
+
+
+def _flush_quietly():
+    try:
+        flush()
+    except OSError:
+        pass  # telemetry is best effort: drop the lines rather than stop the writer
+
+
+def flush():
+    """Append the queued spans to telemetry.jsonl now."""
+    with _flush_lock:
+        with _lock:
+            lines = _pending[:]
+            _pending.clear()
+        if not lines:
+            return
+        path = cache_path("telemetry.jsonl")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+            size = f.tell()
+        if size > _jsonl_max_bytes():
+            os.replace(path, path + ".1")  # keeps one old file: at most twice the limit on disk
+
+
+atexit.register(_flush_quietly)
+
+
+def _format_labels(labels, extra=()):
+    parts = [f'{k}="{v}"' for k, v in tuple(labels) + tuple(extra)]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def prometheus_text():
+    """Current metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((k, list(v)) for k, v in _histograms.items())
+        gauge_items = sorted(_gauges.items())
+    seen = set()
+    for (metric, labels), value in counters:
+        if metric not in seen:
+            lines.append(f"# TYPE {metric} counter")
+            seen.add(metric)
+        lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+    for (metric, labels), value in gauge_items:
+        if metric not in seen:
+            lines.append(f"# TYPE {metric} gauge")
+            seen.add(metric)
+        lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+    for (metric, labels), hist in histograms:
+        if metric not in seen:
+            lines.append(f"# TYPE {metric} histogram")
+            seen.add(metric)
+        for bound, count in zip(LATENCY_BUCKETS, hist):
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', f'{bound:g}')])} {count}")
+        lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist[-2]}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {hist[-2]}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {hist[-1]:.6f}")
+    return "\n".join(lines) + "\n"
+
+
+def export_prometheus(path=None):
+    path = path or cache_path("metrics.prom")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+
+
+def _maybe_export():
+    global _last_export
+    now = time.monotonic()
+    with _lock:
+        if now - _last_export < EXPORT_INTERVAL_SECONDS:
+            return
+        _last_export = now
+    export_prometheus()
+
+
+def recent_spans(page=None):
+    with _lock:
+        spans = list(_recent)
+    return [s for s in spans if page is None or s["page"] == page]
+
+
+def _pct(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+def summary(page=None):
+    """One row per (span name, page, model) with latency percentiles and token totals."""
+    groups = defaultdict(list)
+    for s in recent_spans(page):
+        groups[(s["name"], s["page"] or "", s["model"] or "")].append(s)
+    rows = []
+    for (name, pg, model), spans in sorted(groups.items()):
+        durations = [s["duration"] for s in spans]
+        ttfts = [s["ttft"] for s in spans if "ttft" in s]
+        tps = [s["tokens_per_second"] for s in spans if s.get("tokens_per_second")]
+        rows.append({
+            "span": name,
+            "page": pg,
+            "model": model,
+            "calls": len(spans),
+            "errors": sum(1 for s in spans if "error" in s),
+            "p50 s": round(_pct(durations, 50), 3),
+            "p95 s": round(_pct(durations, 95), 3),
+            "ttft p50 s": round(_pct(ttfts, 50), 3) if ttfts else None,
+            "tok/s": round(sum(tps) / len(tps), 1) if tps else None,
+            "prompt tok": sum(s.get("prompt_tokens", 0) for s in spans),
+            "completion tok": sum(s.get("completion_tokens", 0) for s in spans),
+        })
+    return rows
+
+
+def langchain_callbacks(page, model=None):
+    """LangChain callback handler that turns each LLM call into an llm.chat span."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class _TelemetryHandler(BaseCallbackHandler):
+        def __init__(self):
+            self._starts = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._starts[run_id] = time.perf_counter()
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self._starts[run_id] = time.perf_counter()
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            start = self._starts.pop(run_id, None)
+            if start is None:
+                return
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            attrs = {"duration": time.perf_counter() - start}
+            for key in ("prompt_tokens", "completion_tokens"):
+                if usage.get(key):
+                    attrs[key] = usage[key]
+            _record("llm.chat", page, model, attrs, None)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            start = self._starts.pop(run_id, None)
+            if start is not None:
+                _record("llm.chat", page, model, {"duration": time.perf_counter() - start}, type(error).__name__)
+
+    return [_TelemetryHandler()]
+
+
+def diagnostics_enabled():
+    import streamlit as st
+
+    if os.environ.get("LAB_DIAGNOSTICS") == "1":
+        return True
+    try:
+        return bool(st.secrets.get("show_diagnostics", False))
+    except Exception:
+        return False  # no secrets.toml
+
+
+def render_diagnostics_panel():
+    """Sidebar expander with per-page latency and token numbers (if enabled)."""
+    import streamlit as st
+
+    if not diagnostics_enabled():
+        return
+    with st.sidebar.expander("Diagnostics"):
+        rows = summary()
+        if rows:
+            st.dataframe(rows, hide_index=True)
+        else:
+            st.caption("No requests recorded yet in this process.")
+        current = gauges()
+        if current:
+            st.dataframe(current, hide_index=True)
+        st.caption("Full data: .cache/telemetry.jsonl and .cache/metrics.prom")
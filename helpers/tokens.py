@@ -0,0 +1,30 @@
+# tiktoken is loaded on first use (see helpers/lazy.py): importing this module is cheap.
+_encoding = None
+
+
+def get_encoding():
+    """Token encoding for chat messages (same encoding family as gpt-4o / gpt-4o-mini)."""
+    global _encoding
+    if _encoding is None:
+        import tiktoken
+
+        try:
+            _encoding = tiktoken.encoding_for_model("gpt-4o")
+        except Exception:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+
+def count_text_tokens(text):
+    return len(get_encoding().encode(text or ""))
+
+
+def message_tokens(message):
+    """Tokens one chat message adds to a request (count_tokens = 3 + the sum of these)."""
+    encoding = get_encoding()
+    return 4 + len(encoding.encode(message["role"])) + len(encoding.encode(message.get("content", "") or ""))
+
+
+def count_tokens(messages):
+    """Total number of tokens for OpenAI chat messages."""
+    return 3 + sum(message_tokens(m) for m in messages)  # 3: reply priming
@@ -0,0 +1,370 @@
+"""Vector stores behind the Lab 4 index: Chroma, or a compact NumPy matrix.
+
+Both backends expose the small part of Chroma's collection API that the app
+uses, so SyllabusIndex and the retrieval code do not care which one they get:
+
+    count()
+    add(documents=, metadatas=, ids=, embeddings=None)
+    upsert(documents=, metadatas=, ids=, embeddings=None)
+    delete(ids=None, where=None)
+    get(include=["metadatas", "documents"])
+    query(query_texts= | query_embeddings=, n_results=, where=None, include=[...])
+    metadata                      # collection-level dict (schema_version, ...)
+
+NumpyVectorStore keeps unit-length embeddings as one contiguous int8 (or
+float16) matrix in a raw file that is memory-mapped at open, so a new process
+pays for reading the pages it touches rather than for starting a database.
+A query is a single matrix-vector product and an argpartition. Distances are
+cosine distances (1 - similarity). int8 is the default: it is half the size of
+float16 and, because NumPy widens float16 to float32 slowly, several times
+faster to scan, for a top-12 recall of ~0.99 against exact search.
+
+Pick the backend with LAB4_VECTOR_BACKEND=chroma|numpy (default chroma).
+Compare them with `python -m tools.vectorstore_bench`.
+"""
+import json
+import os
+import threading
+
+BACKENDS = ("chroma", "numpy")
+DEFAULT_BACKEND = "chroma"
+
+_DTYPES = ("float16", "int8")
+_BLOCK_ROWS = 4096  # rows widened to float32 at a time during a query
+
+
+def backend_from_env():
+    backend = (os.environ.get("LAB4_VECTOR_BACKEND") or DEFAULT_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"LAB4_VECTOR_BACKEND must be one of {', '.join(BACKENDS)}, not {backend!r}")
+    return backend
+
+
+def matches_where(meta, where):
+    """True if a metadata dict satisfies a Chroma-style where filter.
+
+    Supports {"key": value}, {"key": {"$eq"|"$ne"|"$in"|"$nin": ...}} and
+    {"$and"|"$or": [filters]}, which covers what analyze_query() produces.
+    """
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(matches_where(meta, w) for w in cond):
+                return False
+        elif key == "$or":
+            if not any(matches_where(meta, w) for w in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = meta.get(key)
+            for op, operand in cond.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+        elif meta.get(key) != cond:
+            return False
+    return True
+
+
+class NumpyVectorStore:
+    """embeddings.bin (matrix), records.jsonl (ids/documents/metadatas), meta.json.
+
+    Adding appends to the files; deleting rewrites them without the removed rows.
+
+    Rows are L2-normalised before storing. With dtype="int8" each row is scaled
+    so its largest component maps to 127, and the per-row scale is kept in
+    scales.bin (float32): a quarter of the float32 size.
+    """
+
+    def __init__(self, path, embedding_function=None, metadata=None, dtype="int8"):
+        if dtype not in _DTYPES:
+            raise ValueError(f"dtype must be one of {_DTYPES}")
+        self.path = path
+        self.embedding_function = embedding_function
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._scales = None
+        os.makedirs(path, exist_ok=True)
+        info = self._read_json("meta.json")
+        if info is None:
+            info = {"dtype": dtype, "dim": None, "count": 0, "metadata": dict(metadata or {})}
+            self._write_json("meta.json", info)
+        self._info = info
+        self.metadata = info["metadata"]
+        self._ids, self._documents, self._metadatas = [], [], []
+        records = os.path.join(path, "records.jsonl")
+        if os.path.exists(records):
+            with open(records, encoding="utf-8") as f:
+                for line in f:
+                    if len(self._ids) >= info["count"]:
+                        break  # tail of an interrupted add(); meta.json is the commit point
+                    rec = json.loads(line)
+                    self._ids.append(rec["id"])
+                    self._documents.append(rec["document"])
+                    self._metadatas.append(rec["metadata"])
+        self._id_set = set(self._ids)
+
+    # --- files --------------------------------------------------------------
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read_json(self, name):
+        try:
+            with open(self._file(name), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_json(self, name, data):
+        tmp = self._file(name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self._file(name))
+
+    def _mapped(self):
+        """(matrix, scales) memory-mapped read-only; scales is None for float16."""
+        import numpy as np
+
+        if self._matrix is None and self._info["count"]:
+            shape = (self._info["count"], self._info["dim"])
+            self._matrix = np.memmap(self._file("embeddings.bin"), dtype=self._info["dtype"], mode="r", shape=shape)
+            if self._info["dtype"] == "int8":
+                self._scales = np.memmap(self._file("scales.bin"), dtype="float32", mode="r", shape=(shape[0],))
+        return self._matrix, self._scales
+
+    @staticmethod
+    def _normalize(vectors):
+        import numpy as np
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[None, :]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _embed(self, texts):
+        if self.embedding_function is None:
+            raise ValueError("No embedding_function: pass embeddings / query_embeddings explicitly")
+        return self._normalize(self.embedding_function(list(texts)))
+
+    # --- collection API -----------------------------------------------------
+
+    def count(self):
+        return self._info["count"]
+
+    def add(self, documents, metadatas=None, ids=None, embeddings=None):
+        """Append documents; ids already in the store are skipped (as Chroma does).
+
+        An id repeated within the batch is stored once, with its last document.
+        """
+        import numpy as np
+
+        documents = list(documents)
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in documents]
+        ids = list(ids) if ids is not None else [str(self.count() + i) for i in range(len(documents))]
+        last = {id_: i for i, id_ in enumerate(ids)}
+        new = [i for i, id_ in enumerate(ids) if last[id_] == i and id_ not in self._id_set]
+        if len(new) < len(ids):
+            documents = [documents[i] for i in new]
+            metadatas = [metadatas[i] for i in new]
+            ids = [ids[i] for i in new]
+            if embeddings is not None:
+                embeddings = [embeddings[i] for i in new]
+        if not ids:
+            return
+        rows = self._normalize(embeddings) if embeddings is not None else self._embed(documents)
+        with self._lock:
+            info = self._info
+            if info["dim"] is None:
+                info["dim"] = int(rows.shape[1])
+            elif rows.shape[1] != info["dim"]:
+                raise ValueError(f"Embedding dimension {rows.shape[1]} does not match the store ({info['dim']})")
+            # Drop bytes past the committed count (left by an interrupted add) before appending.
+            self._truncate(info["count"])
+            if info["dtype"] == "int8":
+                scales = np.abs(rows).max(axis=1) / 127.0
+                scales[scales == 0] = 1.0
+                quantized = np.clip(np.rint(rows / scales[:, None]), -127, 127).astype(np.int8)
+                with open(self._file("embeddings.bin"), "ab") as f:
+                    f.write(quantized.tobytes())
+                with open(self._file("scales.bin"), "ab") as f:
+                    f.write(scales.astype(np.float32).tobytes())
+            else:
+                with open(self._file("embeddings.bin"), "ab") as f:
+                    f.write(rows.astype(np.float16).tobytes())
+            with open(self._file("records.jsonl"), "a", encoding="utf-8") as f:
+                for id_, doc, meta in zip(ids, documents, metadatas):
+                    f.write(json.dumps({"id": id_, "document": doc, "metadata": meta}) + "\n")
+            self._ids.extend(ids)
+            self._id_set.update(ids)
+            self._documents.extend(documents)
+            self._metadatas.extend(metadatas)
+            info["count"] += len(documents)
+            self._write_json("meta.json", info)
+            self._matrix = self._scales = None  # remap with the new shape on next query
+
+    def upsert(self, documents, metadatas=None, ids=None, embeddings=None):
+        """add(), replacing the rows of ids that are already in the store."""
+        if ids is not None:
+            self.delete(ids=list(ids))
+        self.add(documents, metadatas=metadatas, ids=ids, embeddings=embeddings)
+
+    def delete(self, ids=None, where=None):
+        """Remove the rows matching ids and/or where; rewrites the store's files."""
+        import numpy as np
+
+        if ids is None and where is None:
+            return
+        ids = set(ids) if ids is not None else None
+        with self._lock:
+            drop = [
+                (ids is None or id_ in ids) and (where is None or matches_where(meta, where))
+                for id_, meta in zip(self._ids, self._metadatas)
+            ]
+            if not any(drop):
+                return
+            keep = np.array([i for i, d in enumerate(drop) if not d], dtype=np.int64)
+            matrix, scales = self._mapped()
+            kept_rows = np.array(matrix[keep]) if len(keep) else None
+            kept_scales = np.array(scales[keep]) if scales is not None and len(keep) else None
+            self._matrix = self._scales = None
+            self._ids = [self._ids[i] for i in keep]
+            self._documents = [self._documents[i] for i in keep]
+            self._metadatas = [self._metadatas[i] for i in keep]
+            self._id_set = set(self._ids)
+
+            # Each file is replaced whole; meta.json's count is written last, as in add().
+            def replace(name, write):
+                tmp = self._file(name + ".tmp")
+                with open(tmp, "wb") as f:
+                    write(f)
+                os.replace(tmp, self._file(name))
+
+            replace("records.jsonl", lambda f: f.writelines(
+                (json.dumps({"id": i, "document": d, "metadata": m}) + "\n").encode("utf-8")
+                for i, d, m in zip(self._ids, self._documents, self._metadatas)
+            ))
+            replace("embeddings.bin", lambda f: kept_rows is not None and f.write(kept_rows.tobytes()))
+            if self._info["dtype"] == "int8":
+                replace("scales.bin", lambda f: kept_scales is not None and f.write(kept_scales.tobytes()))
+            self._info["count"] = len(self._ids)
+            self._write_json("meta.json", self._info)
+
+    def _truncate(self, count):
+        itemsize = 1 if self._info["dtype"] == "int8" else 2
+        for name, size in (("embeddings.bin", count * (self._info["dim"] or 0) * itemsize), ("scales.bin", count * 4)):
+            path = self._file(name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+        path = self._file("records.jsonl")
+        if os.path.exists(path):
+            with open(path, "r+", encoding="utf-8") as f:
+                for _ in range(count):
+                    f.readline()
+                f.truncate(f.tell())
+
+    @staticmethod
+    def _similarities(matrix, scales, rows, q):
+        """Cosine similarity of q with every (or each selected) row, in float32 blocks.
+
+        NumPy has no BLAS path for float16/int8, so blocks are widened to
+        float32 a few MB at a time instead of converting the whole matrix.
+        """
+        import numpy as np
+
+        n = len(matrix) if rows is None else len(rows)
+        sims = np.empty(n, dtype=np.float32)
+        for start in range(0, n, _BLOCK_ROWS):
+            stop = min(start + _BLOCK_ROWS, n)
+            block = matrix[start:stop] if rows is None else matrix[rows[start:stop]]
+            sims[start:stop] = np.asarray(block, dtype=np.float32) @ q
+            if scales is not None:
+                sims[start:stop] *= scales[start:stop] if rows is None else scales[rows[start:stop]]
+        return sims
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents")):
+        rows = [
+            i for i in range(len(self._ids))
+            if (ids is None or self._ids[i] in ids) and matches_where(self._metadatas[i], where)
+        ]
+        result = {"ids": [self._ids[i] for i in rows]}
+        result["metadatas"] = [self._metadatas[i] for i in rows] if "metadatas" in include else None
+        result["documents"] = [self._documents[i] for i in rows] if "documents" in include else None
+        return result
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=10, where=None,
+              include=("metadatas", "documents", "distances")):
+        import numpy as np
+
+        queries = self._normalize(query_embeddings) if query_embeddings is not None else self._embed(query_texts)
+        result = {key: [] for key in ("ids", "documents", "metadatas", "distances", "embeddings")}
+        matrix, scales = self._mapped()
+        rows = None
+        if where:
+            rows = np.array([i for i, m in enumerate(self._metadatas) if matches_where(m, where)], dtype=np.int64)
+        for q in queries:
+            if matrix is None or (rows is not None and not len(rows)):
+                top, sims = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            else:
+                sims = self._similarities(matrix, scales, rows, q)
+                k = min(n_results, len(sims))
+                top = np.argpartition(-sims, k - 1)[:k]
+                top = top[np.argsort(-sims[top])]
+                sims = sims[top]
+                if rows is not None:
+                    top = rows[top]
+            result["ids"].append([self._ids[i] for i in top])
+            result["documents"].append([self._documents[i] for i in top])
+            result["metadatas"].append([self._metadatas[i] for i in top])
+            result["distances"].append([float(1.0 - s) for s in sims])
+            if "embeddings" in include:
+                vectors = np.asarray(matrix[top], dtype=np.float32) if len(top) else np.empty((0, 0))
+                if scales is not None and len(top):
+                    vectors *= np.asarray(scales[top])[:, None]
+                result["embeddings"].append(vectors)
+        for key in ("documents", "metadatas", "distances", "embeddings"):
+            if key not in include:
+                result[key] = None
+        return result
+
+
+def open_chroma(name, embedding_function, metadata, path=None):
+    """(client, collection) for a persistent Chroma collection."""
+    import chromadb
+
+    client = chromadb.PersistentClient(path=path or os.environ.get("LAB4_CHROMA_PATH", "./chroma_db"))
+    collection = client.get_or_create_collection(name=name, embedding_function=embedding_function, metadata=metadata)
+    return client, collection
+
+
+def open_store(backend, name, embedding_function, schema_version, path=None, dtype="int8"):
+    """A collection for backend whose metadata["schema_version"] equals schema_version.
+
+    A store written with another schema version is dropped and recreated empty.
+    """
+    metadata = {"schema_version": schema_version}
+    if backend == "numpy":
+        import shutil
+
+        from helpers.paths import cache_path
+
+        path = path or os.environ.get("LAB4_NUMPY_PATH") or cache_path(name + ".npstore")
+        store = NumpyVectorStore(path, embedding_function, metadata=metadata, dtype=dtype)
+        if store.metadata.get("schema_version") != schema_version:
+            shutil.rmtree(path)
+            store = NumpyVectorStore(path, embedding_function, metadata=metadata, dtype=dtype)
+        return store
+
+    client, collection = open_chroma(name, embedding_function, metadata, path=path)
+    if collection.count() > 0 and (collection.metadata or {}).get("schema_version") != schema_version:
+        client.delete_collection(name)
+        client, collection = open_chroma(name, embedding_function, metadata, path=path)
+    return collection
@@ -1,10 +1,32 @@
 import streamlit as st
 from openai import OpenAI
 
+from helpers.embeddings import OpenAIEmbedder
+from helpers.llm import stream_chat
+from helpers.scheduler import warn_when_busy
+from helpers.session_index import SessionIndex
+from helpers.session_memory import session_blobs
+from helpers.telemetry import span
+
+# Tokens of excerpts per question, however many files are uploaded.
+CONTEXT_TOKEN_BUDGET = 3000
+
+CITE_SYSTEM = (
+    "Answer the question using the document excerpts provided. Each excerpt starts with "
+    "[file name, section]. Cite the file name in square brackets after each fact you use, "
+    "e.g. [notes.md]. If the excerpts do not contain the answer, say so."
+)
+
+
+def format_passage(passage):
+    return f"[{passage['meta']['filename']}, {passage['meta']['section']}]\n{passage['text']}"
+
+
 # Show title and description.
 st.title("MY Document question answering")
 st.write(
-    "Upload a document below and ask a question about it – GPT will answer! "
+    "Upload one or more documents below and ask a question about them – GPT will answer, "
+    "citing the file each fact comes from! "
     "To use this app, you need to provide an OpenAI API key, which you can get [here](https://platform.openai.com/account/api-keys). "
 )
 
@@ -19,35 +41,51 @@ else:
     # Create an OpenAI client.
     client = OpenAI(api_key=openai_api_key)
 
-    # Let the user upload a file via `st.file_uploader`.
-    uploaded_file = st.file_uploader(
-        "Upload a document (.txt or .md)", type=("txt", "md")
+    # One in-memory index per session: each file is chunked and embedded once.
+    if st.session_state.get("lab1_index_key") != openai_api_key:
+        st.session_state.lab1_index = SessionIndex(OpenAIEmbedder(openai_api_key, page="lab1"), page="lab1")
+        st.session_state.lab1_index_key = openai_api_key
+    index = st.session_state.lab1_index
+
+    # Let the user upload files via `st.file_uploader`.
+    uploaded_files = st.file_uploader(
+        "Upload documents (.txt, .md or .pdf)", type=("txt", "md", "pdf"), accept_multiple_files=True
     )
 
+    if uploaded_files:
+        try:
+            with st.spinner("Indexing new files…"):
+                index.sync([(f.file_id, f.name, f.getvalue) for f in uploaded_files])
+        except Exception as e:
+            st.error(f"Could not index the files: {e}")
+            st.stop()
+        for name, error in index.errors():
+            st.warning(f"Skipped {name}: {error}")
+        session_blobs().track("lab1_index", size=index.memory_bytes())
+
     # Ask the user for a question via `st.text_area`.
     question = st.text_area(
-        "Now ask a question about the document!",
+        "Now ask a question about the documents!",
         placeholder="Can you give me a short summary?",
-        disabled=not uploaded_file,
+        disabled=not uploaded_files,
     )
 
-    if uploaded_file and question:
+    if uploaded_files and question:
 
-        # Process the uploaded file and question.
-        document = uploaded_file.read().decode()
+        # Only the passages relevant to the question go into the prompt.
+        with span("retrieval", page="lab1", files=len(uploaded_files)):
+            passages = index.search(question, CONTEXT_TOKEN_BUDGET, format_passage=format_passage, separator="\n\n")
+        context = "\n\n".join(format_passage(p) for p in passages)
         messages = [
+            {"role": "system", "content": CITE_SYSTEM},
             {
                 "role": "user",
-                "content": f"Here's a document: {document} \n\n---\n\n {question}",
-            }
+                "content": f"Excerpts from the uploaded documents:\n{context}\n\n---\n\n {question}",
+            },
         ]
 
-        # Generate an answer using the OpenAI API.
-        stream = client.chat.completions.create(
-            model="gpt-5-nano",
-            messages=messages,
-            stream=True,
-        )
-
-        # Stream the response to the app using `st.write_stream`.
-        st.write_stream(stream)
+        # Generate an answer using the OpenAI API and stream it to the app.
+        with warn_when_busy():
+            st.write_stream(stream_chat(client, page="lab1", model="gpt-5-nano", messages=messages))
+        if passages:
+            st.caption("Sources: " + ", ".join(dict.fromkeys(p["meta"]["filename"] for p in passages)))
@@ -4,7 +4,9 @@ except ImportError:
     raise ImportError("streamlit is not installed. Install with: python3 -m pip install streamlit")
 
 from openai import OpenAI
-from pypdf import PdfReader
+
+from helpers.llm import shared_stream_chat
+from helpers.scheduler import warn_when_busy
 
 # Show title and description.
 st.title("MY Document question answering")
@@ -40,6 +42,8 @@ uploaded_file = st.file_uploader(
 # If a file is uploaded, generate the summary.
 if uploaded_file:
     if uploaded_file.type == "application/pdf":
+        from pypdf import PdfReader  # only needed for PDFs
+
         reader = PdfReader(uploaded_file)
         document = ""
         for page in reader.pages:
@@ -53,13 +57,8 @@ if uploaded_file:
         }
     ]
 
-    # Generate the summary using the selected model.
-    stream = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        stream=True,
-    )
-
-    # Stream the response to the app using `st.write_stream`.
+    # Generate the summary using the selected model and stream it to the app.
+    # Sessions summarising the same document the same way at the same time share one call.
     st.header("Document Summary")
-    st.write_stream(stream)
+    with warn_when_busy():
+        st.write_stream(shared_stream_chat(client, page="lab2", model=model, messages=messages))
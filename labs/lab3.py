@@ -1,6 +1,24 @@
 import streamlit as st
 from openai import OpenAI
-import tiktoken
+
+from helpers.answer_cache import (
+    enabled as answer_cache_enabled,
+    get_answer_cache,
+    is_standalone,
+    semantic_enabled,
+)
+from helpers.chat_history import render_history
+from helpers.compaction import ConversationCompactor, fit_to_budget, trim_history
+from helpers.embeddings import OpenAIEmbedder
+from helpers.llm import stream_chat
+from helpers.scheduler import warn_when_busy
+from helpers.speculative import (
+    Speculation,
+    conversation_key,
+    enabled as speculation_enabled,
+    more_info_messages,
+)
+from helpers.tokens import count_tokens
 
 # Show title and description.
 st.title("MY Lab 3 question answering chatbot")
@@ -15,21 +33,6 @@ if openAI_model == "mini":
 else:
     model_to_use = "gpt-4o"
 
-# Token counting for chat messages (same encoding family as gpt-4o / gpt-4o-mini).
-try:
-    encoding = tiktoken.encoding_for_model("gpt-4o")
-except Exception:
-    encoding = tiktoken.get_encoding("cl100k_base")
-
-
-def count_tokens(messages):
-    """Total number of tokens for OpenAI chat messages."""
-    total = 3  # reply priming
-    for m in messages:
-        total += 4
-        total += len(encoding.encode(m["role"]))
-        total += len(encoding.encode(m.get("content", "") or ""))
-    return total
 # System prompt: answer like for a 10-year-old and follow the "more info?" flow.
 KID_FRIENDLY_SYSTEM = (
     "You explain things in a simple, friendly way so that a 10-year-old can understand. "
@@ -60,10 +63,11 @@ if "messages" not in st.session_state:
     st.session_state.messages = [
         {"role": "assistant", "content": "What would you like to know? Ask me anything!"}
     ]
+# Older turns that no longer fit are folded into a running summary (per session).
+if "compactor" not in st.session_state:
+    st.session_state.compactor = ConversationCompactor(st.session_state.client, page="lab3")
 
-for msg in st.session_state.messages:
-    chat_msg = st.chat_message(msg["role"])
-    chat_msg.write(msg["content"])
+render_history(st.session_state.messages, key="lab3")
 
 if prompt := st.chat_input("Enter a message"):
     st.session_state.messages.append({"role": "user", "content": prompt})
@@ -71,8 +75,18 @@ if prompt := st.chat_input("Enter a message"):
         st.markdown(prompt)
 
     client = st.session_state.client
+    compactor = st.session_state.compactor
     phase = st.session_state.phase
     last_question = st.session_state.last_question
+    # "More info" answer prepared in the background after the previous turn (if any).
+    speculation = st.session_state.pop("speculation", None)
+    wants_more = phase in ("answered_ask_more", "gave_more_ask_again") and is_yes(prompt)
+    if speculation is not None and not (
+        wants_more and speculation.usable(conversation_key(st.session_state.messages[:-1], model_to_use))
+    ):
+        speculation.cancel()  # "no", a new question, or made for another model: stop it now
+        speculation = None
+    answered_by_model = False  # a cached answer is not worth a speculative follow-up
 
     # ---- User said "No" (after we asked "Do you want more info?") → back to help ----
     if phase in ("answered_ask_more", "gave_more_ask_again") and is_no(prompt):
@@ -83,58 +97,75 @@ if prompt := st.chat_input("Enter a message"):
         st.session_state.phase = "ask_question"
         st.session_state.last_question = ""
     # ---- User said "Yes" (want more info) → provide more, then ask again ----
-    elif phase in ("answered_ask_more", "gave_more_ask_again") and is_yes(prompt):
-        # Build messages for LLM: system + recent context so it can give more on the same topic.
-        messages_for_llm = [{"role": "system", "content": KID_FRIENDLY_SYSTEM}]
-        # Keep recent conversation so the model knows the topic.
-        messages_for_llm.extend(st.session_state.messages[-6:])  # last few exchanges
-        messages_for_llm.append({
-            "role": "user",
-            "content": "The user said they want more information. Give more details about what we were just talking about, in the same simple way. Then end by asking: Do you want more info?",
-        })
-        messages_to_send = messages_for_llm
-        if count_tokens(messages_to_send) > max_tokens:
-            messages_to_send = [messages_to_send[0]] + messages_to_send[-4:]
+    elif wants_more:
+        if speculation is not None:
+            # Already generated while the user was reading: stream it from the buffer.
+            messages_to_send = speculation.messages
+            stream = speculation.stream()
+        else:
+            # Build messages for LLM: system + recent context so it can give more on the same topic.
+            head = [{"role": "system", "content": KID_FRIENDLY_SYSTEM}] + compactor.summary_messages()
+            messages_to_send = more_info_messages(head, st.session_state.messages, max_tokens)
+            stream = stream_chat(client, page="lab3", model=model_to_use, messages=messages_to_send)
         tokens_this_request = count_tokens(messages_to_send)
         st.caption(f"Tokens sent to LLM: {tokens_this_request} / {max_tokens}")
-        stream = client.chat.completions.create(
-            model=model_to_use,
-            messages=messages_to_send,
-            stream=True,
-        )
-        with st.chat_message("assistant"):
+        with st.chat_message("assistant"), warn_when_busy():
             response = st.write_stream(stream)
+        answered_by_model = True
         st.session_state.messages.append({"role": "assistant", "content": response})
         st.session_state.phase = "gave_more_ask_again"
     # ---- New question (or unclear reply): answer then ask "Do you want more info?" ----
     else:
         if phase == "ask_question" or not (is_yes(prompt) or is_no(prompt)):
             st.session_state.last_question = prompt
-        messages_for_llm = [{"role": "system", "content": KID_FRIENDLY_SYSTEM}]
-        messages_for_llm.extend(st.session_state.messages)
-        while count_tokens(messages_for_llm) > max_tokens and len(messages_for_llm) > 3:
-            # Keep system + last exchanges
-            if messages_for_llm[1]["role"] == "assistant":
-                messages_for_llm = [messages_for_llm[0]] + messages_for_llm[3:]
+        # A question that does not lean on the conversation ("why is the sky blue?")
+        # is answered from the system prompt alone, so the answer can be shared
+        # with every session that asks it again.
+        answer_cache = None
+        if answer_cache_enabled() and is_standalone(prompt) and not (is_yes(prompt) or is_no(prompt)):
+            answer_cache = get_answer_cache(
+                embed=OpenAIEmbedder(st.secrets["openai_api_key"], page="lab3") if semantic_enabled() else None
+            )
+        cached = answer_cache.lookup(prompt, model_to_use, KID_FRIENDLY_SYSTEM) if answer_cache else None
+        if cached:
+            response, match = cached
+            st.caption(f"Answered from the shared answer cache ({match} match, no LLM call)")
+            with st.chat_message("assistant"):
+                st.markdown(response)
+        else:
+            if answer_cache:
+                messages_for_llm = [
+                    {"role": "system", "content": KID_FRIENDLY_SYSTEM},
+                    {"role": "user", "content": prompt},
+                ]
             else:
-                messages_for_llm = [messages_for_llm[0]] + messages_for_llm[2:]
-        tokens_this_request = count_tokens(messages_for_llm)
-        st.caption(f"Tokens sent to LLM: {tokens_this_request} / {max_tokens}")
-        stream = client.chat.completions.create(
-            model=model_to_use,
-            messages=messages_for_llm,
-            stream=True,
-        )
-        with st.chat_message("assistant"):
-            response = st.write_stream(stream)
+                head = [{"role": "system", "content": KID_FRIENDLY_SYSTEM}] + compactor.summary_messages()
+                messages_for_llm = head + fit_to_budget(head, st.session_state.messages, max_tokens)
+            tokens_this_request = count_tokens(messages_for_llm)
+            st.caption(f"Tokens sent to LLM: {tokens_this_request} / {max_tokens}")
+            with st.chat_message("assistant"), warn_when_busy():
+                response = st.write_stream(
+                    stream_chat(client, page="lab3", model=model_to_use, messages=messages_for_llm)
+                )
+            answered_by_model = True
+            if answer_cache:
+                answer_cache.store(prompt, response, model_to_use, KID_FRIENDLY_SYSTEM)
         st.session_state.messages.append({"role": "assistant", "content": response})
         st.session_state.phase = "answered_ask_more"
 
-    # Token-based buffer: trim message history for next turn
-    messages = st.session_state.messages
-    while count_tokens(messages) > max_tokens and len(messages) > 2:
-        if messages[0]["role"] == "assistant" and len(messages) > 3:
-            messages = [messages[0]] + messages[3:]
-        else:
-            messages = messages[2:]
-    st.session_state.messages = messages
\ No newline at end of file
+    # Token-based buffer: trim message history for next turn; the evicted
+    # turns are summarised in the background instead of being forgotten.
+    messages, evicted = trim_history(st.session_state.messages, max_tokens)
+    compactor.fold(evicted)
+    st.session_state.messages = messages
+
+    # Prepare the "more info" answer while the user reads this one.
+    if answered_by_model and st.session_state.phase != "ask_question" and speculation_enabled():
+        head = [{"role": "system", "content": KID_FRIENDLY_SYSTEM}] + compactor.summary_messages()
+        st.session_state.speculation = Speculation(
+            client,
+            more_info_messages(head, messages + [{"role": "user", "content": "yes"}], max_tokens),
+            key=conversation_key(messages, model_to_use),
+            page="lab3",
+            model=model_to_use,
+        )
\ No newline at end of file
@@ -1,158 +1,65 @@
 import streamlit as st
 from openai import OpenAI
-import chromadb
-from chromadb.utils import embedding_functions
-import zipfile
-from pypdf import PdfReader
-from io import BytesIO
-import os
-import tiktoken
+
+from helpers.chat_history import render_history
+from helpers.compaction import ConversationCompactor, trim_history
+from helpers.llm import format_usage, stream_chat
+from helpers.prompt_layout import layout_messages
+from helpers.retrieval import FETCH_K, select_context
+from helpers.scheduler import warn_when_busy
+from helpers.session_memory import session_blobs
+from helpers.speculative import (
+    Speculation,
+    conversation_key,
+    enabled as speculation_enabled,
+    more_info_messages,
+)
+from helpers.syllabus_index import IndexUnavailable, analyze_query, get_syllabus_index
+from helpers.telemetry import span
+from helpers.tokens import count_tokens
+
+PASSAGE_SEPARATOR = "\n\n---\n\n"
+
+
+def format_passage(passage):
+    """A retrieved passage as it goes into the prompt, under its source label."""
+    meta = passage["meta"]
+    src = meta.get("filename", "syllabus")
+    if meta.get("section"):
+        src = f"{src}, section: {meta['section']}"
+    return f"[Source: {src}]\n{passage['text']}"
 
 
 def create_lab4_vectordb():
     """
-    Construct a ChromaDB collection named "Lab4Collection" with PDF documents.
-    Uses OpenAI embeddings model (text-embedding-3-small).
-    Stores the collection in st.session_state.Lab4_VectorDB to avoid recreating it.
+    Return the shared "Lab4Collection" index (syllabi from Lab-04-Data.zip, OpenAI text-embedding-3-small).
+    It is built once per process and shared by every session, so new sessions
+    only get a cheap read handle. Returns None (after showing why) if it cannot be loaded.
     """
-    # Check if vector database already exists in session state
-    if "Lab4_VectorDB" in st.session_state:
-        return st.session_state.Lab4_VectorDB
-    
-    # Initialize OpenAI client
-    if "client" not in st.session_state:
-        api_key = st.secrets["openai_api_key"]
-        st.session_state.client = OpenAI(api_key=api_key)
-    
-    client = st.session_state.client
-    
-    # Create OpenAI embedding function
-    openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-        api_key=st.secrets["openai_api_key"],
-        model_name="text-embedding-3-small"
-    )
-    
-    # Initialize ChromaDB client (persistent storage)
-    chroma_client = chromadb.PersistentClient(path="./chroma_db")
-    
-    # Create or get the collection
-    try:
-        collection = chroma_client.get_collection(
-            name="Lab4Collection",
-            embedding_function=openai_ef
-        )
-        # Collection exists, check if it has documents
-        if collection.count() > 0:
-            st.session_state.Lab4_VectorDB = collection
-            return collection
-    except Exception:
-        # Collection doesn't exist, create it
-        collection = chroma_client.create_collection(
-            name="Lab4Collection",
-            embedding_function=openai_ef
-        )
-    
-    # Path to the zip file: try project root, data/, script-relative, then ~/Downloads
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.abspath(os.path.join(script_dir, ".."))
-    possible_paths = [
-        "Lab-04-Data.zip",
-        "data/Lab-04-Data.zip",
-        os.path.join(project_root, "Lab-04-Data.zip"),
-        os.path.join(project_root, "data", "Lab-04-Data.zip"),
-        os.path.expanduser("~/Downloads/Lab-04-Data.zip"),
-    ]
-    zip_path = None
-    for p in possible_paths:
-        if os.path.isfile(p):
-            zip_path = p
-            break
-    if zip_path is None:
-        st.error(
-            "**Lab-04-Data.zip** not found. "
-            "For **Streamlit Cloud**: add the zip to the repo (project root or `data/` folder). "
-            "For **local**: put it in your project root, in a `data/` folder, or in **Downloads**."
-        )
-        return None
-    
-    # List of PDF files to process
-    pdf_files = [
-        "IST 488 Syllabus - Building Human-Centered AI Applications.pdf",
-        "IST 314 Syllabus - Interacting with AI.pdf",
-        "IST 343 Syllabus - Data in Society.pdf",
-        "IST 256 Syllabus - Intro to Python for the Information Profession.pdf",
-        "IST 387 Syllabus - Introduction to Applied Data Science.pdf",
-        "IST 418 Syllabus - Big Data Analytics.pdf",
-        "IST 195 Syllabus - Information Technologies.pdf"
-    ]
-    
-    # Extract and process PDFs from zip file
-    documents = []
-    metadatas = []
-    ids = []
-    
-    try:
-        zip_ref = zipfile.ZipFile(zip_path, 'r')
-    except FileNotFoundError:
-        st.error(f"Zip file not found: {zip_path}")
-        return None
-    except OSError as e:
-        st.error(f"Cannot open zip file: {e}")
-        return None
+    status = st.empty()
 
-    with zip_ref:
-        for pdf_filename in pdf_files:
-            # Construct the full path within the zip
-            zip_internal_path = f"Lab-04-Data/{pdf_filename}"
-            
-            try:
-                # Read PDF from zip
-                pdf_bytes = zip_ref.read(zip_internal_path)
-                pdf_reader = PdfReader(BytesIO(pdf_bytes))
-                
-                # Extract text from all pages
-                text_content = ""
-                for page in pdf_reader.pages:
-                    text_content += page.extract_text() + "\n"
-                
-                # Clean up text (remove excessive whitespace)
-                text_content = " ".join(text_content.split())
-                
-                if text_content.strip():  # Only add if text was extracted
-                    documents.append(text_content)
-                    metadatas.append({
-                        "filename": pdf_filename,
-                        "source": "Lab-04-Data"
-                    })
-                    ids.append(pdf_filename)  # Use filename as unique ID
-                    
-            except KeyError:
-                st.warning(f"PDF file not found in zip: {pdf_filename}")
-                continue
-            except Exception as e:
-                st.error(f"Error processing {pdf_filename}: {str(e)}")
-                continue
-    
-    # Add documents to ChromaDB collection
-    if documents:
-        collection.add(
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
-        st.session_state.Lab4_VectorDB = collection
-        st.success(f"Successfully created ChromaDB collection with {len(documents)} documents!")
-    else:
-        st.error("No documents were successfully processed from the PDF files.")
+    def show_progress(stats):
+        status.caption(f"Indexing {stats.current} ({stats.seen} documents, {stats.chunks} passages so far)…")
+
+    try:
+        with st.spinner("Loading syllabus index…"):
+            vectordb, report = get_syllabus_index(st.secrets["openai_api_key"], on_progress=show_progress)
+    except IndexUnavailable as e:
+        st.error(str(e))
         return None
-    
-    return collection
+    finally:
+        status.empty()
+    for warning in report.warnings:
+        st.warning(warning)
+    if report.built:
+        st.success(f"Successfully created ChromaDB collection with {report.built} documents!")
+    return vectordb
 
 
 # --- Lab 4 page UI: Course information chatbot (RAG) ---
 st.title("Lab 4 – Course information chatbot")
 
-# Initialize the vector DB when the page loads (only runs if not already in session_state)
+# Get the shared vector DB (built once per process, on the first visit)
 vectordb = create_lab4_vectordb()
 
 if vectordb is None:
@@ -163,28 +70,19 @@ if vectordb is None:
     st.stop()
 
 count = vectordb.count()
-st.caption(f"Vector DB ready with {count} syllabus documents. Ask questions below—answers will cite when they use course materials.")
+st.caption(
+    f"Vector DB ready with {len(vectordb.courses)} syllabi ({count} passages). "
+    "Ask questions below—answers will cite when they use course materials."
+)
 st.write("")  # spacing
 
 # --- Lab 3–style setup: token counting, model choice, phase, messages ---
 max_tokens = 1000
+# Part of max_tokens reserved for syllabus excerpts; history gets the rest.
+context_token_budget = 450
 openAI_model = st.sidebar.selectbox("Which Model?", ("mini", "regular"), key="lab4_model")
 model_to_use = "gpt-4o-mini" if openAI_model == "mini" else "gpt-4o"
 
-try:
-    encoding = tiktoken.encoding_for_model("gpt-4o")
-except Exception:
-    encoding = tiktoken.get_encoding("cl100k_base")
-
-
-def count_tokens(messages):
-    total = 3
-    for m in messages:
-        total += 4
-        total += len(encoding.encode(m["role"]))
-        total += len(encoding.encode(m.get("content", "") or ""))
-    return total
-
 
 KID_FRIENDLY_SYSTEM = (
     "You explain things in a simple, friendly way so that a 10-year-old can understand. "
@@ -193,6 +91,20 @@ KID_FRIENDLY_SYSTEM = (
     "on the same topic in the same simple style, then ask again: 'Do you want more info?'"
 )
 
+# Prompt engineering: require the bot to be clear when using RAG vs general knowledge.
+# This stays identical on every request (the excerpts are sent separately, last),
+# so the provider can reuse its cached prefix across turns.
+LAB4_SYSTEM = (
+    KID_FRIENDLY_SYSTEM
+    + "\n\nYou have access to excerpts from course syllabi (retrieved by RAG); they are given in "
+    "a separate message right before the user's latest question. "
+    "When your answer is based on these excerpts, you MUST say so clearly at the start, e.g. "
+    "'Based on the course syllabi:' or 'According to the syllabus materials I have:'. "
+    "When the answer is NOT in the excerpts, you MUST say so clearly, e.g. "
+    "'This isn’t in the syllabi I have; from general knowledge:' or 'The syllabi don’t mention this; here’s what I know:'. "
+    "Keep answers simple and kid-friendly."
+)
+
 if "lab4_phase" not in st.session_state:
     st.session_state.lab4_phase = "ask_question"
 if "lab4_last_question" not in st.session_state:
@@ -220,10 +132,13 @@ if "client" not in st.session_state:
     st.session_state.client = OpenAI(api_key=api_key)
 client = st.session_state.client
 
-# Render chat history
-for msg in st.session_state.lab4_messages:
-    with st.chat_message(msg["role"]):
-        st.markdown(msg["content"])
+# Older turns that no longer fit are folded into a running summary (per session).
+if "lab4_compactor" not in st.session_state:
+    st.session_state.lab4_compactor = ConversationCompactor(client, page="lab4")
+compactor = st.session_state.lab4_compactor
+
+# Render chat history (recent window; earlier messages on demand)
+render_history(st.session_state.lab4_messages, key="lab4")
 
 # Chat input and RAG + LLM flow
 if prompt := st.chat_input("Enter a message"):
@@ -233,6 +148,14 @@ if prompt := st.chat_input("Enter a message"):
 
     phase = st.session_state.lab4_phase
     last_question = st.session_state.lab4_last_question
+    # "More info" answer prepared in the background after the previous turn (if any).
+    speculation = st.session_state.pop("lab4_speculation", None)
+    wants_more = phase in ("answered_ask_more", "gave_more_ask_again") and is_yes(prompt)
+    if speculation is not None and not (
+        wants_more and speculation.usable(conversation_key(st.session_state.lab4_messages[:-1], model_to_use))
+    ):
+        speculation.cancel()  # "no", a new question, or made for another model: stop it now
+        speculation = None
 
     # ---- User said "No" → back to help ----
     if phase in ("answered_ask_more", "gave_more_ask_again") and is_no(prompt):
@@ -243,23 +166,21 @@ if prompt := st.chat_input("Enter a message"):
         st.session_state.lab4_phase = "ask_question"
         st.session_state.lab4_last_question = ""
     # ---- User said "Yes" (want more info) ----
-    elif phase in ("answered_ask_more", "gave_more_ask_again") and is_yes(prompt):
-        messages_for_llm = [{"role": "system", "content": KID_FRIENDLY_SYSTEM}]
-        messages_for_llm.extend(st.session_state.lab4_messages[-6:])
-        messages_for_llm.append({
-            "role": "user",
-            "content": "The user said they want more information. Give more details about what we were just talking about, in the same simple way. Then end by asking: Do you want more info?",
-        })
-        if count_tokens(messages_for_llm) > max_tokens:
-            messages_for_llm = [messages_for_llm[0]] + messages_for_llm[-4:]
+    elif wants_more:
+        if speculation is not None:
+            # Already generated while the user was reading: stream it from the buffer.
+            messages_for_llm = speculation.messages
+            usage = speculation.usage
+            stream = speculation.stream()
+        else:
+            head = [{"role": "system", "content": LAB4_SYSTEM}] + compactor.summary_messages()
+            messages_for_llm = more_info_messages(head, st.session_state.lab4_messages, max_tokens)
+            usage = {}
+            stream = stream_chat(client, usage, page="lab4", model=model_to_use, messages=messages_for_llm)
         st.caption(f"Tokens sent to LLM: {count_tokens(messages_for_llm)} / {max_tokens}")
-        stream = client.chat.completions.create(
-            model=model_to_use,
-            messages=messages_for_llm,
-            stream=True,
-        )
-        with st.chat_message("assistant"):
+        with st.chat_message("assistant"), warn_when_busy():
             response = st.write_stream(stream)
+        st.caption(format_usage(usage))
         st.session_state.lab4_messages.append({"role": "assistant", "content": response})
         st.session_state.lab4_phase = "gave_more_ask_again"
     # ---- New question: RAG (retrieve from vector DB) then answer ----
@@ -267,56 +188,60 @@ if prompt := st.chat_input("Enter a message"):
         if phase == "ask_question" or not (is_yes(prompt) or is_no(prompt)):
             st.session_state.lab4_last_question = prompt
 
-        # Retrieve relevant chunks from Lab4 collection
-        n_results = 3
-        results = vectordb.query(
-            query_texts=[prompt],
-            n_results=min(n_results, vectordb.count()),
-            include=["documents", "metadatas"]
-        )
-        context_parts = []
-        if results and results["documents"] and results["documents"][0]:
-            for i, doc in enumerate(results["documents"][0]):
-                meta = (results["metadatas"][0][i] if results["metadatas"] and results["metadatas"][0] else {}) or {}
-                src = meta.get("filename", "syllabus")
-                context_parts.append(f"[Source: {src}]\n{doc}")
-        context_text = "\n\n---\n\n".join(context_parts) if context_parts else "(No relevant passages found.)"
-
-        # Prompt engineering: require the bot to be clear when using RAG vs general knowledge
-        system_with_context = (
-            KID_FRIENDLY_SYSTEM
-            + "\n\nYou have access to the following excerpts from course syllabi (retrieved by RAG). "
-            "When your answer is based on these excerpts, you MUST say so clearly at the start, e.g. "
-            "'Based on the course syllabi:' or 'According to the syllabus materials I have:'. "
-            "When the answer is NOT in the excerpts, you MUST say so clearly, e.g. "
-            "'This isn’t in the syllabi I have; from general knowledge:' or 'The syllabi don’t mention this; here’s what I know:'. "
-            "Keep answers simple and kid-friendly.\n\nSyllabus excerpts (use these when they answer the question):\n"
-            + context_text
+        # Retrieve relevant chunks from Lab4 collection, restricted to the
+        # course(s) the question names ("IST 418", "Big Data Analytics", ...)
+        # Over-fetch, then rerank locally, drop near-duplicates (MMR) and pack
+        # the best passages into context_token_budget.
+        where = analyze_query(prompt, vectordb.courses)
+        with span("retrieval", page="lab4", filtered=where is not None) as s:
+            results = vectordb.query(
+                query_texts=[prompt],
+                n_results=min(FETCH_K, vectordb.count()),
+                where=where,
+                include=["documents", "metadatas", "distances", "embeddings"]
+            )
+            passages = select_context(
+                prompt, results, context_token_budget, corpus=vectordb.lexical,
+                format_passage=format_passage, separator=PASSAGE_SEPARATOR,
+            )
+            s["passages"] = len(passages)
+            s["context_tokens"] = sum(p["tokens"] for p in passages)
+        if passages:
+            context_text = PASSAGE_SEPARATOR.join(format_passage(p) for p in passages)
+        else:
+            context_text = "(No relevant passages found.)"
+
+        # Stable prefix (system + summary + older turns) first; the excerpts change
+        # every question, so they go last, just before the new user message.
+        messages_for_llm = layout_messages(
+            [{"role": "system", "content": LAB4_SYSTEM}] + compactor.summary_messages(),
+            st.session_state.lab4_messages,
+            [{"role": "system", "content": "Syllabus excerpts (use these when they answer the question):\n" + context_text}],
+            max_tokens=max_tokens,
         )
-
-        messages_for_llm = [{"role": "system", "content": system_with_context}]
-        messages_for_llm.extend(st.session_state.lab4_messages)
-        while count_tokens(messages_for_llm) > max_tokens and len(messages_for_llm) > 3:
-            if messages_for_llm[1]["role"] == "assistant":
-                messages_for_llm = [messages_for_llm[0]] + messages_for_llm[3:]
-            else:
-                messages_for_llm = [messages_for_llm[0]] + messages_for_llm[2:]
         st.caption(f"Tokens sent to LLM: {count_tokens(messages_for_llm)} / {max_tokens}")
-        stream = client.chat.completions.create(
-            model=model_to_use,
-            messages=messages_for_llm,
-            stream=True,
-        )
-        with st.chat_message("assistant"):
-            response = st.write_stream(stream)
+        usage = {}
+        with st.chat_message("assistant"), warn_when_busy():
+            response = st.write_stream(
+                stream_chat(client, usage, page="lab4", model=model_to_use, messages=messages_for_llm)
+            )
+        st.caption(format_usage(usage))
         st.session_state.lab4_messages.append({"role": "assistant", "content": response})
         st.session_state.lab4_phase = "answered_ask_more"
 
-    # Trim message history to stay under token budget
-    messages = st.session_state.lab4_messages
-    while count_tokens(messages) > max_tokens and len(messages) > 2:
-        if messages[0]["role"] == "assistant" and len(messages) > 3:
-            messages = [messages[0]] + messages[3:]
-        else:
-            messages = messages[2:]
-    st.session_state.lab4_messages = messages
\ No newline at end of file
+    # Trim message history to stay under token budget; evicted turns go into the summary
+    messages, evicted = trim_history(st.session_state.lab4_messages, max_tokens)
+    compactor.fold(evicted)
+    st.session_state.lab4_messages = messages
+    session_blobs().track("lab4_messages", messages)
+
+    # Prepare the "more info" answer while the user reads this one.
+    if st.session_state.lab4_phase != "ask_question" and speculation_enabled():
+        head = [{"role": "system", "content": LAB4_SYSTEM}] + compactor.summary_messages()
+        st.session_state.lab4_speculation = Speculation(
+            client,
+            more_info_messages(head, messages + [{"role": "user", "content": "yes"}], max_tokens),
+            key=conversation_key(messages, model_to_use),
+            page="lab4",
+            model=model_to_use,
+        )
@@ -1,8 +1,15 @@
 import json
+import os
 import streamlit as st
 import requests
 from openai import OpenAI
 
+from helpers.llm import shared_chat
+from helpers.prompt_layout import canonical_tools
+from helpers.scheduler import warn_when_busy
+from helpers.singleflight import flight_key, get_flights
+from helpers.telemetry import span
+
 st.title("Lab 5 – The “What to Wear” Bot")
 st.write(
     "Enter a city to get weather-based clothing suggestions and ideas for "
@@ -10,16 +17,21 @@ st.write(
 )
 
 
+# Override to point at a local stub (see tools/stub_server.py).
+WEATHER_BASE_URL = os.environ.get("OPENWEATHERMAP_BASE_URL", "https://api.openweathermap.org")
+
+
 def get_current_weather(location, api_key, units="imperial"):
     """Fetch current weather for a location from OpenWeatherMap.
     location: e.g. 'Syracuse, NY, US' or 'Lima, Peru'
     Returns dict with temperature, feels_like, temp_min, temp_max, humidity, description, location.
     """
     url = (
-        "https://api.openweathermap.org/data/2.5/weather"
+        f"{WEATHER_BASE_URL}/data/2.5/weather"
         f"?q={location}&appid={api_key}&units={units}"
     )
-    response = requests.get(url)
+    with span("weather.fetch", page="lab5"):
+        response = requests.get(url)
     if response.status_code == 401:
         raise Exception("Authentication failed: Invalid API key (401 Unauthorized)")
     if response.status_code == 404:
@@ -104,13 +116,17 @@ messages = [
     },
 ]
 
-# First call: model may request weather via tool
-response = openai_client.chat.completions.create(
-    model="gpt-4o-mini",
-    messages=messages,
-    tools=[weather_tool],
-    tool_choice="auto",
-)
+# First call: model may request weather via tool. Every call below is shared
+# with sessions asking about the same city at the same time.
+with warn_when_busy():
+    response = shared_chat(
+        openai_client,
+        page="lab5",
+        model="gpt-4o-mini",
+        messages=messages,
+        tools=canonical_tools([weather_tool]),
+        tool_choice="auto",
+    )
 
 choice = response.choices[0]
 if not choice.message.tool_calls:
@@ -125,7 +141,11 @@ location = (args.get("location") or city or DEFAULT_LOCATION).strip() or DEFAULT
 
 with st.spinner(f"Fetching weather for {location}..."):
     try:
-        weather = get_current_weather(location, weather_api_key)
+        weather = get_flights().do(
+            flight_key("weather", location.lower(), "imperial"),
+            lambda: get_current_weather(location, weather_api_key),
+            page="lab5",
+        )
     except Exception as e:
         st.error(str(e))
         st.stop()
@@ -157,8 +177,11 @@ follow_up_messages.append(
     }
 )
 
-final = openai_client.chat.completions.create(
-    model="gpt-4o-mini",
-    messages=follow_up_messages,
-)
+with warn_when_busy():
+    final = shared_chat(
+        openai_client,
+        page="lab5",
+        model="gpt-4o-mini",
+        messages=follow_up_messages,
+    )
 st.markdown(final.choices[0].message.content)
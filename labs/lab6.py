@@ -1,7 +1,16 @@
 import streamlit as st
-from langchain.chat_models import init_chat_model
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+
+from helpers.movie_recs import (
+    GENRES,
+    MODEL,
+    MOODS,
+    PERSONAS,
+    build_chains,
+    get_store,
+    recommend,
+    refresh_in_background,
+)
+from helpers.telemetry import langchain_callbacks
 
 st.title("Lab 6 — Movie recommendations")
 
@@ -9,82 +18,19 @@ if "openai_api_key" not in st.secrets:
     st.error("Add `openai_api_key` to `.streamlit/secrets.toml`.")
     st.stop()
 
-llm = init_chat_model(
-    "gpt-4o-mini",
-    model_provider="openai",
-    api_key=st.secrets["openai_api_key"],
-)
+chain, followup_chain = build_chains(st.secrets["openai_api_key"])
+
+# Precomputed answers (see `python -m helpers.movie_recs`), shared by all sessions.
+store = get_store()
 
 if "last_recommendation" not in st.session_state:
     st.session_state.last_recommendation = None
 
 with st.sidebar:
     st.header("Movie match")
-    genre = st.selectbox(
-        "Genre",
-        (
-            "Action",
-            "Comedy",
-            "Horror",
-            "Drama",
-            "Sci-Fi",
-            "Thriller",
-            "Romance",
-        ),
-    )
-    mood = st.selectbox(
-        "Mood",
-        (
-            "Excited",
-            "Happy",
-            "Sad",
-            "Bored",
-            "Scared",
-            "Romantic",
-            "Curious",
-            "Tense",
-            "Melancholy",
-        ),
-    )
-    persona = st.selectbox(
-        "Persona",
-        (
-            "Film Critic",
-            "Casual Friend",
-            "Movie Journalist",
-        ),
-    )
-
-prompt = PromptTemplate.from_template(
-    """You are helping someone pick what to watch.
-
-Persona (adopt this voice, vocabulary, and attitude in your entire reply): {persona}
-Genre they want: {genre}
-Mood they are in: {mood}
-
-Recommend exactly 3 movies that fit the genre and mood.
-Write in the style of the persona above—match its tone (formal vs. casual, analytical vs. chatty, etc.).
-For each movie, give a short reason it fits their mood and genre choice.
-Use clear formatting (e.g. numbered list)."""
-)
-
-chain = prompt | llm | StrOutputParser()
-
-followup_prompt = PromptTemplate.from_template(
-    """You previously recommended these movies to the user:
-
----
-{recommendations}
----
-
-Answer their follow-up question clearly and helpfully. Stay grounded in the movies above;
-you may add brief general film context if it helps.
-
-User question:
-{question}"""
-)
-
-followup_chain = followup_prompt | llm | StrOutputParser()
+    genre = st.selectbox("Genre", GENRES)
+    mood = st.selectbox("Mood", MOODS)
+    persona = st.selectbox("Persona", PERSONAS)
 
 st.caption(
     "Pick genre, mood, and persona in the sidebar, then run the chain. "
@@ -92,10 +38,14 @@ st.caption(
 )
 
 if st.button("Get movie recommendations"):
-    with st.spinner("Asking OpenAI…"):
-        st.session_state.last_recommendation = chain.invoke(
-            {"genre": genre, "mood": mood, "persona": persona}
-        )
+    entry = store.get(genre, mood, persona)
+    if entry:
+        st.session_state.last_recommendation = entry["text"]
+        if store.is_stale(entry):
+            refresh_in_background(chain, store, genre, mood, persona)
+    else:
+        with st.spinner("Asking OpenAI…"):
+            st.session_state.last_recommendation = recommend(chain, store, genre, mood, persona)
 
 if st.session_state.last_recommendation:
     st.markdown(st.session_state.last_recommendation)
@@ -108,7 +58,8 @@ if st.session_state.last_recommendation:
                 {
                     "recommendations": st.session_state.last_recommendation,
                     "question": follow_up.strip(),
-                }
+                },
+                config={"callbacks": langchain_callbacks("lab6", MODEL)},
             )
         st.markdown("**Follow-up answer**")
         st.markdown(followup_answer)
@@ -2,6 +2,10 @@ import base64
 import streamlit as st
 from openai import OpenAI
 
+from helpers.llm import chat
+from helpers.scheduler import warn_when_busy
+from helpers.session_memory import session_blobs
+
 VISION_PROMPT = (
     "Describe the image in at least 3 sentences. Write five different captions for "
     "this image. Captions must vary in length, minimum one word but be no longer than "
@@ -27,8 +31,9 @@ if "last_image_url" not in st.session_state:
 
 if "upload_response" not in st.session_state:
     st.session_state.upload_response = None
-if "last_upload_bytes" not in st.session_state:
-    st.session_state.last_upload_bytes = None
+# The uploaded image is kept outside session_state, under the per-session memory
+# budget (it may be spilled to disk and read back when shown).
+blobs = session_blobs()
 
 # --- Part A: Image URL ---
 st.subheader("Part A: Image URL")
@@ -41,19 +46,22 @@ url = st.text_input("Image URL")
 
 if st.button("Generate description and captions (URL)") and url:
     client = OpenAI(api_key=st.secrets["openai_api_key"])
-    response = client.chat.completions.create(
-        model="gpt-4.1-mini",
-        max_tokens=1024,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "image_url", "image_url": {"url": url, "detail": "auto"}},
-                    {"type": "text", "text": VISION_PROMPT},
-                ],
-            }
-        ],
-    )
+    with warn_when_busy():
+        response = chat(
+            client,
+            page="lab8",
+            model="gpt-4.1-mini",
+            max_tokens=1024,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "image_url", "image_url": {"url": url, "detail": "auto"}},
+                        {"type": "text", "text": VISION_PROMPT},
+                    ],
+                }
+            ],
+        )
     st.session_state.url_response = response.choices[0].message.content
     st.session_state.last_image_url = url
 
@@ -81,27 +89,31 @@ if st.button("Generate description and captions (upload)") and uploaded:
     b64 = base64.b64encode(uploaded.read()).decode("utf-8")
     mime = uploaded.type
     data_uri = f"data:{mime};base64,{b64}"
-    response = client.chat.completions.create(
-        model="gpt-4.1-mini",
-        max_tokens=1024,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": data_uri, "detail": "low"},
-                    },
-                    {"type": "text", "text": VISION_PROMPT},
-                ],
-            }
-        ],
-    )
+    with warn_when_busy():
+        response = chat(
+            client,
+            page="lab8",
+            model="gpt-4.1-mini",
+            max_tokens=1024,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "image_url",
+                            "image_url": {"url": data_uri, "detail": "low"},
+                        },
+                        {"type": "text", "text": VISION_PROMPT},
+                    ],
+                }
+            ],
+        )
     st.session_state.upload_response = response.choices[0].message.content
-    st.session_state.last_upload_bytes = uploaded.getvalue()
+    blobs.put("lab8_upload", uploaded.getvalue())
 
 if st.session_state.upload_response:
     st.markdown("**Part B — result**")
-    if st.session_state.last_upload_bytes is not None:
-        st.image(st.session_state.last_upload_bytes)
+    last_upload = blobs.get("lab8_upload")
+    if last_upload is not None:
+        st.image(last_upload)
     st.write(st.session_state.upload_response)
@@ -1,66 +1,22 @@
 import json
-import os
-import re
+import time
 
 import streamlit as st
 from openai import OpenAI
 
-_MEMORIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "memories.json")
+from helpers.chat_history import render_history
+from helpers.compaction import ConversationCompactor
+from helpers.llm import chat, stream_chat
+from helpers.memories import build_system_prompt, load_memories, parse_json_fact_list, save_memories
+from helpers.scheduler import BATCH, warn_when_busy
 
 MAIN_MODEL = "gpt-4o-mini"
 EXTRACTION_MODEL = "gpt-4.1-nano"
+# Extraction is batch work: when the model is saturated this turn's facts are skipped, not waited for.
+EXTRACTION_WAIT_SECONDS = 10
 
-BASE_SYSTEM = (
-    "You are a helpful, friendly assistant. Be concise unless the user asks for detail. "
-    "When long-term memories about the user are listed below, use them naturally in your "
-    "replies so the conversation feels continuous."
-)
-
-
-def load_memories():
-    """Load memories from memories.json; return [] if the file does not exist."""
-    if os.path.exists(_MEMORIES_FILE):
-        with open(_MEMORIES_FILE, encoding="utf-8") as f:
-            data = json.load(f)
-        if isinstance(data, list):
-            return [str(m) for m in data if m]
-        return []
-    return []
-
-
-def save_memories(memories):
-    """Write a list of memories to memories.json."""
-    with open(_MEMORIES_FILE, "w", encoding="utf-8") as f:
-        json.dump(memories, f, ensure_ascii=False, indent=2)
-
-
-def build_system_prompt(memories):
-    if not memories:
-        return BASE_SYSTEM
-    lines = "\n".join(f"- {m}" for m in memories)
-    return (
-        f"{BASE_SYSTEM}\n\n"
-        "Here are things you remember about this user from past conversations:\n"
-        f"{lines}"
-    )
-
-
-def parse_json_fact_list(raw_text):
-    """Parse a JSON array of strings from the model; return [] on failure."""
-    text = (raw_text or "").strip()
-    if not text:
-        return []
-    # Strip ```json ... ``` fences if present
-    fence = re.match(r"^```(?:json)?\s*\n?(.*)\n?```\s*$", text, re.DOTALL | re.IGNORECASE)
-    if fence:
-        text = fence.group(1).strip()
-    try:
-        data = json.loads(text)
-        if isinstance(data, list):
-            return [str(x).strip() for x in data if str(x).strip()]
-        return []
-    except (json.JSONDecodeError, TypeError, ValueError):
-        return []
+# Prompt budget for the chat call; older turns beyond it are folded into a summary.
+MAX_PROMPT_TOKENS = 3000
 
 
 def extract_new_memories(client, existing_memories, user_message, assistant_message):
@@ -84,7 +40,11 @@ Example: ["User prefers dark mode", "User lives in Seattle"]
 
 No markdown, no explanation—only the JSON array."""
 
-    resp = client.chat.completions.create(
+    resp = chat(
+        client,
+        page="lab9",
+        priority=BATCH,
+        deadline=time.monotonic() + EXTRACTION_WAIT_SECONDS,
         model=EXTRACTION_MODEL,
         max_tokens=512,
         messages=[{"role": "user", "content": extraction_user}],
@@ -112,6 +72,8 @@ if "messages" not in st.session_state:
             "content": "Hi! I remember what we save between sessions. What’s on your mind?",
         }
     ]
+if "lab9_compactor" not in st.session_state:
+    st.session_state.lab9_compactor = ConversationCompactor(st.session_state.client, page="lab9")
 
 with st.sidebar:
     st.header("Memories")
@@ -125,9 +87,8 @@ with st.sidebar:
         save_memories([])
         st.rerun()
 
-for msg in st.session_state.messages:
-    with st.chat_message(msg["role"]):
-        st.markdown(msg["content"])
+# The transcript is never trimmed, so only the recent part is drawn by default.
+render_history(st.session_state.messages, key="lab9")
 
 if prompt := st.chat_input("Message"):
     st.session_state.messages.append({"role": "user", "content": prompt})
@@ -136,18 +97,16 @@ if prompt := st.chat_input("Message"):
 
     memories = load_memories()
     system_prompt = build_system_prompt(memories)
-    messages_for_api = [{"role": "system", "content": system_prompt}] + [
-        {"role": m["role"], "content": m["content"]} for m in st.session_state.messages
-    ]
+    compactor = st.session_state.lab9_compactor
+    head = [{"role": "system", "content": system_prompt}] + compactor.summary_messages()
+    recent = compactor.window(head, st.session_state.messages, MAX_PROMPT_TOKENS)
+    messages_for_api = head + [{"role": m["role"], "content": m["content"]} for m in recent]
 
     client = st.session_state.client
-    stream = client.chat.completions.create(
-        model=MAIN_MODEL,
-        messages=messages_for_api,
-        stream=True,
-    )
-    with st.chat_message("assistant"):
-        assistant_text = st.write_stream(stream)
+    with st.chat_message("assistant"), warn_when_busy():
+        assistant_text = st.write_stream(
+            stream_chat(client, page="lab9", model=MAIN_MODEL, messages=messages_for_api)
+        )
 
     st.session_state.messages.append({"role": "assistant", "content": assistant_text})
 
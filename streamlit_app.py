@@ -1,4 +1,8 @@
 import streamlit as st
+
+from helpers.lazy import prewarm
+from helpers.telemetry import render_diagnostics_panel
+
 st.title('IST 488 labs')
 lab1 = st.Page('labs/lab1.py', title = 'lab 1')
 lab2 = st.Page('labs/lab2.py', title = 'lab 2')
@@ -12,4 +16,7 @@ pg = st.navigation([lab1,lab2,lab3,lab4,lab5,lab6,lab8,lab9])
 
 st.set_page_config(page_title = 'IST 488 labs',
                    initial_sidebar_state= 'expanded')
+render_diagnostics_panel()
+# Load chromadb / LangChain / tiktoken / pypdf in the background once the app is idle.
+prewarm()
 pg.run()
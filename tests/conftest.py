@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def stub_client(tmp_path, monkeypatch):
+    """An OpenAI client pointed at tools/stub_server.py, streaming long answers slowly."""
+    openai = pytest.importorskip("openai")
+    from tools import stub_server
+
+    monkeypatch.setenv("LAB_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(stub_server.config, "latency", 0.0)
+    monkeypatch.setattr(stub_server.config, "tokens_per_second", 100.0)
+    monkeypatch.setattr(stub_server.config, "completion_tokens", 1000)  # ~10 s if nobody stops it
+    server = stub_server.serve(port=0)
+    try:
+        yield openai.OpenAI(api_key="stub", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1")
+    finally:
+        server.shutdown()
+
+
+def wait_until(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
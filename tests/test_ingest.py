@@ -0,0 +1,71 @@
+"""Documents with the same name in different sources must not share chunk ids."""
+import os
+
+import pytest
+
+pytest.importorskip("numpy")
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _chunker(doc, pages):
+    parts = "".join(pages).split("|")
+    return parts, [{"filename": doc.name} for _ in parts], [f"{doc.doc_id}#{i}" for i in range(len(parts))]
+
+
+def _embed(texts):
+    return [[float(len(t)), 1.0, 0.5] for t in texts]
+
+
+def test_same_name_in_two_sources_is_indexed_and_replaced_separately(tmp_path):
+    from helpers.ingest import IngestProgress, ingest
+    from helpers.vectorstore import NumpyVectorStore
+
+    first, second = str(tmp_path / "fall"), str(tmp_path / "spring")
+    _write(os.path.join(first, "syllabus.md"), "fall one|fall two")
+    _write(os.path.join(second, "syllabus.md"), "spring one")
+    store = NumpyVectorStore(str(tmp_path / "store"), _embed)
+    progress_file = str(tmp_path / "progress.json")
+
+    ingest([first, second], store, _chunker, progress=IngestProgress(progress_file))
+    assert sorted(store.get()["documents"]) == ["fall one", "fall two", "spring one"]
+    assert len(set(store.get()["ids"])) == 3
+
+    _write(os.path.join(second, "syllabus.md"), "spring changed, and longer")
+    stamp = os.path.getmtime(os.path.join(second, "syllabus.md")) + 10
+    os.utime(os.path.join(second, "syllabus.md"), (stamp, stamp))
+    stats = ingest([first, second], store, _chunker, progress=IngestProgress(progress_file))
+
+    assert (stats.indexed, stats.resumed) == (1, 1)
+    assert sorted(store.get()["documents"]) == ["fall one", "fall two", "spring changed, and longer"]
+
+
+def test_failed_batch_is_reported_and_retried(tmp_path):
+    from helpers.ingest import IngestProgress, ingest
+    from helpers.vectorstore import NumpyVectorStore
+
+    source = str(tmp_path / "docs")
+    _write(os.path.join(source, "a.txt"), "alpha")
+    calls = []
+
+    def flaky_embed(texts):
+        calls.append(texts)
+        if len(calls) == 1:
+            raise RuntimeError("embeddings unavailable")
+        return _embed(texts)
+
+    store = NumpyVectorStore(str(tmp_path / "store"), flaky_embed)
+    progress_file = str(tmp_path / "progress.json")
+
+    stats = ingest([source], store, _chunker, progress=IngestProgress(progress_file))
+    assert (stats.failed, store.count()) == (1, 0)
+    assert "embeddings unavailable" in stats.warnings[0]
+    assert not IngestProgress(progress_file).complete
+
+    stats = ingest([source], store, _chunker, progress=IngestProgress(progress_file))
+    assert (stats.indexed, store.count()) == (1, 1)
+    assert IngestProgress(progress_file).complete
@@ -0,0 +1,41 @@
+"""When every reader of a shared stream leaves, the upstream request must end."""
+import gc
+
+import pytest
+
+from conftest import wait_until
+
+MESSAGES = [{"role": "user", "content": "Tell me about the sky."}]
+
+
+@pytest.fixture(autouse=True)
+def no_gc():
+    # Without this a leaked HTTP response can still be closed by the garbage collector.
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
+
+
+def test_singleflight_stream_closes_upstream_when_every_reader_leaves(stub_client):
+    from helpers.llm import stream_chat
+    from helpers.singleflight import SingleFlight
+    from tools import stub_server
+
+    flights = SingleFlight()
+    before = stub_server.stats()
+
+    def call():
+        return stream_chat(stub_client, model="gpt-4o-mini", messages=MESSAGES)
+
+    readers = [iter(flights.stream("same question", call)) for _ in range(2)]
+    for reader in readers:
+        next(reader)
+    assert stub_server.stats()["chat"] == before["chat"] + 1  # one upstream call for both
+
+    for reader in readers:
+        reader.close()
+
+    assert wait_until(lambda: stub_server.stats()["streams_open"] == before["streams_open"])
+    assert stub_server.stats()["streams_cancelled"] == before["streams_cancelled"] + 1
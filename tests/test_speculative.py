@@ -0,0 +1,33 @@
+"""A cancelled speculation must end the upstream request, not just the Python iterator."""
+import gc
+
+import pytest
+
+from conftest import wait_until
+
+MESSAGES = [{"role": "user", "content": "Tell me about the sky."}]
+
+
+@pytest.fixture(autouse=True)
+def no_gc():
+    # Without this a leaked HTTP response can still be closed by the garbage collector.
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
+
+
+def test_cancelled_speculation_closes_upstream_stream(stub_client):
+    from helpers.speculative import Speculation
+    from tools import stub_server
+
+    before = stub_server.stats()
+    speculation = Speculation(stub_client, MESSAGES, key="k", model="gpt-4o-mini", max_tokens=1000)
+    next(iter(speculation.stream()))  # the completion is streaming
+    assert stub_server.stats()["streams_open"] == before["streams_open"] + 1
+
+    speculation.cancel()
+
+    assert wait_until(lambda: stub_server.stats()["streams_open"] == before["streams_open"])
+    assert stub_server.stats()["streams_cancelled"] == before["streams_cancelled"] + 1
@@ -0,0 +1,36 @@
+"""Spans reach telemetry.jsonl through the background writer."""
+import json
+
+from helpers import telemetry
+from conftest import wait_until
+
+
+def _lines(path):
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_spans_are_written_by_the_background_writer(tmp_path, monkeypatch):
+    monkeypatch.setenv("LAB_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(telemetry, "JSONL_FLUSH_SECONDS", 0.05)
+    telemetry.flush()
+
+    with telemetry.span("test.span", page="tests", n=1):
+        pass
+    assert wait_until(lambda: _lines(tmp_path / "telemetry.jsonl"))
+
+    [entry] = _lines(tmp_path / "telemetry.jsonl")
+    assert (entry["name"], entry["page"], entry["n"]) == ("test.span", "tests", 1)
+
+
+def test_flush_writes_queued_spans_now(tmp_path, monkeypatch):
+    monkeypatch.setenv("LAB_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(telemetry, "JSONL_FLUSH_SECONDS", 60)
+    telemetry.flush()
+
+    with telemetry.span("test.flush", page="tests"):
+        pass
+    telemetry.flush()
+
+    assert [e["name"] for e in _lines(tmp_path / "telemetry.jsonl")] == ["test.flush"]
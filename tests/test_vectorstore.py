@@ -0,0 +1,30 @@
+"""NumpyVectorStore keeps one row per id."""
+import pytest
+
+pytest.importorskip("numpy")
+
+from helpers.vectorstore import NumpyVectorStore
+
+
+def test_add_keeps_the_last_of_ids_repeated_in_a_batch(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    store.add(["old a", "b", "new a"], metadatas=[{"v": 1}, {"v": 2}, {"v": 3}], ids=["a", "b", "a"],
+              embeddings=[[1.0, 0.0], [0.0, 1.0], [0.6, 0.8]])
+
+    assert store.count() == 2
+    assert store.get(ids=["a"])["documents"] == ["new a"]
+    assert store.get(ids=["a"])["metadatas"] == [{"v": 3}]
+    result = store.query(query_embeddings=[[0.6, 0.8]], n_results=2)
+    assert result["ids"][0][0] == "a"
+
+    reopened = NumpyVectorStore(str(tmp_path))
+    assert sorted(reopened.get()["ids"]) == ["a", "b"]
+
+
+def test_upsert_with_a_repeated_id_leaves_one_row(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    store.add(["a"], ids=["a"], embeddings=[[1.0, 0.0]])
+    store.upsert(["a2", "a3"], ids=["a", "a"], embeddings=[[0.0, 1.0], [0.6, 0.8]])
+
+    assert store.get()["ids"] == ["a"]
+    assert store.get()["documents"] == ["a3"]
@@ -0,0 +1 @@
+"""Developer tools: local API stub server and load tests (not imported by the app)."""
@@ -0,0 +1,198 @@
+"""Drive many concurrent headless sessions through the lab pages.
+
+Each simulated user is a Streamlit AppTest session that runs a short script of
+interactions against one page (type a question, click a button, ...). All
+OpenAI / OpenWeatherMap traffic goes to tools/stub_server.py, so no keys are
+needed and no money is spent:
+
+    python -m tools.load_test --pages lab3 lab5 --sessions 1 5 10 25
+
+For every page and concurrency level it prints requests/second and p50/p95/p99
+latency of one interaction (one script rerun). Latency that climbs steeply
+between two levels is the concurrency ceiling. Use --latency and
+--tokens-per-second to make the stub behave like the real API.
+
+Lab 1 and Lab 2 (and Part B of Lab 8) need a file upload, which AppTest cannot
+simulate, so only their upload-free parts are exercised.
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers.paths import PROJECT_ROOT
+from tools import stub_server
+
+DEFAULT_TIMEOUT = 120
+
+
+def _chat(*messages):
+    def steps(at):
+        for text in messages:
+            at.chat_input[0].set_value(text)
+            yield at
+    return steps
+
+
+def _lab1(at):
+    at.text_input[0].input("stub-key")
+    yield at
+
+
+def _lab5(at):
+    at.text_input(key="lab5_city").input("Syracuse, NY, US")
+    yield at
+    at.button[0].click()
+    yield at
+
+
+def _lab6(at):
+    at.button[0].click()
+    yield at
+
+
+def _lab8(at):
+    at.text_input[0].input("https://example.com/cat.jpg")
+    yield at
+    at.button[0].click()
+    yield at
+
+
+# page name -> (script, interactions). The first run of every session (page
+# load) is timed too.
+SCENARIOS = {
+    "lab1": ("labs/lab1.py", _lab1),
+    "lab2": ("labs/lab2.py", lambda at: iter(())),
+    "lab3": ("labs/lab3.py", _chat("Why is the sky blue?", "yes", "no")),
+    "lab4": ("labs/lab4.py", _chat("What is IST 418 about?", "yes", "no")),
+    "lab5": ("labs/lab5.py", _lab5),
+    "lab6": ("labs/lab6.py", _lab6),
+    "lab8": ("labs/lab8.py", _lab8),
+    "lab9": ("labs/lab9.py", _chat("Hi, I'm Sam and I like hiking.", "What should I do this weekend?")),
+}
+
+
+def run_session(page):
+    """Run one user session; return (list of per-run latencies, error message or None)."""
+    from streamlit.testing.v1 import AppTest
+
+    script, interactions = SCENARIOS[page]
+    at = AppTest.from_file(os.path.join(PROJECT_ROOT, script), default_timeout=DEFAULT_TIMEOUT)
+    at.secrets["openai_api_key"] = "stub"
+    at.secrets["openweathermap_api_key"] = "stub"
+
+    latencies = []
+    try:
+        start = time.perf_counter()
+        at.run()
+        latencies.append(time.perf_counter() - start)
+        for at in interactions(at):
+            start = time.perf_counter()
+            at.run()
+            latencies.append(time.perf_counter() - start)
+            if at.exception:
+                return latencies, at.exception[0].message
+    except Exception as e:
+        return latencies, f"{type(e).__name__}: {e}"
+    return latencies, None
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile (values need not be sorted)."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(pct / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def run_level(page, sessions):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def one(_):
+        lat, err = run_session(page)
+        with lock:
+            latencies.extend(lat)
+            if err:
+                errors.append(err)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(one, range(sessions)))
+    wall = time.perf_counter() - start
+    return {
+        "page": page,
+        "sessions": sessions,
+        "runs": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "mean": statistics.fmean(latencies) if latencies else float("nan"),
+        "wall": wall,
+    }
+
+
+def print_report(rows):
+    print(f"{'page':<6} {'sessions':>8} {'runs':>6} {'err':>4} {'runs/s':>8} "
+          f"{'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'wall s':>7}")
+    for r in rows:
+        print(f"{r['page']:<6} {r['sessions']:>8} {r['runs']:>6} {len(r['errors']):>4} "
+              f"{r['throughput']:>8.2f} {r['p50']:>7.3f} {r['p95']:>7.3f} {r['p99']:>7.3f} {r['wall']:>7.1f}")
+    for r in rows:
+        for err in sorted(set(r["errors"]))[:3]:
+            print(f"  {r['page']} x{r['sessions']}: {err}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent headless load test for the lab pages.")
+    parser.add_argument("--pages", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--sessions", nargs="+", type=int, default=[1, 5, 10], help="concurrency levels")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--external-stub", action="store_true",
+                        help="use a stub server that is already running on --port")
+    parser.add_argument("--latency", type=float, default=stub_server.config.latency)
+    parser.add_argument("--tokens-per-second", type=float, default=stub_server.config.tokens_per_second)
+    parser.add_argument("--completion-tokens", type=int, default=stub_server.config.completion_tokens)
+    args = parser.parse_args(argv)
+
+    server = None
+    if not args.external_stub:
+        stub_server.config.latency = args.latency
+        stub_server.config.tokens_per_second = args.tokens_per_second
+        stub_server.config.completion_tokens = args.completion_tokens
+        server = stub_server.serve(port=args.port)
+
+    # Point every client at the stub and keep generated files out of the repo.
+    scratch = tempfile.mkdtemp(prefix="lab-load-")
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ["OPENWEATHERMAP_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ["LAB4_CHROMA_PATH"] = os.path.join(scratch, "chroma_db")
+    os.environ["LAB9_MEMORIES_FILE"] = os.path.join(scratch, "memories.json")
+    os.environ["LAB_CACHE_DIR"] = os.path.join(scratch, "cache")
+    os.chdir(PROJECT_ROOT)
+
+    rows = []
+    try:
+        for page in args.pages:
+            for sessions in args.sessions:
+                rows.append(run_level(page, sessions))
+                r = rows[-1]
+                print(f"{page} x{sessions}: {r['runs']} runs, p95 {r['p95']:.3f}s", file=sys.stderr)
+    finally:
+        if server is not None:
+            server.shutdown()
+    print_report(rows)
+    return 1 if any(r["errors"] for r in rows) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
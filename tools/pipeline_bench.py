@@ -0,0 +1,374 @@
+"""Benchmark the local work of one chat turn in Lab 3, Lab 4 and Lab 9.
+
+Everything a turn does besides waiting for the model is driven with
+synthetic data, and the model's replies are canned strings:
+
+    lab3    token counting, fit_to_budget, trim_history + fold, the
+            "more info" prompt
+    lab4    the same, plus rerank (with a corpus lexical index) / MMR /
+            packing of retrieved passages and layout_messages
+    lab9    loading memories.json, building the system prompt,
+            compactor.window, saving the updated memories
+    render  the rerun that redraws the transcript (render_history with five
+            earlier pages loaded), run in a Streamlit AppTest session so
+            st.session_state and the page cache work as in the app; skipped
+            when Streamlit is not installed
+
+Conversations run from 10 to 10,000 turns and memory files from 10 to
+100,000 facts. For every case it prints the median time of a turn and the
+peak memory allocated during one (tracemalloc):
+
+    python -m tools.pipeline_bench                    # run and compare with the baseline
+    python -m tools.pipeline_bench --save-baseline    # record this machine's numbers
+
+A case more than --tolerance slower than tools/pipeline_bench_baseline.json,
+or allocating that much more, is reported as a regression and the exit code
+is 1. Without a baseline there is nothing to check against, so the exit code
+is 2. Baselines are per machine: record one where the check runs (e.g. CI).
+"""
+import argparse
+import copy
+import functools
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from helpers.compaction import ConversationCompactor, fit_to_budget, trim_history
+from helpers.memories import build_system_prompt, load_memories, save_memories
+from helpers.prompt_layout import layout_messages
+from helpers.retrieval import FETCH_K, build_lexical_index, select_context
+from helpers.speculative import conversation_key, more_info_messages
+from helpers.tokens import count_tokens
+
+TURNS = (10, 100, 1000, 10000)
+FACTS = (10, 1000, 10000, 100000)
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pipeline_bench_baseline.json")
+# Differences below these are noise, whatever the percentage.
+NOISE_MS = 1.0
+NOISE_KB = 64
+
+MODEL = "gpt-4o-mini"
+MAX_TOKENS = 1000  # Lab 3 / Lab 4 prompt budget
+CONTEXT_TOKEN_BUDGET = 450
+CORPUS_PASSAGES = 2000  # size of the synthetic Lab 4 collection behind the lexical index
+PASSAGE_SEPARATOR = "\n\n---\n\n"  # as in Lab 4
+LOADED_PAGES = 5  # earlier-message pages the render case has open
+LAB9_MAX_PROMPT_TOKENS = 3000
+SYSTEM_PROMPT = (
+    "You explain things in a simple, friendly way so that a 10-year-old can understand. "
+    "Use short sentences and everyday words. When you answer a question, give a clear answer "
+    "and then ask: 'Do you want more info?'"
+)
+QUESTION = "Why do leaves change colour in the autumn?"
+ANSWER = "Leaves have green stuff called chlorophyll. " * 12 + "Do you want more info?"
+
+_WORDS = (
+    "the course project grade week data python model reading quiz exam team river light cloud "
+    "sun leaf colour energy plant water question answer example simple because when then"
+).split()
+
+
+def _sentence(rng, words):
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def synthetic_conversation(turns, seed=0):
+    """Greeting + turns user/assistant exchanges of typical lengths."""
+    rng = random.Random(seed)
+    messages = [{"role": "assistant", "content": "What would you like to know? Ask me anything!"}]
+    for _ in range(turns):
+        messages.append({"role": "user", "content": _sentence(rng, rng.randint(5, 20))})
+        messages.append({"role": "assistant", "content": _sentence(rng, rng.randint(30, 120))})
+    return messages
+
+
+def synthetic_facts(count, seed=0):
+    rng = random.Random(seed)
+    return [f"User fact {i}: {_sentence(rng, rng.randint(4, 10))}" for i in range(count)]
+
+
+def synthetic_passages(count, seed=0):
+    rng = random.Random(seed)
+    return [_sentence(rng, rng.randint(60, 140)) for _ in range(count)]
+
+
+def synthetic_results(seed=0, dim=256):
+    """A Chroma-shaped query result with FETCH_K passages and their embeddings."""
+    rng = random.Random(seed)
+    n = FETCH_K
+    return {
+        "ids": [[f"doc#{i}" for i in range(n)]],
+        "documents": [synthetic_passages(n, seed)],
+        "metadatas": [[{"filename": f"IST{300 + i}.pdf", "section": "Grading", "course_code": f"IST {300 + i}"}
+                       for i in range(n)]],
+        "distances": [[0.2 + i * 0.02 for i in range(n)]],
+        "embeddings": [[[rng.gauss(0, 1) for _ in range(dim)] for _ in range(n)]],
+    }
+
+
+class StubCompactor(ConversationCompactor):
+    """ConversationCompactor whose background summary call returns a canned summary."""
+
+    def __init__(self):
+        super().__init__(client=None, page="bench")
+
+    def _summarize(self, summary, batch):
+        return "Summary of the earlier conversation."
+
+
+def _lab4_passage(passage):
+    """Lab 4's format_passage: the source label and the text."""
+    meta = passage["meta"]
+    return f"[Source: {meta['filename']}, section: {meta['section']}]\n{passage['text']}"
+
+
+# --- one turn of each page ------------------------------------------------------
+
+
+def lab3_turn(state):
+    messages, compactor = state["messages"], state["compactor"]
+    messages.append({"role": "user", "content": QUESTION})
+    head = [{"role": "system", "content": SYSTEM_PROMPT}] + compactor.summary_messages()
+    prompt = head + fit_to_budget(head, messages, MAX_TOKENS)
+    count_tokens(prompt)
+    messages.append({"role": "assistant", "content": ANSWER})  # the model's reply
+    messages, evicted = trim_history(messages, MAX_TOKENS)
+    compactor.fold(evicted)
+    more_info_messages(head, messages + [{"role": "user", "content": "yes"}], MAX_TOKENS)
+    conversation_key(messages, MODEL)
+
+
+def lab4_turn(state):
+    messages, compactor = state["messages"], state["compactor"]
+    messages.append({"role": "user", "content": QUESTION})
+    passages = select_context(
+        QUESTION, state["results"], CONTEXT_TOKEN_BUDGET, corpus=state["corpus"],
+        format_passage=_lab4_passage, separator=PASSAGE_SEPARATOR,
+    )
+    context_text = PASSAGE_SEPARATOR.join(_lab4_passage(p) for p in passages)
+    prompt = layout_messages(
+        [{"role": "system", "content": SYSTEM_PROMPT}] + compactor.summary_messages(),
+        messages,
+        [{"role": "system", "content": "Syllabus excerpts:\n" + context_text}],
+        max_tokens=MAX_TOKENS,
+    )
+    count_tokens(prompt)
+    messages.append({"role": "assistant", "content": ANSWER})
+    messages, evicted = trim_history(messages, MAX_TOKENS)
+    compactor.fold(evicted)
+    head = [{"role": "system", "content": SYSTEM_PROMPT}] + compactor.summary_messages()
+    more_info_messages(head, messages + [{"role": "user", "content": "yes"}], MAX_TOKENS)
+    conversation_key(messages, MODEL)
+
+
+def lab9_turn(state):
+    messages, compactor = state["messages"], state["compactor"]
+    messages.append({"role": "user", "content": QUESTION})
+    memories = load_memories(state["memories_file"])
+    head = [{"role": "system", "content": build_system_prompt(memories)}] + compactor.summary_messages()
+    recent = compactor.window(head, messages, LAB9_MAX_PROMPT_TOKENS)
+    head + [{"role": m["role"], "content": m["content"]} for m in recent]
+    messages.append({"role": "assistant", "content": ANSWER})
+    updated = list(memories)
+    for fact in ["User asked about autumn leaves"]:  # the extraction model's reply
+        if fact not in updated:
+            updated.append(fact)
+    if updated != memories:
+        save_memories(updated, state["memories_file"])
+
+
+TURN_FUNCTIONS = {"lab3": lab3_turn, "lab4": lab4_turn, "lab9": lab9_turn}
+PAGES = list(TURN_FUNCTIONS) + ["render"]
+
+RENDER_SCRIPT = """
+import streamlit as st
+from helpers.chat_history import render_history
+render_history(st.session_state.bench_messages, key="bench")
+"""
+
+
+# --- running --------------------------------------------------------------------
+
+
+def rendering_available():
+    try:
+        import streamlit.testing.v1  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def cases(pages, turns, facts):
+    """[(name, page, turns, facts)]: Lab 9 sweeps turns at 100 facts and facts at 100 turns."""
+    out = []
+    for page in pages:
+        for n in turns:
+            out.append((f"{page} turns={n}" + (" facts=100" if page == "lab9" else ""), page, n, 100))
+        if page == "lab9":
+            out.extend((f"lab9 turns=100 facts={f}", page, 100, f) for f in facts if f != 100)
+    return out
+
+
+def _measure(prepare, repeat, max_seconds):
+    """Time the callables prepare() returns (setup is not timed): median ms and tracemalloc peak."""
+    prepare()()  # warm-up: imports, tokenizer, caches
+    times = []
+    started = time.perf_counter()
+    while len(times) < repeat and (not times or time.perf_counter() - started < max_seconds):
+        turn = prepare()
+        gc.collect()
+        t = time.perf_counter()
+        turn()
+        times.append(time.perf_counter() - t)
+
+    turn = prepare()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        turn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"ms": statistics.median(times) * 1000, "alloc_kb": peak / 1024, "samples": len(times)}
+
+
+def run_case(page, turns, facts, workdir, repeat, max_seconds):
+    """{"ms": median per turn, "alloc_kb": peak allocated during a turn, "samples"}."""
+    if page == "render":
+        return run_render_case(turns, repeat, max_seconds)
+    conversation = synthetic_conversation(turns)
+    memories_file = os.path.join(workdir, "memories.json")
+    facts_json = json.dumps(synthetic_facts(facts), indent=2)
+    results = synthetic_results()
+    corpus = build_lexical_index(results["documents"][0] + synthetic_passages(CORPUS_PASSAGES, seed=1))
+
+    def prepare():
+        if page == "lab9":
+            with open(memories_file, "w", encoding="utf-8") as f:
+                f.write(facts_json)
+        state = {
+            "messages": copy.deepcopy(conversation),
+            "compactor": StubCompactor(),
+            "results": results,
+            "corpus": corpus,
+            "memories_file": memories_file,
+        }
+        return functools.partial(TURN_FUNCTIONS[page], state)
+
+    return _measure(prepare, repeat, max_seconds)
+
+
+def run_render_case(turns, repeat, max_seconds):
+    """One rerun of a page that only draws the transcript, after a turn was added.
+
+    The AppTest session is kept across turns, so blocks cached on earlier
+    reruns are reused as they are in the app.
+    """
+    from streamlit.logger import get_logger
+    from streamlit.testing.v1 import AppTest
+
+    from helpers.chat_history import PAGE_SIZE, WINDOW
+
+    # Setting session state from outside a script run warns once per key; that is expected here.
+    get_logger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel("ERROR")
+    messages = synthetic_conversation(turns)
+    at = AppTest.from_string(RENDER_SCRIPT, default_timeout=600)
+    at.session_state["bench_messages"] = messages
+    live_start = max(0, len(messages) - WINDOW)
+    loaded_from = max(0, live_start - LOADED_PAGES * PAGE_SIZE) // PAGE_SIZE * PAGE_SIZE
+    if loaded_from < live_start:
+        at.session_state["bench_history_from"] = loaded_from
+
+    def rerun():
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+    def prepare():
+        messages.append({"role": "user", "content": QUESTION})
+        messages.append({"role": "assistant", "content": ANSWER})
+        return rerun
+
+    rerun()  # first draw of every page
+    return _measure(prepare, repeat, max_seconds)
+
+
+def compare(result, base, tolerance):
+    """List of regressions of result against base (both {"ms", "alloc_kb"})."""
+    problems = []
+    if result["ms"] > base["ms"] * (1 + tolerance) and result["ms"] - base["ms"] > NOISE_MS:
+        problems.append(f"time {base['ms']:.2f} -> {result['ms']:.2f} ms")
+    if result["alloc_kb"] > base["alloc_kb"] * (1 + tolerance) and result["alloc_kb"] - base["alloc_kb"] > NOISE_KB:
+        problems.append(f"allocations {base['alloc_kb']:.0f} -> {result['alloc_kb']:.0f} KB")
+    return problems
+
+
+def _change(value, base):
+    if base is None or not base:
+        return "      -"
+    return f"{(value / base - 1) * 100:+6.0f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark per-turn local overhead of the chat pages.")
+    parser.add_argument("--pages", nargs="+", default=PAGES, choices=PAGES)
+    parser.add_argument("--turns", type=int, nargs="+", default=list(TURNS))
+    parser.add_argument("--facts", type=int, nargs="+", default=list(FACTS))
+    parser.add_argument("--repeat", type=int, default=5, help="timed turns per case (fewer if a case is slow)")
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="stop repeating a case after this long")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown / growth (0.5 = 50%%)")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    pages = args.pages
+    rendering = "render" in pages and rendering_available()
+    if "render" in pages and not rendering:
+        print("note: history rendering skipped (Streamlit is not installed)")
+        pages = [p for p in pages if p != "render"]
+    baseline, saved = {}, {}
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        print(f"error: no baseline at {args.baseline}; run with --save-baseline to record one")
+        return 2
+    if not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            saved = json.load(f)
+        baseline = saved.get("cases", {})
+        if saved.get("rendering") and not rendering:
+            print("note: the baseline has render cases; they are not compared in this run")
+
+    results, regressions = {}, []
+    print(f"{'case':<28} {'ms/turn':>9} {'vs base':>8} {'alloc KB':>9} {'vs base':>8} {'runs':>5}")
+    with tempfile.TemporaryDirectory(prefix="pipebench-") as workdir:
+        for name, page, turns, facts in cases(pages, args.turns, args.facts):
+            r = results[name] = run_case(page, turns, facts, workdir, args.repeat, args.max_seconds)
+            base = baseline.get(name)
+            print(f"{name:<28} {r['ms']:9.2f} {_change(r['ms'], base and base['ms'])} "
+                  f"{r['alloc_kb']:9.0f} {_change(r['alloc_kb'], base and base['alloc_kb'])} {r['samples']:5}")
+            for problem in compare(r, base, args.tolerance) if base else []:
+                regressions.append(f"{name}: {problem}")
+
+    if args.save_baseline:
+        data = {
+            "machine": f"{platform.node()} {platform.machine()} Python {platform.python_version()}",
+            "rendering": rendering,
+            "saved": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "cases": {k: {"ms": round(v["ms"], 3), "alloc_kb": round(v["alloc_kb"], 1)} for k, v in results.items()},
+        }
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        print(f"baseline written to {args.baseline}")
+        return 0
+    for regression in regressions:
+        print("REGRESSION", regression)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
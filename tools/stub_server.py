@@ -0,0 +1,297 @@
+"""Local stand-in for the OpenAI and OpenWeatherMap APIs.
+
+Lets every page run (and be load tested) without real keys or real costs:
+
+    python -m tools.stub_server --port 8787 --latency 0.3 --tokens-per-second 60
+
+then start the app against it:
+
+    OPENAI_BASE_URL=http://127.0.0.1:8787/v1 \
+    OPENWEATHERMAP_BASE_URL=http://127.0.0.1:8787 \
+    streamlit run streamlit_app.py
+
+Supported: chat completions (streaming, usage, tool calls, image inputs),
+embeddings (float and base64), and the current-weather endpoint. Answers are
+canned text; embeddings are hashed bags of words, so similar texts still land
+close together and retrieval behaves sensibly.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+EMBEDDING_DIM = 1536
+
+_WORDS = (
+    "Sure here is a short friendly answer with a few simple ideas to think about "
+    "and one or two examples that make it easy to follow along today"
+).split()
+
+
+class StubConfig:
+    latency = 0.2  # seconds before the first token / response
+    tokens_per_second = 50.0
+    completion_tokens = 60
+    jitter = 0.1  # +/- fraction applied to latency
+
+
+config = StubConfig()
+_stats_lock = threading.Lock()
+# streams_open: streamed completions still being written; streams_cancelled: ended by the client.
+_stats = {"chat": 0, "embeddings": 0, "weather": 0, "streams_open": 0, "streams_cancelled": 0}
+
+
+def _count(kind, n=1):
+    with _stats_lock:
+        _stats[kind] += n
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _sleep_latency():
+    j = config.latency * config.jitter
+    time.sleep(max(0.0, config.latency + random.uniform(-j, j)))
+
+
+def _approx_tokens(messages):
+    total = 0
+    for m in messages:
+        content = m.get("content") or ""
+        if isinstance(content, list):  # vision: [{"type": "text"}, {"type": "image_url"}]
+            content = " ".join(p.get("text", "") for p in content if isinstance(p, dict))
+            total += 85  # roughly what a low-detail image costs
+        total += 4 + len(str(content).split())
+    return total
+
+
+def _reply_words(max_tokens=None):
+    n = config.completion_tokens
+    if max_tokens:
+        n = min(n, int(max_tokens))
+    return [_WORDS[i % len(_WORDS)] for i in range(n)]
+
+
+def _tool_call(body):
+    """Call the first tool, filling required string args from the last user message."""
+    tool = body["tools"][0]["function"]
+    last_user = next((m for m in reversed(body["messages"]) if m.get("role") == "user"), {})
+    text = last_user.get("content") if isinstance(last_user.get("content"), str) else ""
+    match = re.search(r"for (.+?)\??$", text or "")
+    value = match.group(1) if match else "Syracuse, NY"
+    props = tool.get("parameters", {}).get("properties", {})
+    args = {name: value for name, spec in props.items() if spec.get("type") == "string"}
+    return {
+        "id": "call_" + uuid.uuid4().hex[:24],
+        "type": "function",
+        "function": {"name": tool["name"], "arguments": json.dumps(args)},
+    }
+
+
+def _usage(prompt_tokens, completion_tokens):
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": 0},
+    }
+
+
+def _embed(text):
+    vec = [0.0] * EMBEDDING_DIM
+    for word in re.findall(r"\w+", (text or "").lower()):
+        h = int.from_bytes(hashlib.md5(word.encode()).digest()[:8], "little")
+        vec[h % EMBEDDING_DIM] += 1.0 if (h >> 32) & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "StubAPI/1.0"
+
+    def log_message(self, format, *args):
+        pass  # keep load tests quiet
+
+    def _json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.endswith("/data/2.5/weather"):
+            return self._weather(parse_qs(url.query))
+        if url.path.endswith("/stats"):
+            return self._json(200, stats())
+        self._json(404, {"error": {"message": f"No stub for GET {url.path}"}})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path.endswith("/chat/completions"):
+            return self._chat(self._body())
+        if path.endswith("/embeddings"):
+            return self._embeddings(self._body())
+        self._json(404, {"error": {"message": f"No stub for POST {path}"}})
+
+    def _chat(self, body):
+        _count("chat")
+        messages = body.get("messages", [])
+        prompt_tokens = _approx_tokens(messages)
+        wants_tool = body.get("tools") and not any(m.get("role") == "tool" for m in messages)
+        words = [] if wants_tool else _reply_words(body.get("max_tokens") or body.get("max_completion_tokens"))
+        tool_calls = [_tool_call(body)] if wants_tool else None
+        base = {
+            "id": "chatcmpl-" + uuid.uuid4().hex[:24],
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "system_fingerprint": "stub",
+        }
+        _sleep_latency()
+
+        if not body.get("stream"):
+            time.sleep(len(words) / config.tokens_per_second)
+            message = {"role": "assistant", "content": None if wants_tool else " ".join(words)}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            return self._json(200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if wants_tool else "stop",
+                }],
+                "usage": _usage(prompt_tokens, len(words)),
+            })
+
+        # Server-sent events, one token per chunk at the configured rate.
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def send(choices, usage=None):
+            chunk = {**base, "object": "chat.completion.chunk", "choices": choices}
+            if usage is not None:
+                chunk["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        _count("streams_open")
+        try:
+            send([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+            if tool_calls:
+                calls = [dict(c, index=i) for i, c in enumerate(tool_calls)]
+                send([{"index": 0, "delta": {"tool_calls": calls}, "finish_reason": None}])
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(1.0 / config.tokens_per_second)
+                send([{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}])
+            send([{"index": 0, "delta": {}, "finish_reason": "tool_calls" if tool_calls else "stop"}])
+            if (body.get("stream_options") or {}).get("include_usage"):
+                send([], usage=_usage(prompt_tokens, len(words)))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            _count("streams_cancelled")  # client stopped reading (cancelled stream)
+        finally:
+            _count("streams_open", -1)
+        self.close_connection = True
+
+    def _embeddings(self, body):
+        _count("embeddings")
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        _sleep_latency()
+        data = []
+        for i, text in enumerate(inputs):
+            vec = _embed(text if isinstance(text, str) else " ".join(map(str, text)))
+            if body.get("encoding_format") == "base64":
+                vec = base64.b64encode(struct.pack(f"<{len(vec)}f", *vec)).decode()
+            data.append({"object": "embedding", "index": i, "embedding": vec})
+        tokens = sum(len(str(t).split()) for t in inputs)
+        self._json(200, {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "stub"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def _weather(self, query):
+        _count("weather")
+        location = (query.get("q") or [""])[0]
+        if not (query.get("appid") or [""])[0]:
+            return self._json(401, {"cod": 401, "message": "Invalid API key"})
+        if not location or location.lower().startswith("nowhere"):
+            return self._json(404, {"cod": "404", "message": "city not found"})
+        _sleep_latency()
+        # Stable per city, so repeated runs give the same suggestions.
+        seed = int(hashlib.md5(location.lower().encode()).hexdigest()[:8], 16)
+        temp = 20 + seed % 70
+        self._json(200, {
+            "name": location.split(",")[0],
+            "main": {
+                "temp": temp,
+                "feels_like": temp - 3,
+                "temp_min": temp - 5,
+                "temp_max": temp + 4,
+                "humidity": 30 + seed % 60,
+            },
+            "weather": [{"description": ("clear sky", "light rain", "overcast clouds", "snow")[seed % 4]}],
+        })
+
+
+def serve(host="127.0.0.1", port=8787):
+    """Start the stub in a background thread; returns the server (call .shutdown() to stop)."""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local OpenAI / OpenWeatherMap stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=config.latency, help="seconds before first token")
+    parser.add_argument("--tokens-per-second", type=float, default=config.tokens_per_second)
+    parser.add_argument("--completion-tokens", type=int, default=config.completion_tokens)
+    parser.add_argument("--jitter", type=float, default=config.jitter)
+    args = parser.parse_args(argv)
+
+    config.latency = args.latency
+    config.tokens_per_second = args.tokens_per_second
+    config.completion_tokens = args.completion_tokens
+    config.jitter = args.jitter
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    print(f"Stub API on http://{args.host}:{args.port}  (OPENAI_BASE_URL=http://{args.host}:{args.port}/v1)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Compare the Lab 4 vector store backends on load time, memory and query latency.
+
+Builds the same synthetic corpus (random unit vectors around a few "course"
+centres, with course_code metadata) in Chroma and in the NumPy store
+(float16 and int8), then opens each one in a fresh interpreter and measures:
+
+    load     seconds to open the store and answer a first query
+    rss      resident memory added by opening + querying (MB)
+    p50/p95  latency of a top-k query, unfiltered and with a course filter
+    recall   overlap of the top-k with exact float32 search
+
+No API calls are made; embeddings are generated locally.
+
+    python -m tools.vectorstore_bench --docs 200 2000 20000
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from helpers.paths import PROJECT_ROOT
+from helpers.vectorstore import NumpyVectorStore, open_chroma
+from tools.load_test import percentile
+
+DIM = 1536
+COURSES = ["IST 195", "IST 256", "IST 314", "IST 343", "IST 387", "IST 418", "IST 488"]
+TOP_K = 12
+BACKENDS = ("chroma", "numpy-float16", "numpy-int8")
+
+
+def synthetic_corpus(n, dim=DIM, seed=0):
+    """(embeddings float32 [n, dim], metadatas, ids, queries float32 [q, dim])."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(len(COURSES), dim)).astype(np.float32)
+    labels = rng.integers(0, len(COURSES), size=n)
+    vectors = centres[labels] + rng.normal(scale=1.5, size=(n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    metadatas = [{"course_code": COURSES[i], "chunk": j} for j, i in enumerate(labels)]
+    ids = [f"doc#{j}" for j in range(n)]
+    queries = centres[rng.integers(0, len(COURSES), size=50)] + rng.normal(scale=1.5, size=(50, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return vectors, metadatas, ids, queries
+
+
+def build(backend, path, vectors, metadatas, ids, batch=1000):
+    documents = [f"passage {i}" for i in ids]
+    if backend == "chroma":
+        _, store = open_chroma("Bench", None, {"hnsw:space": "cosine"}, path=path)
+    else:
+        store = NumpyVectorStore(path, dtype=backend.split("-", 1)[1])
+    for start in range(0, len(ids), batch):
+        stop = start + batch
+        store.add(
+            documents=documents[start:stop],
+            metadatas=metadatas[start:stop],
+            ids=ids[start:stop],
+            embeddings=vectors[start:stop].tolist() if backend == "chroma" else vectors[start:stop],
+        )
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak, not current, off Linux
+
+
+def measure(backend, path, queries_file):
+    """Runs in the child process: open, query, report as a dict."""
+    import numpy as np
+
+    queries = np.load(queries_file)
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    if backend == "chroma":
+        _, store = open_chroma("Bench", None, {"hnsw:space": "cosine"}, path=path)
+    else:
+        store = NumpyVectorStore(path)
+
+    def run(q, where=None):
+        emb = q.tolist() if backend == "chroma" else q
+        return store.query(query_embeddings=[emb], n_results=TOP_K, where=where, include=["distances"])
+
+    first = run(queries[0])
+    load = time.perf_counter() - start
+    timings = {"all": [], "filtered": []}
+    results = []
+    for i, q in enumerate(queries):
+        t = time.perf_counter()
+        results.append(run(q)["ids"][0])
+        timings["all"].append(time.perf_counter() - t)
+        t = time.perf_counter()
+        run(q, where={"course_code": {"$in": COURSES[i % 7:i % 7 + 2]}})
+        timings["filtered"].append(time.perf_counter() - t)
+    return {
+        "load": load,
+        "rss": _rss_mb() - rss_before,
+        "count": store.count(),
+        "ok": bool(first["ids"][0]),
+        "p50": percentile(timings["all"], 50),
+        "p95": percentile(timings["all"], 95),
+        "filtered_p50": percentile(timings["filtered"], 50),
+        "ids": results,
+    }
+
+
+def recall(found, vectors, queries):
+    """Mean |found ∩ exact top-k| / k against brute-force float32 search."""
+    import numpy as np
+
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :TOP_K]
+    hits = [
+        len({f"doc#{j}" for j in row} & set(ids)) / TOP_K
+        for row, ids in zip(exact, found)
+    ]
+    return sum(hits) / len(hits)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Lab 4 vector store backends.")
+    parser.add_argument("--docs", type=int, nargs="+", default=[200, 2000, 20000])
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--child", nargs=3, metavar=("BACKEND", "PATH", "QUERIES"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure(*args.child)))
+        return 0
+
+    import numpy as np
+
+    print(f"{'docs':>7} {'backend':<14} {'load ms':>8} {'rss MB':>7} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'filt p50':>8} {'disk MB':>8} {'recall':>6}")
+    for n in args.docs:
+        vectors, metadatas, ids, queries = synthetic_corpus(n)
+        workdir = tempfile.mkdtemp(prefix="vsbench-")
+        try:
+            queries_file = os.path.join(workdir, "queries.npy")
+            np.save(queries_file, queries)
+            for backend in args.backends:
+                path = os.path.join(workdir, backend)
+                try:
+                    build(backend, path, vectors, metadatas, ids)
+                except ImportError as e:
+                    print(f"{n:>7} {backend:<14} skipped ({e.name} not installed)")
+                    continue
+                out = subprocess.run(
+                    [sys.executable, "-m", "tools.vectorstore_bench", "--child", backend, path, queries_file],
+                    cwd=PROJECT_ROOT, capture_output=True, text=True,
+                )
+                if out.returncode != 0:
+                    print(f"{n:>7} {backend:<14} failed: {out.stderr.strip().splitlines()[-1:]}")
+                    continue
+                r = json.loads(out.stdout.strip().splitlines()[-1])
+                disk = sum(
+                    os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files
+                ) / 2**20
+                print(f"{n:>7} {backend:<14} {r['load'] * 1000:8.1f} {r['rss']:7.1f} {r['p50'] * 1000:7.2f} "
+                      f"{r['p95'] * 1000:7.2f} {r['filtered_p50'] * 1000:8.2f} {disk:8.1f} "
+                      f"{recall(r['ids'], vectors, queries):6.3f}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())